@@ -1,30 +1,114 @@
+import click
 import flask
 from flask import request, jsonify, render_template
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, JWTManager
-import joblib
-import pandas as pd
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity, JWTManager
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
 import os
+import base64
 import traceback
 import json
+import threading
+import time
+import atexit
+import shutil
+import math
+from functools import wraps
+from urllib.parse import urlencode
 from datetime import datetime , timezone
+from coalescer import PredictionCoalescer
+from db_profile import configure_database
+from http_caching import ResponseCompression, conditional_get
+from instrumentation import RequestInstrumentation, metrics, scale_snapshot, stage
+from model_loader import ModelLoader
+from password_hasher import HasherBusy, PasswordHasher, RateLimiter
+from prediction_cache import PredictionCache, canonical_key
+from recommendation_rules import RecommendationEngine
+from write_behind import WriteBehindFull, WriteBehindQueue
 
 # --- 1. INITIALIZE FLASK APP & EXTENSIONS ---
 app = flask.Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor']) # read by script.js to page through history
 
 # --- App Configuration ---
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'cardiocare.db')
+# DATABASE_URL overrides the bundled SQLite file; see db_profile.py for the tuning knobs
+configure_database(app, default_uri='sqlite:///' + os.path.join(basedir, 'cardiocare.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config["JWT_SECRET_KEY"] = "your-super-secret-key-change-me" # Change this in production!
+app.config['PREDICT_BATCH_MAX_RECORDS'] = int(os.environ.get('PREDICT_BATCH_MAX_RECORDS', 5000))
+# Micro-batching of concurrent /api/predict calls. A max wait of 0 disables it.
+app.config['PREDICT_COALESCE_MAX_WAIT_MS'] = float(os.environ.get('PREDICT_COALESCE_MAX_WAIT_MS', 2))
+app.config['PREDICT_COALESCE_MAX_BATCH'] = int(os.environ.get('PREDICT_COALESCE_MAX_BATCH', 64))
+# Score through the compiled (pandas-free) ensemble when it matches the pipelines
+app.config['FAST_INFERENCE'] = os.environ.get('FAST_INFERENCE', '1') == '1'
+# Number of scoring worker processes. 0 scores inside the web process.
+app.config['MODEL_WORKERS'] = int(os.environ.get('MODEL_WORKERS', 0))
+# Load the models in a background thread at import (for gunicorn etc.).
+# `python app.py` always warms up; otherwise they load on first use.
+app.config['MODEL_WARMUP'] = os.environ.get('MODEL_WARMUP', '0') == '1'
+# Versioned model registry; the running server polls it and hot-swaps new versions
+app.config['MODEL_REGISTRY_DIR'] = os.environ.get('MODEL_REGISTRY_DIR', 'model_registry')
+app.config['MODEL_RELOAD_INTERVAL'] = float(os.environ.get('MODEL_RELOAD_INTERVAL', 30)) # seconds, 0 disables
+app.config['MODEL_ADMIN_TOKEN'] = os.environ.get('MODEL_ADMIN_TOKEN') # enables POST /api/admin/models/reload
+# Where compiled stores for the MODEL_WORKERS pool are exported when a version ships without one
+app.config['MODEL_CACHE_DIR'] = os.environ.get('MODEL_CACHE_DIR', os.path.join(basedir, '.model_cache'))
+# Cache of (result, probability) per canonicalized input. A size of 0 disables it.
+app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('PREDICTION_CACHE_SIZE', 10000))
+app.config['PREDICTION_CACHE_TTL'] = float(os.environ.get('PREDICTION_CACHE_TTL', 3600)) # seconds
+# Keyset pagination of history endpoints (?limit=&cursor=)
+app.config['HISTORY_PAGE_SIZE'] = int(os.environ.get('HISTORY_PAGE_SIZE', 50))
+app.config['HISTORY_MAX_PAGE_SIZE'] = int(os.environ.get('HISTORY_MAX_PAGE_SIZE', 200))
+# Doctor endpoints authorize from the token's role claim; the role is re-read from
+# the DB at most once per user per this many seconds (0 trusts the claim alone)
+app.config['ROLE_RECHECK_TTL'] = float(os.environ.get('ROLE_RECHECK_TTL', 60))
+# How /api/predict persists its row: 'sync' commits in the request, 'wait' queues it
+# for a batched background commit and waits for it, 'async' returns without waiting
+app.config['PREDICTION_WRITE_MODE'] = os.environ.get('PREDICTION_WRITE_MODE', 'wait')
+app.config['PREDICTION_WRITE_QUEUE_SIZE'] = int(os.environ.get('PREDICTION_WRITE_QUEUE_SIZE', 10000))
+app.config['PREDICTION_WRITE_BATCH'] = int(os.environ.get('PREDICTION_WRITE_BATCH', 500))
+app.config['PREDICTION_WRITE_INTERVAL_MS'] = float(os.environ.get('PREDICTION_WRITE_INTERVAL_MS', 20))
+app.config['PREDICTION_WRITE_ENQUEUE_TIMEOUT'] = float(os.environ.get('PREDICTION_WRITE_ENQUEUE_TIMEOUT', 0.5)) # seconds before a 503
+app.config['PREDICTION_WRITE_WAIT_TIMEOUT'] = float(os.environ.get('PREDICTION_WRITE_WAIT_TIMEOUT', 30)) # seconds, 'wait' mode
+# Password hashing runs on a small worker pool so login bursts can't take every CPU
+# from /api/predict. BCRYPT_LOG_ROUNDS is the cost factor (Flask-Bcrypt's own key);
+# hashes made at another cost are upgraded on the user's next successful login.
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+# AUTH_HASH_WORKERS hashes run at once (default: all cores but one, leaving one for
+# /api/predict). AUTH_HASH_MAX_PENDING more may queue for a worker; a login arriving
+# when that queue is full gets 503 + Retry-After rather than waiting behind it. A
+# hash takes ~0.3 s of CPU at cost 12, so each worker clears ~3 logins/s; a queue
+# longer than ~3 * workers * AUTH_HASH_TIMEOUT only turns 503s into timeouts.
+app.config['AUTH_HASH_WORKERS'] = int(os.environ.get('AUTH_HASH_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+app.config['AUTH_HASH_MAX_PENDING'] = int(os.environ.get('AUTH_HASH_MAX_PENDING', 32))
+app.config['AUTH_HASH_TIMEOUT'] = float(os.environ.get('AUTH_HASH_TIMEOUT', 10)) # seconds
+# Login/register attempts per client address per minute, with bursts up to AUTH_RATE_BURST (0 disables)
+app.config['AUTH_RATE_LIMIT'] = int(os.environ.get('AUTH_RATE_LIMIT', 120))
+app.config['AUTH_RATE_BURST'] = int(os.environ.get('AUTH_RATE_BURST', 30))
+# Recommendation rules table (JSON). The built-in rules apply while the file doesn't
+# exist; edits are picked up within RECOMMENDATION_RULES_CHECK_INTERVAL seconds.
+app.config['RECOMMENDATION_RULES_PATH'] = os.environ.get('RECOMMENDATION_RULES_PATH', os.path.join(basedir, 'recommendation_rules.json'))
+app.config['RECOMMENDATION_RULES_CHECK_INTERVAL'] = float(os.environ.get('RECOMMENDATION_RULES_CHECK_INTERVAL', 5))
+# gzip for JSON/text responses of at least COMPRESS_MIN_SIZE bytes (level 0 disables), see http_caching.py
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+# Per-stage durations in a Server-Timing response header (metrics are always at /metrics)
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '1') == '1'
+# Opt-in request profiling, see instrumentation.py. Off unless PROFILE_DIR is set;
+# the sample rate profiles that fraction of requests without an X-Profile header.
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_TOKEN'] = os.environ.get('PROFILE_TOKEN')
 
 # --- Initialize Extensions ---
 db = SQLAlchemy(app)
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
+instrumentation = RequestInstrumentation(app)
+compression = ResponseCompression(app)
 
 # --- 3. SERVE THE FRONTEND ---
 @app.route('/')
@@ -70,11 +154,18 @@ class Prediction(db.Model):
     input_data = db.Column(db.Text, nullable=False) # Store input features as JSON string
     recommendations = db.relationship('Recommendation', backref='prediction', lazy=True, cascade="all, delete-orphan")
     doctor_note = db.Column(db.Text, nullable=True) # To store doctor's private notes
+    note_updated_at = db.Column(db.DateTime, nullable=True)
+    model_version = db.Column(db.String(40), nullable=True) # Registry version that produced this prediction
+    # Doctor-confirmed real outcome ('Yes'/'No'); labels for incremental retraining
+    confirmed_outcome = db.Column(db.String(10), nullable=True)
+    outcome_confirmed_at = db.Column(db.DateTime, nullable=True)
+    # History pages are "this user's predictions, newest first"
+    __table_args__ = (db.Index('ix_prediction_user_timestamp', 'user_id', 'timestamp'),)
 
 class Recommendation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.String(500), nullable=False)
-    prediction_id = db.Column(db.Integer, db.ForeignKey('prediction.id'), nullable=False)
+    prediction_id = db.Column(db.Integer, db.ForeignKey('prediction.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 # NEW: Appointment Model
@@ -87,125 +178,616 @@ class Appointment(db.Model):
     status = db.Column(db.String(20), nullable=False, default='Pending') # Pending, Approved, Rejected
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+# One row per patient, kept current by the endpoints that write predictions, notes
+# and appointments (see update_patient_summaries), so the doctor dashboard reads
+# this table alone. `flask rebuild-patient-summary` recomputes it from scratch.
+class PatientSummary(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    full_name = db.Column(db.String(100), nullable=False)
+    prediction_count = db.Column(db.Integer, nullable=False, default=0)
+    latest_prediction_id = db.Column(db.Integer, nullable=True)
+    latest_result = db.Column(db.String(10), nullable=True)
+    latest_probability = db.Column(db.Float, nullable=True, index=True)
+    latest_prediction_at = db.Column(db.DateTime, nullable=True, index=True)
+    latest_note_at = db.Column(db.DateTime, nullable=True, index=True)
+    pending_appointments = db.Column(db.Integer, nullable=False, default=0, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Change counters per scope: 'predictions:<user id>', 'appointments:<user id>',
+# 'doctors' and 'patients'. Writes bump them in the same transaction (see
+# bump_data_versions) and the cached GET endpoints derive their ETags from them.
+class DataVersion(db.Model):
+    scope = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
 
 # --- 3. LOAD ML MODELS & THRESHOLDS ---
+# Models (and pandas/sklearn/xgboost) are loaded lazily by model_loader.get().
+# The current registry version is used when one exists, else the models/ dir.
 MODEL_DIR = 'models'
-try:
-    lr_pipeline = joblib.load(os.path.join(MODEL_DIR, "logreg_pipeline.pkl"))
-    xgb_pipeline = joblib.load(os.path.join(MODEL_DIR, "xgb_pipeline.pkl"))
-    thresholds = joblib.load(os.path.join(MODEL_DIR, "best_thresholds.pkl"))
-    print("Models and thresholds loaded successfully.")
-except FileNotFoundError:
-    print("Error: Model files not found. Please run the model_trainer.py script first.")
-    lr_pipeline = xgb_pipeline = thresholds = None
+model_loader = ModelLoader(
+    MODEL_DIR,
+    registry_dir=app.config['MODEL_REGISTRY_DIR'],
+    fast_inference=app.config['FAST_INFERENCE'],
+    watch_interval=app.config['MODEL_RELOAD_INTERVAL']
+)
+if app.config['MODEL_WARMUP']:
+    model_loader.start_warmup()
+
+# --- Process-pool scoring (optional) ---
+# Workers load the compiled ensemble from a memory-mapped array store: the model
+# version's own 'compiled' subdirectory when model_export.py wrote a current one,
+# else an export under MODEL_CACHE_DIR. Registry version directories are never written.
+model_server = None
+_model_server_lock = threading.Lock()
+
+def _store_is_current(compiled_dir, model_dir):
+    from fast_inference import COMPILED_MANIFEST
+
+    manifest_path = os.path.join(compiled_dir, COMPILED_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return False
+    sources = [os.path.join(model_dir, name) for name in ("logreg_pipeline.pkl", "xgb_pipeline.pkl")]
+    mtimes = [os.path.getmtime(p) for p in sources if os.path.exists(p)]
+    return not mtimes or os.path.getmtime(manifest_path) >= max(mtimes)
+
+def export_compiled_models(bundle):
+    own_dir = os.path.join(bundle.directory, 'compiled')
+    if _store_is_current(own_dir, bundle.directory):
+        return own_dir
+    compiled_dir = os.path.join(app.config['MODEL_CACHE_DIR'], bundle.version, 'compiled')
+    if not _store_is_current(compiled_dir, bundle.directory):
+        # Export next to the target and rename it into place, so a worker never reads a half-written store
+        staging_dir = f"{compiled_dir}.tmp{os.getpid()}"
+        bundle.compiled.save(staging_dir)
+        if os.path.isdir(compiled_dir):
+            shutil.rmtree(compiled_dir, ignore_errors=True)
+        try:
+            os.rename(staging_dir, compiled_dir)
+        except OSError: # another process exported it first
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        print(f"Compiled model artifacts exported to '{compiled_dir}'.")
+    return compiled_dir
+
+def acquire_model_server(bundle):
+    """
+    Returns the worker pool for the live model version, acquired for the
+    caller (release() it when done), or None to score `bundle` in-process.
+    The pool starts on first use (never at import, so spawned workers don't
+    recurse). It only ever serves the live version: a caller still holding a
+    bundle from before a hot swap scores in-process instead, and the old
+    version's pool is retired, finishing its in-flight calls before it stops.
+    """
+    global model_server
+    if app.config['MODEL_WORKERS'] <= 0 or bundle.compiled is None:
+        return None
+    while True:
+        live = model_loader.get()
+        if live is None or bundle.version != live.version:
+            return None
+        server = model_server
+        if server is None or server.version != live.version:
+            with _model_server_lock:
+                if model_server is None or model_server.version != live.version:
+                    from model_server import ModelServer
+
+                    previous = model_server
+                    model_server = ModelServer(export_compiled_models(live), app.config['MODEL_WORKERS'], version=live.version)
+                    print(f"Model server started with {app.config['MODEL_WORKERS']} worker processes for version {live.version}.")
+                    if previous is not None:
+                        previous.retire()
+                server = model_server
+        if server.acquire():
+            return server
+        # Retired between the lookup and acquire(): a newer version went live, look again
+
+# Readiness probe: 200 once the models are loaded, 503 while loading (and starts loading)
+@app.route("/api/ready", methods=["GET"])
+def ready():
+    if model_loader.state == ModelLoader.NOT_LOADED:
+        model_loader.start_warmup()
+    status = model_loader.status()
+    return jsonify(status), 200 if status['status'] == ModelLoader.READY else 503
+
+# Hot-swap to a registry version without restarting. Body: {"version": optional}
+@app.route("/api/admin/models/reload", methods=["POST"])
+def reload_models():
+    token = app.config['MODEL_ADMIN_TOKEN']
+    if not token or request.headers.get('X-Admin-Token') != token:
+        return jsonify({'error': 'Access forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        bundle = model_loader.reload(data.get('version'))
+    except Exception as e:
+        print(f"Model Reload Error: {e}")
+        return jsonify({'error': f'Reload failed, previous version still live: {e}'}), 500
+    return jsonify({'message': f'Model version {bundle.version} is now live', 'version': bundle.version}), 200
 
 # --- 4. AUTHENTICATION API ENDPOINTS ---
+password_hasher = PasswordHasher(
+    bcrypt,
+    rounds=app.config['BCRYPT_LOG_ROUNDS'],
+    workers=app.config['AUTH_HASH_WORKERS'],
+    max_pending=app.config['AUTH_HASH_MAX_PENDING']
+)
+if app.config['AUTH_RATE_LIMIT'] > 0:
+    auth_limiter = RateLimiter(app.config['AUTH_RATE_LIMIT'], burst=app.config['AUTH_RATE_BURST'])
+else:
+    auth_limiter = None
+
+def auth_throttled():
+    """A 429 response when this client is over the auth rate limit, else None."""
+    if auth_limiter is None:
+        return None
+    allowed, retry_after = auth_limiter.allow(request.remote_addr)
+    if allowed:
+        return None
+    return jsonify({"message": "Too many attempts. Please try again shortly."}), 429, {'Retry-After': str(math.ceil(retry_after))}
+
+def hashing_busy():
+    return jsonify({"message": "Server is busy. Please try again shortly."}), 503, {'Retry-After': '1'}
+
+def rehash_password(user_id, old_hash, password):
+    """Re-hashes at the current cost in the background; only replaces the hash if it hasn't changed since."""
+    def store(future):
+        try:
+            new_hash = future.result()
+            with app.app_context():
+                db.session.execute(
+                    db.update(User).where(User.id == user_id, User.password_hash == old_hash).values(password_hash=new_hash)
+                )
+                db.session.commit()
+        except Exception as e:
+            print(f"Password Rehash Error: {e}")
+    try:
+        password_hasher.hash_async(password).add_done_callback(store)
+    except HasherBusy:
+        pass # try again on the next login
+
 @app.route("/api/register", methods=["POST"])
 def register():
+    throttled = auth_throttled()
+    if throttled:
+        return throttled
     data = request.get_json()
     if not data or 'email' not in data or 'password' not in data or 'full_name' not in data or 'role' not in data:
         return jsonify({"message": "Missing required fields"}), 400
     email = data.get('email')
     if User.query.filter_by(email=email).first():
         return jsonify({"message": "Email already registered"}), 409
-    hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+    try:
+        with stage('password_hash'):
+            hashed_password = password_hasher.hash(data['password'], timeout=app.config['AUTH_HASH_TIMEOUT'])
+    except (HasherBusy, TimeoutError):
+        return hashing_busy()
     new_user = User(full_name=data['full_name'], email=email, password_hash=hashed_password, role=data['role'])
     db.session.add(new_user)
     db.session.flush() # Flush to get the user ID before creating patient/doctor
     if data['role'] == 'patient':
         new_patient = Patient(age=data.get('age'), gender=data.get('gender'), phone=data.get('phone'), user_id=new_user.id)
         db.session.add(new_patient)
+        db.session.add(PatientSummary(user_id=new_user.id, full_name=new_user.full_name))
+        bump_data_versions(['patients'])
     elif data['role'] == 'doctor':
         new_doctor = Doctor(specialization=data.get('specialization'), experience_years=data.get('experience_years'), clinic_address=data.get('clinic_address'), user_id=new_user.id)
         db.session.add(new_doctor)
+        bump_data_versions(['doctors'])
     db.session.commit()
     return jsonify({"message": "User registered successfully"}), 201
 
 @app.route("/api/login", methods=["POST"])
 def login():
+    throttled = auth_throttled()
+    if throttled:
+        return throttled
     data = request.get_json()
     if not data or 'email' not in data or 'password' not in data:
          return jsonify({"message": "Missing email or password"}), 400
     email = data.get('email')
     password = data.get('password')
     user = User.query.filter_by(email=email).first()
-    if user and bcrypt.check_password_hash(user.password_hash, password):
+    try:
+        with stage('password_check'):
+            valid = user is not None and password_hasher.check(user.password_hash, password, timeout=app.config['AUTH_HASH_TIMEOUT'])
+    except (HasherBusy, TimeoutError):
+        return hashing_busy()
+    if valid:
+        if password_hasher.needs_rehash(user.password_hash):
+            rehash_password(user.id, user.password_hash, password)
         # Use user ID as string for JWT identity
-        access_token = create_access_token(identity=str(user.id))
+        # The role rides along as a claim so doctor endpoints needn't look it up
+        access_token = create_access_token(identity=str(user.id), additional_claims={'role': user.role})
         return jsonify(access_token=access_token, userRole=user.role), 200
     return jsonify({"message": "Invalid credentials"}), 401
 
+# --- Role checks ---
+_role_cache = {} # user_id -> (role, checked_at); revocation checks for ROLE_RECHECK_TTL
+_role_cache_lock = threading.Lock()
+
+def stored_role(user_id):
+    """The user's role in the DB (None if the account is gone), cached for ROLE_RECHECK_TTL seconds."""
+    now = time.monotonic()
+    entry = _role_cache.get(user_id)
+    if entry is not None and now - entry[1] < app.config['ROLE_RECHECK_TTL']:
+        return entry[0]
+    role = db.session.query(User.role).filter_by(id=user_id).scalar()
+    with _role_cache_lock:
+        if len(_role_cache) >= 10000:
+            _role_cache.clear()
+        _role_cache[user_id] = (role, now)
+    return role
+
+def current_user_has_role(role):
+    """
+    Checks the role claim of the current JWT. Tokens issued before the claim
+    existed, or any token when ROLE_RECHECK_TTL > 0, are also checked
+    against the (cached) DB role so deleted or demoted users lose access.
+    """
+    claimed = get_jwt().get('role')
+    if claimed is not None and claimed != role:
+        return False
+    if claimed is not None and app.config['ROLE_RECHECK_TTL'] <= 0:
+        return True
+    return stored_role(int(get_jwt_identity())) == role
+
+def doctor_required(error='Access forbidden'):
+    """Like @jwt_required(), but answers 403 {'error': error} unless the caller is a doctor."""
+    def decorator(fn):
+        @wraps(fn)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            if not current_user_has_role('doctor'):
+                return jsonify({'error': error}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# --- Data versions for conditional GET ---
+UPSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def bump_data_versions(scopes):
+    """Increments the DataVersion of each scope, creating it at 1 (caller commits)."""
+    scopes = sorted(set(scopes)) # one lock order for every writer
+    if not scopes:
+        return
+    now = datetime.utcnow()
+    t = DataVersion.__table__
+    upsert = UPSERTS.get(db.engine.dialect.name)
+    if upsert is not None:
+        stmt = upsert(t).values([{'scope': scope, 'version': 1, 'updated_at': now} for scope in scopes])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[t.c.scope],
+            set_={'version': t.c.version + 1, 'updated_at': stmt.excluded.updated_at}
+        ))
+        return
+    for scope in scopes:
+        updated = db.session.execute(
+            db.update(t).where(t.c.scope == scope).values(version=t.c.version + 1, updated_at=now)
+        ).rowcount
+        if not updated:
+            db.session.execute(db.insert(t).values(scope=scope, version=1, updated_at=now))
+
+def data_versions(*scopes):
+    """
+    conditional_get validators for `scopes`: their versions (0 if never bumped)
+    and latest change. None if they can't be read (e.g. init-db hasn't created
+    data_version yet); the view then answers normally, without an ETag.
+    """
+    try:
+        rows = {
+            row.scope: row for row in
+            db.session.query(DataVersion.scope, DataVersion.version, DataVersion.updated_at).filter(DataVersion.scope.in_(scopes))
+        }
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        print(f"Data Version Lookup Error: {e}")
+        return None
+    parts = [f"{scope}={rows[scope].version if scope in rows else 0}" for scope in scopes]
+    changed = [row.updated_at for row in rows.values() if row.updated_at is not None]
+    return parts, max(changed) if changed else None
+
 # --- 5. PREDICTION, HISTORY, RECOMMENDATIONS API ENDPOINTS ---
+# Rules live in recommendation_rules.py (built-in) or the RECOMMENDATION_RULES_PATH file
+recommendation_engine = RecommendationEngine(
+    app.config['RECOMMENDATION_RULES_PATH'],
+    check_interval=app.config['RECOMMENDATION_RULES_CHECK_INTERVAL']
+)
+
 def generate_recommendations(user_inputs, prediction_result):
-    recommendations = []
-    if prediction_result == "Yes":
-        recommendations.append("It is highly recommended to consult a healthcare professional to discuss these results.")
+    return recommendation_engine.rules().evaluate([user_inputs], [prediction_result])[0]
+
+def generate_recommendations_batch(records, results):
+    """generate_recommendations() for many records in one vectorized pass."""
+    return recommendation_engine.rules().evaluate(records, results)
+
+def save_recommendations(prediction_ids, recommendation_lists):
+    """Bulk-inserts the Recommendation rows of one or more predictions (caller commits)."""
+    now = datetime.utcnow()
+    rows = [
+        {'text': text, 'prediction_id': prediction_id, 'created_at': now}
+        for prediction_id, texts in zip(prediction_ids, recommendation_lists)
+        for text in texts
+    ]
+    if rows:
+        db.session.execute(db.insert(Recommendation), rows)
+
+def insert_predictions(rows, recommendation_lists):
+    """
+    Inserts Prediction rows (dicts of column values) and their recommendations
+    with one executemany INSERT each (caller commits). Returns the new IDs.
+    """
+    # RETURNING gives the new IDs back in parameter order for the recommendations
+    prediction_ids = db.session.scalars(
+        db.insert(Prediction).returning(Prediction.id, sort_by_parameter_order=True), rows
+    ).all()
+    save_recommendations(prediction_ids, recommendation_lists)
+    record_predictions_in_summary(rows, prediction_ids)
+    bump_data_versions(f"predictions:{row['user_id']}" for row in rows)
+    return prediction_ids
+
+# --- Patient summary maintenance ---
+# Each helper is one UPDATE of patient_summary in the caller's transaction, so a
+# summary commits (or rolls back) together with the rows it describes. Counters
+# are incremented in SQL and the "latest" columns only move forward, so request
+# threads and the write-behind flusher can't overwrite each other's updates.
+# Users without a summary row (doctors) are simply not matched.
+def record_predictions_in_summary(rows, prediction_ids):
+    """Counts new predictions and advances each owner's latest prediction (caller commits)."""
+    per_user = {}
+    for row, prediction_id in zip(rows, prediction_ids):
+        count, latest = per_user.get(row['user_id'], (0, None))
+        if latest is None or (row['timestamp'], prediction_id) > (latest[0]['timestamp'], latest[1]):
+            latest = (row, prediction_id)
+        per_user[row['user_id']] = (count + 1, latest)
+    if not per_user:
+        return
+    now = datetime.utcnow()
+    params = [
+        {'s_uid': user_id, 's_n': count, 's_id': prediction_id, 's_result': row['result'],
+         's_prob': row['probability'], 's_at': row['timestamp'], 's_now': now}
+        for user_id, (count, (row, prediction_id)) in per_user.items()
+    ]
+    t = PatientSummary.__table__
+    at, new_id = db.bindparam('s_at'), db.bindparam('s_id')
+    # SET expressions all see the row as it was, so `newer` is evaluated once against the old latest
+    newer = db.or_(
+        t.c.latest_prediction_at.is_(None),
+        at > t.c.latest_prediction_at,
+        db.and_(at == t.c.latest_prediction_at, new_id > t.c.latest_prediction_id)
+    )
+    db.session.execute(
+        db.update(t).where(t.c.user_id == db.bindparam('s_uid')).values(
+            prediction_count=t.c.prediction_count + db.bindparam('s_n'),
+            latest_prediction_id=db.case((newer, new_id), else_=t.c.latest_prediction_id),
+            latest_result=db.case((newer, db.bindparam('s_result')), else_=t.c.latest_result),
+            latest_probability=db.case((newer, db.bindparam('s_prob')), else_=t.c.latest_probability),
+            latest_prediction_at=db.case((newer, at), else_=t.c.latest_prediction_at),
+            updated_at=db.bindparam('s_now')
+        ),
+        params
+    )
+
+def adjust_pending_appointments(patient_id, delta):
+    """Adds `delta` to a patient's pending appointment count (caller commits)."""
+    db.session.execute(
+        db.update(PatientSummary).where(PatientSummary.user_id == patient_id).values(
+            pending_appointments=PatientSummary.pending_appointments + delta,
+            updated_at=datetime.utcnow()
+        )
+    )
+
+# Notes from before note_updated_at existed count as written when the prediction was made
+note_time = db.func.coalesce(Prediction.note_updated_at, Prediction.timestamp)
+has_note = db.and_(Prediction.doctor_note.isnot(None), Prediction.doctor_note != '')
+
+def refresh_latest_note(patient_id):
+    """Recomputes a patient's latest note time, e.g. after a note was cleared (caller commits)."""
+    latest = db.select(db.func.max(note_time)).where(Prediction.user_id == patient_id, has_note).scalar_subquery()
+    db.session.execute(
+        db.update(PatientSummary).where(PatientSummary.user_id == patient_id).values(
+            latest_note_at=latest,
+            updated_at=datetime.utcnow()
+        )
+    )
+
+def rebuild_patient_summaries():
+    """Recomputes every patient's summary from the source tables (caller commits). Returns the row count."""
+    counts = dict(db.session.query(Prediction.user_id, db.func.count(Prediction.id)).group_by(Prediction.user_id).all())
+    ranked = db.session.query(
+        Prediction.user_id,
+        Prediction.id,
+        Prediction.result,
+        Prediction.probability,
+        Prediction.timestamp,
+        db.func.row_number().over(
+            partition_by=Prediction.user_id,
+            order_by=(Prediction.timestamp.desc(), Prediction.id.desc())
+        ).label('rank')
+    ).subquery()
+    latest = {r.user_id: r for r in db.session.query(ranked).filter(ranked.c.rank == 1)}
+    notes = dict(db.session.query(Prediction.user_id, db.func.max(note_time)).filter(has_note).group_by(Prediction.user_id).all())
+    pending = dict(db.session.query(
+        Appointment.patient_id, db.func.count(Appointment.id)
+    ).filter(Appointment.status == 'Pending').group_by(Appointment.patient_id).all())
+
+    now = datetime.utcnow()
+    rows = []
+    for user_id, full_name in db.session.query(User.id, User.full_name).filter(User.role == 'patient'):
+        last = latest.get(user_id)
+        rows.append({
+            'user_id': user_id, 'full_name': full_name,
+            'prediction_count': counts.get(user_id, 0),
+            'latest_prediction_id': last.id if last else None,
+            'latest_result': last.result if last else None,
+            'latest_probability': last.probability if last else None,
+            'latest_prediction_at': last.timestamp if last else None,
+            'latest_note_at': notes.get(user_id),
+            'pending_appointments': pending.get(user_id, 0),
+            'updated_at': now,
+        })
+    db.session.execute(db.delete(PatientSummary))
+    if rows:
+        db.session.execute(db.insert(PatientSummary), rows)
+    return len(rows)
+
+def flush_predictions(items):
+    """Write-behind flush: commits a batch of queued (row, recommendations) in one transaction."""
+    with app.app_context():
+        try:
+            prediction_ids = insert_predictions([row for row, _ in items], [recs for _, recs in items])
+            db.session.commit()
+            return prediction_ids
+        except Exception:
+            db.session.rollback()
+            raise
+
+if app.config['PREDICTION_WRITE_MODE'] in ('wait', 'async'):
+    prediction_writer = WriteBehindQueue(
+        flush_predictions,
+        max_queue_size=app.config['PREDICTION_WRITE_QUEUE_SIZE'],
+        max_batch_size=app.config['PREDICTION_WRITE_BATCH'],
+        flush_interval_ms=app.config['PREDICTION_WRITE_INTERVAL_MS'],
+        enqueue_timeout=app.config['PREDICTION_WRITE_ENQUEUE_TIMEOUT']
+    )
+    atexit.register(prediction_writer.drain) # flush what's queued before the process exits
+else:
+    prediction_writer = None
+
+def score_batch(records):
+    """
+    Scores a list of raw input dicts through both pipelines in a single
+    vectorized pass and applies the 'weighted_average' threshold in bulk.
+    Returns (results, probabilities, model_version); the two lists are
+    aligned with `records`.
+    """
+    bundle = model_loader.get()
+    server = acquire_model_server(bundle)
+    if server is not None:
+        try:
+            probs_lr, probs_xgb = server.predict_proba_records(records)
+        finally:
+            server.release()
     else:
-        recommendations.append("Continue to maintain a healthy lifestyle and schedule regular checkups with your doctor.")
-    if user_inputs.get('Smoking_History') == 'Yes':
-        recommendations.append("Quitting smoking is one of the most impactful steps you can take to improve cardiovascular health.")
-    if user_inputs.get('BMI') is not None:
-         try:
-            bmi_float = float(user_inputs.get('BMI', 0))
-            if bmi_float >= 25.0:
-                recommendations.append("Aiming for a BMI below 25 can significantly reduce heart disease risk.")
-            if bmi_float < 18.5:
-                 recommendations.append("Your BMI is low. Consult a doctor or nutritionist for advice on maintaining a healthy weight.")
-         except ValueError:
-             print(f"Could not convert BMI value '{user_inputs.get('BMI')}' to float.") # Log error
-    if user_inputs.get('Exercise') == 'No':
-         recommendations.append("Incorporating regular exercise, like 30 minutes of moderate activity most days, is beneficial for heart health.")
-    # Add more rules as needed
-    return recommendations
+        probs_lr, probs_xgb = bundle.predict_proba(records)
+
+    # Blend weights are chosen by model_trainer.py and saved with the thresholds
+    weighted_avg_probs, results = bundle.blend(probs_lr, probs_xgb)
+    return results.tolist(), weighted_avg_probs.tolist(), bundle.version
+
+if app.config['PREDICT_COALESCE_MAX_WAIT_MS'] > 0:
+    prediction_coalescer = PredictionCoalescer(
+        score_batch,
+        max_wait_ms=app.config['PREDICT_COALESCE_MAX_WAIT_MS'],
+        max_batch_size=app.config['PREDICT_COALESCE_MAX_BATCH'],
+        # Keep every worker process busy while the next batch is collected
+        max_in_flight=max(1, app.config['MODEL_WORKERS'])
+    )
+else:
+    prediction_coalescer = None
+
+if app.config['PREDICTION_CACHE_SIZE'] > 0:
+    prediction_cache = PredictionCache(app.config['PREDICTION_CACHE_SIZE'], app.config['PREDICTION_CACHE_TTL'])
+    # Keys already include the version; clearing just frees the stale entries
+    model_loader.on_reload(lambda old, new: prediction_cache.clear())
+else:
+    prediction_cache = None
+
+def _cache_key(record, bundle, model_version=None):
+    return canonical_key(record, bundle.input_features, bundle.numerical_features, model_version or bundle.version)
+
+def score_one(record):
+    """
+    Scores a single record, answering from the prediction cache when possible
+    and otherwise sharing a batch with concurrent callers when coalescing is
+    on. Returns (result, probability, model_version).
+    """
+    bundle = model_loader.get()
+    if prediction_cache is not None:
+        cached = prediction_cache.get(_cache_key(record, bundle))
+        if cached is not None:
+            return cached
+
+    if prediction_coalescer is not None:
+        scored = prediction_coalescer.submit(record)
+    else:
+        results, probabilities, model_version = score_batch([record])
+        scored = (results[0], probabilities[0], model_version)
+
+    if prediction_cache is not None:
+        prediction_cache.put(_cache_key(record, bundle, scored[2]), scored)
+    return scored
+
+def score_records(records):
+    """score_batch() that only sends cache misses to the models."""
+    if prediction_cache is None:
+        return score_batch(records)
+    bundle = model_loader.get()
+    keys = [_cache_key(r, bundle) for r in records]
+    cached = [prediction_cache.get(k) for k in keys]
+    misses = [i for i, hit in enumerate(cached) if hit is None]
+
+    model_version = bundle.version
+    if misses:
+        results, probabilities, model_version = score_batch([records[i] for i in misses])
+        if model_version != bundle.version and len(misses) < len(records):
+            # Models were hot-swapped mid-call; rescore so every row has one version
+            return score_batch(records)
+        for i, result, probability in zip(misses, results, probabilities):
+            cached[i] = (result, probability, model_version)
+            prediction_cache.put(_cache_key(records[i], bundle, model_version), cached[i])
+    return [c[0] for c in cached], [c[1] for c in cached], model_version
 
 @app.route("/api/predict", methods=["POST"])
 @jwt_required()
 def predict():
-    # Check if models are loaded (this is from your original code)
-    if not all([lr_pipeline, xgb_pipeline, thresholds]):
+    # Check if models are loaded (loads them on first use)
+    bundle = model_loader.get()
+    if bundle is None:
         return jsonify({"message": "ML models are not loaded. Server setup is incomplete."}), 500
     
     json_data = None # Define here so 'except' block can access it
     try:
         user_id = int(get_jwt_identity())
-        json_data = request.get_json()
+        with stage('parse'):
+            json_data = request.get_json()
 
         if not json_data:
              return jsonify({"message": "No input data provided."}), 400
 
-        # --- FIX ---
-        # Create the DataFrame directly from the raw form data.
-        # The new model pipelines handle all preprocessing.
-        input_df = pd.DataFrame([json_data])
-        # --- END FIX ---
-        
-        # --- Model Prediction ---
-        probs_lr = lr_pipeline.predict_proba(input_df)[:, 1]
-        probs_xgb = xgb_pipeline.predict_proba(input_df)[:, 1]
-        
-        weighted_avg_prob = (0.3 * probs_lr) + (0.7 * probs_xgb)
-        
-        if 'weighted_average' not in thresholds:
+        if 'weighted_average' not in bundle.thresholds:
             print("Error: 'weighted_average' key not found in best_thresholds.pkl")
             return jsonify({'message': 'Server configuration error: Missing threshold.'}), 500
-            
-        threshold = thresholds['weighted_average']
-        prediction_value = (weighted_avg_prob >= threshold).astype(int)[0]
-        prediction_result = "Yes" if prediction_value == 1 else "No"
-        probability_score = weighted_avg_prob[0]
+
+        # --- Model Prediction ---
+        # The model pipelines handle all preprocessing of the raw form data.
+        with stage('score'):
+            prediction_result, probability_score, model_version = score_one(json_data)
         
         # --- Recommendations & Database ---
         # Pass the original string data to recommendations
-        recommendation_list = generate_recommendations(json_data, prediction_result)
+        with stage('recommendations'):
+            recommendation_list = generate_recommendations(json_data, prediction_result)
 
-        new_prediction = Prediction(result=prediction_result, probability=probability_score, user_id=user_id, input_data=json.dumps(json_data))
-        db.session.add(new_prediction)
-        db.session.commit()
+        row = {'result': prediction_result, 'probability': probability_score, 'user_id': user_id, 'input_data': json.dumps(json_data), 'timestamp': datetime.utcnow(), 'model_version': model_version}
+        with stage('db_write'):
+            if prediction_writer is None:
+                insert_predictions([row], [recommendation_list])
+                db.session.commit()
+            else:
+                try:
+                    written = prediction_writer.submit((row, recommendation_list))
+                except WriteBehindFull as e:
+                    print(f"Prediction not saved: {e}")
+                    return jsonify({'message': 'Server is busy. Please try again shortly.'}), 503, {'Retry-After': '1'}
+                if app.config['PREDICTION_WRITE_MODE'] == 'wait':
+                    written.result(timeout=app.config['PREDICTION_WRITE_WAIT_TIMEOUT'])
 
         response = {
             'prediction': prediction_result,
             'probability': f"{probability_score * 100:.2f}%",
-            'recommendations': recommendation_list
+            'recommendations': recommendation_list,
+            'model_version': model_version
         }
         return jsonify(response)
     
@@ -229,47 +811,347 @@ def predict():
         db.session.rollback() # Rollback any partial DB changes
         return jsonify({'message': f"An unexpected server error occurred."}), 500
 
+# Batch-size and queue-wait histograms for tuning the coalescer
+@app.route("/api/predict/coalescer_stats", methods=["GET"])
+def get_coalescer_stats():
+    if prediction_coalescer is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **prediction_coalescer.stats()}), 200
+
+# Hit/miss/eviction counters of the prediction cache
+@app.route("/api/predict/cache_stats", methods=["GET"])
+def get_prediction_cache_stats():
+    if prediction_cache is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **prediction_cache.stats()}), 200
+
+# Queue depth, flush sizes and failures of the prediction write-behind queue
+@app.route("/api/predict/write_stats", methods=["GET"])
+def get_prediction_write_stats():
+    if prediction_writer is None:
+        return jsonify({'enabled': False, 'mode': app.config['PREDICTION_WRITE_MODE']}), 200
+    return jsonify({'enabled': True, 'mode': app.config['PREDICTION_WRITE_MODE'], **prediction_writer.stats()}), 200
+
+def collect_app_metrics():
+    """Scrape-time values for /metrics from the model loader, cache, coalescer and write queue."""
+    families = [('model_ready', 'gauge', 'Whether the models are loaded (1) or not (0).', int(model_loader.state == ModelLoader.READY))]
+    stats = password_hasher.stats()
+    families += [
+        ('password_hashes_total', 'counter', 'Passwords hashed on the bcrypt pool.', stats['hashed']),
+        ('password_checks_total', 'counter', 'Password checks on the bcrypt pool.', stats['checked']),
+        ('password_hash_rejections_total', 'counter', 'Auth requests refused because the bcrypt pool was saturated.', stats['rejected']),
+    ]
+    if prediction_cache is not None:
+        stats = prediction_cache.stats()
+        families += [
+            ('prediction_cache_hits_total', 'counter', 'Prediction cache hits.', stats['hits']),
+            ('prediction_cache_misses_total', 'counter', 'Prediction cache misses.', stats['misses']),
+            ('prediction_cache_evictions_total', 'counter', 'Prediction cache LRU evictions.', stats['evictions']),
+            ('prediction_cache_entries', 'gauge', 'Entries in the prediction cache.', stats['size']),
+        ]
+    if prediction_coalescer is not None:
+        stats = prediction_coalescer.stats()
+        families += [
+            ('coalescer_queue_depth', 'gauge', 'Predictions waiting to be batched.', stats['queue_depth']),
+            ('coalescer_batch_size', 'histogram', 'Records per coalesced scoring batch.', stats['batch_size']),
+            ('coalescer_wait_seconds', 'histogram', 'Time a prediction waited for its batch.', scale_snapshot(stats['wait_ms'], 0.001)),
+        ]
+    if prediction_writer is not None:
+        stats = prediction_writer.stats()
+        families += [
+            ('prediction_write_queue_depth', 'gauge', 'Prediction rows waiting to be committed.', stats['queue_depth']),
+            ('prediction_writes_total', 'counter', 'Prediction rows committed by the write-behind queue.', stats['written']),
+            ('prediction_write_failures_total', 'counter', 'Prediction rows the write-behind queue dropped.', stats['failed']),
+            ('prediction_write_rejections_total', 'counter', 'Predictions refused because the queue was full.', stats['rejected']),
+            ('prediction_write_flush_seconds', 'histogram', 'Duration of one write-behind batch commit.', scale_snapshot(stats['flush_ms'], 0.001)),
+        ]
+    return families
+
+metrics.register_collector(collect_app_metrics)
+
+# Endpoint for scoring a whole roster of patient records in one request.
+# Body: {"records": [{...16 model features..., "patient_id": optional}, ...]}
+# Doctors may attach each record to a patient via "patient_id"; otherwise
+# every prediction is stored against the calling user.
+@app.route("/api/predict/batch", methods=["POST"])
+@jwt_required()
+def predict_batch():
+    bundle = model_loader.get()
+    if bundle is None:
+        return jsonify({"message": "ML models are not loaded. Server setup is incomplete."}), 500
+
+    try:
+        user_id = int(get_jwt_identity())
+        data = request.get_json()
+        records = data.get('records') if isinstance(data, dict) else None
+
+        if not records or not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            return jsonify({"message": "Request body must contain a non-empty 'records' list."}), 400
+        if len(records) > app.config['PREDICT_BATCH_MAX_RECORDS']:
+            return jsonify({"message": f"Batch too large. Maximum is {app.config['PREDICT_BATCH_MAX_RECORDS']} records."}), 413
+
+        if 'weighted_average' not in bundle.thresholds:
+            print("Error: 'weighted_average' key not found in best_thresholds.pkl")
+            return jsonify({'message': 'Server configuration error: Missing threshold.'}), 500
+
+        # Resolve who each prediction belongs to before doing any scoring
+        features = [{k: v for k, v in r.items() if k != 'patient_id'} for r in records]
+        owner_ids = [user_id] * len(records)
+        if any(r.get('patient_id') is not None for r in records):
+            if not current_user_has_role('doctor'):
+                return jsonify({'error': 'Access forbidden: Only doctors can score records for patients'}), 403
+            try:
+                # int() each id before anything hashes it: a list or dict id is a 400 like any other bad id
+                owner_ids = [int(r['patient_id']) if r.get('patient_id') is not None else user_id for r in records]
+            except (ValueError, TypeError, OverflowError):
+                return jsonify({'error': 'Invalid patient_id format'}), 400
+            requested_ids = {owner_id for r, owner_id in zip(records, owner_ids) if r.get('patient_id') is not None}
+            found = {row.id for row in db.session.query(User.id).filter(User.id.in_(requested_ids), User.role == 'patient')}
+            missing = requested_ids - found
+            if missing:
+                return jsonify({'error': f'Patients not found: {sorted(missing)}'}), 404
+
+        try:
+            results, probabilities, model_version = score_records(features)
+        except (ValueError, TypeError, KeyError) as ve:
+            print(f"Batch Prediction Data Error: {ve}")
+            return jsonify({'message': 'Invalid input data in batch. Every record needs all model features.'}), 400
+
+        now = datetime.utcnow()
+        rows = []
+        output = []
+        with stage('recommendations'):
+            recommendation_lists = generate_recommendations_batch(features, results)
+        for i, (record, owner_id, result, probability, recommendation_list) in enumerate(zip(features, owner_ids, results, probabilities, recommendation_lists)):
+            rows.append({'result': result, 'probability': probability, 'user_id': owner_id, 'input_data': json.dumps(record), 'timestamp': now, 'model_version': model_version})
+            output.append({
+                'index': i,
+                'patient_id': owner_id,
+                'prediction': result,
+                'probability': f"{probability * 100:.2f}%",
+                'recommendations': recommendation_list
+            })
+
+        # One executemany INSERT for the whole batch instead of one per row
+        insert_predictions(rows, recommendation_lists)
+        db.session.commit()
+
+        return jsonify({'count': len(output), 'model_version': model_version, 'results': output}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Batch Prediction Error: {e}")
+        print(traceback.format_exc())
+        return jsonify({'message': "An unexpected server error occurred."}), 500
+
+# --- Keyset pagination helpers ---
+# Pages are ordered by (timestamp, id) descending. The cursor encodes the last
+# row of the previous page, so every page is an index range scan on
+# ix_prediction_user_timestamp no matter how deep the client pages.
+# The body stays a plain list; the next cursor is sent in X-Next-Cursor.
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def get_page_limit():
+    try:
+        limit = int(request.args.get('limit', app.config['HISTORY_PAGE_SIZE']))
+    except ValueError:
+        raise ValueError("Invalid limit")
+    return max(1, min(limit, app.config['HISTORY_MAX_PAGE_SIZE']))
+
+def get_page_args():
+    """Returns (limit, after) from the query string; raises ValueError on bad input."""
+    limit = get_page_limit()
+    cursor = request.args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+def keyset_filter(query, timestamp_col, id_col, after):
+    if after is not None:
+        after_ts, after_id = after
+        query = query.filter(db.or_(
+            timestamp_col < after_ts,
+            db.and_(timestamp_col == after_ts, id_col < after_id)
+        ))
+    return query
+
+def keyset_page(query, timestamp_col, id_col, limit, after):
+    query = keyset_filter(query, timestamp_col, id_col, after)
+    rows = query.order_by(timestamp_col.desc(), id_col.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if has_more else None
+    return rows, next_cursor
+
+def paginated_response(items, next_cursor):
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        # Keep the other query parameters (e.g. the dashboard's sort) in the next link
+        args = dict(request.args.items(), limit=request.args.get('limit', app.config['HISTORY_PAGE_SIZE']), cursor=next_cursor)
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response, 200
+
+# Pages sorted on another column carry (sort value, id) in the cursor instead.
+# NULL sort values (e.g. no prediction yet) come last in either direction.
+def encode_sort_cursor(value, row_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode()
+
+def decode_sort_cursor(cursor, is_datetime=False):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if is_datetime and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def sorted_keyset_page(query, sort_col, id_col, descending, limit, after):
+    past = (lambda col, value: col < value) if descending else (lambda col, value: col > value)
+    if after is not None:
+        after_value, after_id = after
+        if after_value is None:
+            query = query.filter(sort_col.is_(None), past(id_col, after_id))
+        else:
+            query = query.filter(db.or_(
+                past(sort_col, after_value),
+                db.and_(sort_col == after_value, past(id_col, after_id)),
+                sort_col.is_(None)
+            ))
+    direction = (lambda col: col.desc()) if descending else (lambda col: col.asc())
+    rows = query.order_by(sort_col.is_(None), direction(sort_col), direction(id_col)).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_sort_cursor(getattr(rows[-1], sort_col.key), getattr(rows[-1], id_col.key)) if has_more else None
+    return rows, next_cursor
+
+def format_local_timestamp(timestamp):
+    return timestamp.replace(tzinfo=timezone.utc).astimezone(tz=None).strftime("%Y-%m-%d %I:%M %p")
+
+def prediction_history_page(user_id, limit, after):
+    """One keyset page of a user's predictions, selecting only the columns the history views need."""
+    query = db.session.query(
+        Prediction.id,
+        Prediction.result,
+        Prediction.probability,
+        Prediction.timestamp
+    ).filter(Prediction.user_id == user_id)
+    rows, next_cursor = keyset_page(query, Prediction.timestamp, Prediction.id, limit, after)
+    history_list = [
+        {
+            'id': p.id,
+            'result': p.result,
+            'probability': f"{p.probability * 100:.2f}%",
+            'timestamp': format_local_timestamp(p.timestamp)
+        } for p in rows
+    ]
+    return history_list, next_cursor
+
 @app.route("/api/history", methods=["GET"])
 @jwt_required()
+@conditional_get(lambda: data_versions(f'predictions:{get_jwt_identity()}'))
 def get_history():
     try:
         user_id = int(get_jwt_identity())
-        predictions = Prediction.query.filter_by(user_id=user_id).order_by(Prediction.timestamp.desc()).all()
-        history_list = [{'id': p.id, 'result': p.result, 'probability': f"{p.probability * 100:.2f}%", 'timestamp': p.timestamp.replace(tzinfo=timezone.utc).astimezone(tz=None).strftime("%Y-%m-%d %I:%M %p")} for p in predictions]
-        return jsonify(history_list), 200
+        try:
+            limit, after = get_page_args()
+        except ValueError as ve:
+            return jsonify({'error': str(ve)}), 400
+        history_list, next_cursor = prediction_history_page(user_id, limit, after)
+        return paginated_response(history_list, next_cursor)
     except Exception as e:
         print(f"History Fetch Error: {e}")
         return jsonify({'error': str(e)}), 500
 
+def recommendations_validators():
+    # Predictions without stored recommendations are rendered with the live rules
+    validators = data_versions(f'predictions:{get_jwt_identity()}')
+    if validators is None:
+        return None
+    parts, updated_at = validators
+    return parts + [recommendation_engine.rules().fingerprint], updated_at
+
 @app.route('/api/recommendations', methods=['GET'])
 @jwt_required()
+@conditional_get(recommendations_validators)
 def get_recommendations():
-    current_user = get_jwt_identity()
+    current_user = int(get_jwt_identity())
+    try:
+        limit, after = get_page_args()
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
+
+    # One page of predictions (keyset, index-backed) joined to their stored recommendations
+    page = keyset_filter(
+        db.session.query(Prediction.id, Prediction.timestamp, Prediction.result).filter(Prediction.user_id == current_user),
+        Prediction.timestamp, Prediction.id, after
+    ).order_by(Prediction.timestamp.desc(), Prediction.id.desc()).limit(limit + 1).subquery()
+    rows = db.session.query(
+        page.c.id,
+        page.c.timestamp,
+        page.c.result,
+        Recommendation.text
+    ).outerjoin(
+        Recommendation, Recommendation.prediction_id == page.c.id
+    ).order_by(
+        page.c.timestamp.desc(), page.c.id.desc(), Recommendation.id
+    ).all()
 
-    predictions = Prediction.query.filter_by(user_id=current_user).order_by(Prediction.timestamp.desc()).all()
     output = []
+    by_id = {}
+    for row in rows:
+        entry = by_id.get(row.id)
+        if entry is None:
+            entry = by_id[row.id] = {
+                "id": row.id,
+                "raw_timestamp": row.timestamp,
+                "timestamp": format_local_timestamp(row.timestamp),
+                "result": row.result,
+                "recommendations": []
+            }
+            output.append(entry)
+        if row.text is not None:
+            entry["recommendations"].append(row.text)
 
-    for pred in predictions:
-        # Assuming you store input_data as JSON string in Prediction
-        try:
-            user_inputs = json.loads(pred.input_data)
-        except Exception:
-            user_inputs = {}
+    next_cursor = None
+    if len(output) > limit:
+        output = output[:limit]
+        next_cursor = encode_cursor(output[-1]["raw_timestamp"], output[-1]["id"])
 
-        recs = generate_recommendations(user_inputs, pred.result)
-        output.append({
-            "timestamp": pred.timestamp.replace(tzinfo=timezone.utc).astimezone(tz=None).strftime("%Y-%m-%d %I:%M %p"),
-            "result": pred.result,
-            "recommendations": recs
-        })
+    # Rows written before recommendations were stored and not yet backfilled
+    legacy_ids = [entry["id"] for entry in output if not entry["recommendations"]]
+    if legacy_ids:
+        inputs = dict(db.session.query(Prediction.id, Prediction.input_data).filter(Prediction.id.in_(legacy_ids)).all())
+        legacy_entries = [entry for entry in output if entry["id"] in inputs]
+        legacy_inputs = []
+        for entry in legacy_entries:
+            try:
+                legacy_inputs.append(json.loads(inputs[entry["id"]]))
+            except Exception:
+                legacy_inputs.append({})
+        lists = generate_recommendations_batch(legacy_inputs, [entry["result"] for entry in legacy_entries])
+        for entry, recommendation_list in zip(legacy_entries, lists):
+            entry["recommendations"] = recommendation_list
 
-    return jsonify(output), 200
+    for entry in output:
+        del entry["id"], entry["raw_timestamp"]
+    return paginated_response(output, next_cursor)
 
 # --- 6. APPOINTMENT API ENDPOINTS ---
 
 # Endpoint for patients to get a list of doctors
 @app.route("/api/doctors", methods=["GET"])
 @jwt_required()
+@conditional_get(lambda: data_versions('doctors'))
 def get_doctors():
     try:
         # Join User and Doctor tables to get name and specialization
@@ -328,6 +1210,8 @@ def book_appointment():
             reason=reason # Will be None if not provided, which is okay
         )
         db.session.add(new_appointment)
+        adjust_pending_appointments(user_id, 1)
+        bump_data_versions([f'appointments:{user_id}', f'appointments:{doctor_id}'])
         db.session.commit()
         
         return jsonify({'message': 'Appointment requested successfully'}), 201
@@ -341,6 +1225,7 @@ def book_appointment():
 # Endpoint for patients to view their appointments
 @app.route("/api/appointments", methods=["GET"])
 @jwt_required()
+@conditional_get(lambda: data_versions(f'appointments:{get_jwt_identity()}'))
 def get_appointments():
     try:
         user_id = int(get_jwt_identity())
@@ -378,15 +1263,11 @@ def get_appointments():
     
 # --- DOCTOR: GET all appointments assigned to this doctor ---
 @app.route("/api/doctor/appointments", methods=["GET"])
-@jwt_required()
+@doctor_required(error='Access forbidden: Not a doctor')
+@conditional_get(lambda: data_versions(f'appointments:{get_jwt_identity()}'))
 def get_doctor_appointments():
     try:
         doctor_id = int(get_jwt_identity())
-        
-        # Security check: ensure the user is a doctor
-        user = User.query.filter_by(id=doctor_id, role='doctor').first()
-        if not user:
-            return jsonify({'error': 'Access forbidden: Not a doctor'}), 403
 
         # Query appointments, joining with User to get patient's name
         appointments = db.session.query(
@@ -440,8 +1321,16 @@ def update_appointment_status(appointment_id):
         if appointment.doctor_id != doctor_id:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        # Update the status
+        # Update the status. Only the request that actually moves it out of
+        # Pending decrements the patient's pending count.
+        if appointment.status == 'Pending':
+            moved = db.session.execute(
+                db.update(Appointment).where(Appointment.id == appointment_id, Appointment.status == 'Pending').values(status=new_status)
+            ).rowcount
+            if moved:
+                adjust_pending_appointments(appointment.patient_id, -1)
         appointment.status = new_status
+        bump_data_versions([f'appointments:{appointment.patient_id}', f'appointments:{doctor_id}'])
         db.session.commit()
         
         return jsonify({'message': f'Appointment {appointment_id} updated to {new_status}'}), 200
@@ -453,15 +1342,10 @@ def update_appointment_status(appointment_id):
     
 # --- DOCTOR: GET all patients ---
 @app.route("/api/doctor/patients", methods=["GET"])
-@jwt_required()
+@doctor_required()
+@conditional_get(lambda: data_versions('patients'))
 def get_all_patients():
     try:
-        # Security check: ensure user is a doctor
-        doctor_id = int(get_jwt_identity())
-        user = User.query.filter_by(id=doctor_id, role='doctor').first()
-        if not user:
-            return jsonify({'error': 'Access forbidden'}), 403
-
         # Query all patients and their details
         patients = db.session.query(
             User.id,
@@ -495,32 +1379,23 @@ def get_all_patients():
 
 # --- DOCTOR: GET prediction history for a specific patient ---
 @app.route("/api/doctor/patient_history/<int:patient_id>", methods=["GET"])
-@jwt_required()
+@doctor_required()
+@conditional_get(lambda patient_id: data_versions(f'predictions:{patient_id}'))
 def get_patient_history_for_doctor(patient_id):
     try:
-        # Security check: ensure user is a doctor
-        doctor_id = int(get_jwt_identity())
-        user = User.query.filter_by(id=doctor_id, role='doctor').first()
-        if not user:
-            return jsonify({'error': 'Access forbidden'}), 403
-        
         # Check if patient exists
         patient = User.query.filter_by(id=patient_id, role='patient').first()
         if not patient:
             return jsonify({'error': 'Patient not found'}), 404
 
+        try:
+            limit, after = get_page_args()
+        except ValueError as ve:
+            return jsonify({'error': str(ve)}), 400
+
         # Query predictions for this specific patient
-        predictions = Prediction.query.filter_by(user_id=patient_id).order_by(Prediction.timestamp.desc()).all()
-        history_list = [
-            {
-                'id': p.id,
-                'result': p.result,
-                'probability': f"{p.probability * 100:.2f}%",
-                'timestamp': p.timestamp.replace(tzinfo=timezone.utc).astimezone(tz=None).strftime("%Y-%m-%d %I:%M %p")
-            } for p in predictions
-        ]
-        
-        return jsonify(history_list), 200
+        history_list, next_cursor = prediction_history_page(patient_id, limit, after)
+        return paginated_response(history_list, next_cursor)
 
     except Exception as e:
         print(f"Get Patient History Error: {e}")
@@ -528,15 +1403,9 @@ def get_patient_history_for_doctor(patient_id):
 
 # --- DOCTOR: GET full details of a single prediction ---
 @app.route("/api/doctor/prediction_details/<int:prediction_id>", methods=["GET"])
-@jwt_required()
+@doctor_required()
 def get_prediction_details(prediction_id):
     try:
-        # Security check: ensure user is a doctor
-        doctor_id = int(get_jwt_identity())
-        user = User.query.filter_by(id=doctor_id, role='doctor').first()
-        if not user:
-            return jsonify({'error': 'Access forbidden'}), 403
-
         # Find the prediction
         prediction = Prediction.query.get(prediction_id)
         if not prediction:
@@ -551,8 +1420,9 @@ def get_prediction_details(prediction_id):
             'result': prediction.result,
             'probability': f"{prediction.probability * 100:.2f}%",
             'inputs': json.loads(prediction.input_data), # Send all the raw inputs
-            'doctor_note': prediction.doctor_note or ''
-            
+            'doctor_note': prediction.doctor_note or '',
+            'confirmed_outcome': prediction.confirmed_outcome
+
         }), 200
 
     except Exception as e:
@@ -561,15 +1431,9 @@ def get_prediction_details(prediction_id):
 
 # --- DOCTOR: Add/Update a note on a prediction ---
 @app.route("/api/doctor/prediction_note/<int:prediction_id>", methods=["PUT"])
-@jwt_required()
+@doctor_required()
 def add_doctor_note(prediction_id):
     try:
-        # Security check: ensure user is a doctor
-        doctor_id = int(get_jwt_identity())
-        user = User.query.filter_by(id=doctor_id, role='doctor').first()
-        if not user:
-            return jsonify({'error': 'Access forbidden'}), 403
-
         # Find the prediction
         prediction = Prediction.query.get(prediction_id)
         if not prediction:
@@ -581,6 +1445,9 @@ def add_doctor_note(prediction_id):
 
         # Update and save the note
         prediction.doctor_note = note
+        prediction.note_updated_at = datetime.utcnow() if note else None
+        db.session.flush()
+        refresh_latest_note(prediction.user_id)
         db.session.commit()
         
         return jsonify({'message': 'Note saved successfully'}), 200
@@ -590,17 +1457,37 @@ def add_doctor_note(prediction_id):
         print(f"Save Note Error: {e}")
         return jsonify({'error': str(e)}), 500
     
+# --- DOCTOR: Record the confirmed outcome of a prediction ---
+# Confirmed outcomes are the labels `python model_trainer.py --incremental` trains on
+@app.route("/api/doctor/prediction_outcome/<int:prediction_id>", methods=["PUT"])
+@doctor_required()
+def set_prediction_outcome(prediction_id):
+    try:
+        data = request.get_json()
+        outcome = data.get('outcome') if data else None
+        if outcome not in ('Yes', 'No', None):
+            return jsonify({'error': "Outcome must be 'Yes', 'No' or null"}), 400
+
+        prediction = Prediction.query.get(prediction_id)
+        if not prediction:
+            return jsonify({'error': 'Prediction not found'}), 404
+
+        prediction.confirmed_outcome = outcome
+        prediction.outcome_confirmed_at = datetime.utcnow() if outcome else None
+        db.session.commit()
+
+        return jsonify({'message': 'Outcome saved successfully'}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Save Outcome Error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # --- DOCTOR: GET all predictions that have a doctor's note ---
 @app.route("/api/doctor/recommendations", methods=["GET"])
-@jwt_required()
+@doctor_required()
 def get_all_recommendations():
     try:
-        # Security check: ensure user is a doctor
-        doctor_id = int(get_jwt_identity())
-        user = User.query.filter_by(id=doctor_id, role='doctor').first()
-        if not user:
-            return jsonify({'error': 'Access forbidden'}), 403
-
         # Query all predictions that have a non-empty doctor_note
         # and join with User to get the patient's name
         notes = db.session.query(
@@ -636,10 +1523,167 @@ def get_all_recommendations():
         print(f"Get All Recommendations Error: {e}")
         return jsonify({'error': str(e)}), 500
     
+# --- DOCTOR: Dashboard of every patient's summary ---
+# ?sort= one of DASHBOARD_SORTS (default 'risk'), ?order=asc|desc, ?limit=&cursor=
+DASHBOARD_SORTS = {
+    'risk': PatientSummary.latest_probability,
+    'latest_prediction': PatientSummary.latest_prediction_at,
+    'latest_note': PatientSummary.latest_note_at,
+    'pending_appointments': PatientSummary.pending_appointments,
+    'predictions': PatientSummary.prediction_count,
+    'name': PatientSummary.full_name,
+}
+
+@app.route("/api/doctor/dashboard", methods=["GET"])
+@doctor_required()
+def get_doctor_dashboard():
+    try:
+        sort = request.args.get('sort', 'risk')
+        if sort not in DASHBOARD_SORTS:
+            return jsonify({'error': f"Invalid sort. Use one of: {', '.join(DASHBOARD_SORTS)}"}), 400
+        order = request.args.get('order', 'asc' if sort == 'name' else 'desc')
+        if order not in ('asc', 'desc'):
+            return jsonify({'error': "Invalid order. Use 'asc' or 'desc'"}), 400
+        sort_col = DASHBOARD_SORTS[sort]
+        try:
+            limit = get_page_limit()
+            cursor = request.args.get('cursor')
+            after = decode_sort_cursor(cursor, is_datetime=isinstance(sort_col.type, db.DateTime)) if cursor else None
+        except ValueError as ve:
+            return jsonify({'error': str(ve)}), 400
+
+        rows, next_cursor = sorted_keyset_page(
+            db.session.query(PatientSummary), sort_col, PatientSummary.user_id, order == 'desc', limit, after
+        )
+        dashboard = [
+            {
+                'patient_id': s.user_id,
+                'full_name': s.full_name,
+                'prediction_count': s.prediction_count,
+                'latest_prediction_id': s.latest_prediction_id,
+                'latest_result': s.latest_result,
+                'latest_probability': f"{s.latest_probability * 100:.2f}%" if s.latest_probability is not None else None,
+                'latest_prediction_at': format_local_timestamp(s.latest_prediction_at) if s.latest_prediction_at else None,
+                'latest_note_at': format_local_timestamp(s.latest_note_at) if s.latest_note_at else None,
+                'pending_appointments': s.pending_appointments
+            } for s in rows
+        ]
+        return paginated_response(dashboard, next_cursor)
+
+    except Exception as e:
+        print(f"Get Dashboard Error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # --- 7. RUN THE FLASK APP & DB SETUP COMMAND ---
+# Columns added after the first release. db.create_all() never alters an
+# existing table, so these are added in place on older databases.
+ADDED_COLUMNS = {
+    'prediction': {
+        'model_version': 'VARCHAR(40)',
+        'confirmed_outcome': 'VARCHAR(10)',
+        'outcome_confirmed_at': 'DATETIME',
+        'note_updated_at': 'DATETIME',
+    },
+}
+
+def ensure_schema():
+    new_summary_table = not db.inspect(db.engine).has_table(PatientSummary.__tablename__)
+    db.create_all() # This will create any missing tables (e.g. Appointment)
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {c['name'] for c in inspector.get_columns(table)}
+            for column, ddl in columns.items():
+                if column not in existing:
+                    conn.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                    print(f"Added column {table}.{column}.")
+        # Likewise, indexes declared on tables that already existed
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+    if new_summary_table:
+        count = rebuild_patient_summaries()
+        db.session.commit()
+        print(f"Built the patient summary for {count} patients.")
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and columns."""
+    ensure_schema()
+    print("Database schema is up to date.")
+
+@app.cli.command('backfill-recommendations')
+@click.option('--batch-size', default=1000, show_default=True, help='Predictions per transaction.')
+def backfill_recommendations_command(batch_size):
+    """Store recommendations for predictions made before they were persisted."""
+    ensure_schema()
+    total = 0
+    last_id = 0
+    while True:
+        batch = db.session.query(
+            Prediction.id,
+            Prediction.result,
+            Prediction.input_data
+        ).outerjoin(
+            Recommendation, Recommendation.prediction_id == Prediction.id
+        ).filter(
+            Prediction.id > last_id,
+            Recommendation.id.is_(None)
+        ).order_by(Prediction.id).limit(batch_size).all()
+        if not batch:
+            break
+        user_inputs = []
+        for pred in batch:
+            try:
+                user_inputs.append(json.loads(pred.input_data))
+            except Exception:
+                user_inputs.append({})
+        recommendation_lists = generate_recommendations_batch(user_inputs, [pred.result for pred in batch])
+        save_recommendations([pred.id for pred in batch], recommendation_lists)
+        db.session.commit()
+        total += len(batch)
+        last_id = batch[-1].id
+        print(f"Backfilled {total} predictions...")
+    print(f"Done. Stored recommendations for {total} predictions.")
+
+@app.cli.command('rebuild-patient-summary')
+def rebuild_patient_summary_command():
+    """Recompute the doctor dashboard's per-patient summary from the source tables."""
+    ensure_schema()
+    count = rebuild_patient_summaries()
+    db.session.commit()
+    print(f"Rebuilt the patient summary for {count} patients.")
+
+@app.cli.command('dump-recommendation-rules')
+@click.argument('path', required=False)
+def dump_recommendation_rules_command(path):
+    """Write the active recommendation rules as JSON (default: RECOMMENDATION_RULES_PATH), to edit them."""
+    path = path or app.config['RECOMMENDATION_RULES_PATH']
+    rules = recommendation_engine.rules()
+    with open(path, 'w') as f:
+        json.dump(rules.to_list(), f, indent=2)
+    print(f"Wrote {len(rules.rules)} recommendation rules ({recommendation_engine.source}) to '{path}'.")
+
+@app.cli.command('score-file')
+@click.argument('input_path', type=click.Path(exists=True, dir_okay=False))
+@click.argument('output_path', type=click.Path(dir_okay=False))
+@click.option('--chunksize', default=50000, show_default=True, help='Rows read and scored at a time.')
+@click.option('--workers', default=1, show_default=True, help='Scoring processes; 1 scores in this process.')
+@click.option('--version', default=None, help='Model version to score with (default: the live one).')
+@click.option('--keep', multiple=True, help='Input column to copy to the output (repeatable; default: every non-feature column).')
+def score_file_command(input_path, output_path, chunksize, workers, version, keep):
+    """Score a CSV/Parquet file of model features with the deployed ensemble."""
+    from bulk_scoring import score_file
+
+    summary = score_file(input_path, output_path, model_loader, version=version, chunksize=chunksize,
+                         workers=workers, keep_columns=list(keep) or None)
+    print(f"Scored {summary['rows']} rows ({summary['invalid_rows']} invalid) with model version "
+          f"{summary['model_version']} in {summary['seconds']:.1f}s ({summary['rows_per_sec']:.0f} rows/s) -> '{output_path}'.")
+
 if __name__ == '__main__':
+    model_loader.start_warmup()
     with app.app_context():
-        db.create_all() # This will create the new Appointment table if it doesn't exist
+        ensure_schema()
         print("Database tables created (if they didn't exist).")
     app.run(debug=True, host='0.0.0.0', port=5000)
 
@@ -0,0 +1,175 @@
+"""
+Shared harness for the benchmarks in this directory.
+
+A benchmark module defines its workload as `child(args)` and its command line
+as `main()`. `run_child(__file__, args)` runs that `child` in a fresh
+interpreter, so app.py is imported cold and reads its configuration from the
+environment passed in. `child` must not import app at module level. `args` go
+over as JSON. Whatever `child` returns comes back as JSON on the last stdout
+line, since app.py prints status lines of its own.
+
+Child side:
+    seed_users    doctor and patient accounts sharing one password hash
+    drive         threads with their own test clients, looping until a deadline
+    percentiles   p50/p95/p99/max of a latency list
+
+Parent side:
+    temp_database_env      environment pointing DATABASE_URL at a throwaway SQLite file
+    write_output           results JSON with git commit, settings and machine
+    load_baseline          the results of an earlier write_output, for --compare
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+RECORD = {
+    "General_Health": "Good", "Checkup": "Within the past year", "Exercise": "Yes",
+    "Smoking_History": "No", "Alcohol_Consumption": 2, "Fruit_Consumption": 30,
+    "Green_Vegetables_Consumption": 12, "FriedPotato_Consumption": 4, "BMI": 26.5,
+    "Sex": "Female", "Age_Category": "50-54", "Diabetes": "No", "Depression": "No",
+    "Arthritis": "No", "Skin_Cancer": "No", "Other_Cancer": "No",
+}
+PASSWORD = 'bench-password'
+
+CHILD = r'''
+import json, runpy, sys
+script, args = sys.argv[1], json.loads(sys.argv[2])
+sys.path.insert(0, args['root'])
+sys.path.append(args['bench_dir'])
+result = runpy.run_path(script)['child'](args)
+print(json.dumps(result))
+'''
+
+
+# --- Parent side ---
+def run_child(script, args, env=None):
+    """Runs `child(args)` of the benchmark file `script` in a fresh interpreter and returns its result."""
+    args = dict(args, root=ROOT, bench_dir=BENCH_DIR)
+    out = subprocess.run([sys.executable, '-c', CHILD, os.path.abspath(script), json.dumps(args)],
+                         cwd=ROOT, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"Benchmark run failed:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+@contextmanager
+def temp_database_env(**overrides):
+    """A copy of os.environ with DATABASE_URL on a temporary SQLite file, plus `overrides`."""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        env.update(overrides)
+        yield env
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def write_output(path, settings, results):
+    """Writes the results with the git commit and settings, so runs from two commits can be compared."""
+    import platform
+
+    commit, dirty = git_revision()
+    with open(path, 'w') as f:
+        json.dump({
+            'commit': commit, 'dirty': dirty,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(), 'cpus': os.cpu_count(),
+            'settings': settings, 'results': results,
+        }, f, indent=2)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        baseline_run = json.load(f)
+    print(f"Baseline: commit {baseline_run.get('commit')} ({baseline_run.get('timestamp')})")
+    return baseline_run['results']
+
+
+# --- Child side ---
+def seed_users(appmod, doctors=0, patients=0, password=PASSWORD):
+    """
+    Adds `doctors` and `patients` accounts (d0@bench.local, p0@bench.local, ...)
+    and flushes to assign their ids; the caller commits. Everyone shares one
+    hash: seeding shouldn't spend minutes in bcrypt. Needs an app context.
+    """
+    password_hash = appmod.bcrypt.generate_password_hash(password).decode('utf-8')
+    doctor_users = [appmod.User(full_name=f'Doctor {i:04d}', email=f'd{i}@bench.local', password_hash=password_hash, role='doctor')
+                    for i in range(doctors)]
+    patient_users = [appmod.User(full_name=f'Patient {i:05d}', email=f'p{i}@bench.local', password_hash=password_hash, role='patient')
+                     for i in range(patients)]
+    appmod.db.session.add_all(doctor_users + patient_users)
+    appmod.db.session.flush()
+    return doctor_users, patient_users
+
+
+def access_token(user):
+    from flask_jwt_extended import create_access_token
+
+    return create_access_token(identity=str(user.id), additional_claims={'role': user.role})
+
+
+def drive(app, threads, seconds, request, ok=lambda resp: resp.status_code < 300):
+    """
+    Runs `threads` threads for `seconds`. Each has its own test client and
+    calls `request(client, i, n, state)` in a loop. `i` is the thread number,
+    `n` counts the thread's requests from 1 and `state` is a dict private to
+    the thread. `request` returns (name, response). Returns ({name: {'ok',
+    'errors', 'latencies_ms'}}, wall seconds). Latencies are sorted and only
+    counted for responses that pass `ok`.
+    """
+    per_thread = [{} for _ in range(threads)]
+    stop_at = time.perf_counter() + seconds
+
+    def worker(i):
+        client = app.test_client()
+        stats, state, n = per_thread[i], {}, 0
+        while time.perf_counter() < stop_at:
+            n += 1
+            start = time.perf_counter()
+            name, resp = request(client, i, n, state)
+            elapsed = (time.perf_counter() - start) * 1000.0
+            entry = stats.setdefault(name, {'ok': 0, 'errors': 0, 'latencies_ms': []})
+            if ok(resp):
+                entry['ok'] += 1
+                entry['latencies_ms'].append(elapsed)
+            else:
+                entry['errors'] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in workers: t.start()
+    for t in workers: t.join()
+    wall = time.perf_counter() - started
+
+    merged = {}
+    for stats in per_thread:
+        for name, entry in stats.items():
+            total = merged.setdefault(name, {'ok': 0, 'errors': 0, 'latencies_ms': []})
+            total['ok'] += entry['ok']
+            total['errors'] += entry['errors']
+            total['latencies_ms'].extend(entry['latencies_ms'])
+    for entry in merged.values():
+        entry['latencies_ms'].sort()
+    return merged, wall
+
+
+def percentiles(latencies):
+    """p50/p95/p99/max of a sorted latency list, None for each when it is empty."""
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else None
+    return {'p50_ms': pct(0.50), 'p95_ms': pct(0.95), 'p99_ms': pct(0.99), 'max_ms': latencies[-1] if latencies else None}
@@ -0,0 +1,183 @@
+"""
+API latency and throughput benchmark.
+
+Starts app.py in a fresh interpreter against a temporary SQLite database,
+seeds it with synthetic doctors, patients, predictions and appointments,
+then drives each endpoint in turn with --concurrency threads (each with its
+own test client) for --seconds. Every endpoint gets a short warm-up first.
+Reported per endpoint: requests/sec, p50/p95/p99 latency and non-2xx count.
+With --conditional, GETs revalidate like a browser: each client sends back
+the ETag it last got for the URL, and 304s count as successes.
+
+    login            POST /api/login                 (patient credentials)
+    predict          POST /api/predict               (BMI varied per request)
+    history          GET  /api/history               (patient token)
+    doctor_patients  GET  /api/doctor/patients       (doctor token)
+    dashboard        GET  /api/doctor/dashboard      (doctor token, sort varied per request)
+    appointments     GET  /api/appointments          (patient token)
+    book             POST /api/appointments          (patient token)
+
+    python benchmarks/api.py [--concurrency 8] [--seconds 5]
+                             [--endpoints login history ...] [--patients 200] [--conditional]
+                             [--output api.json] [--compare baseline.json]
+
+The JSON output records the git commit and the settings, so runs from two
+commits can be compared with --compare. /api/predict needs trained models in
+models/ or the model registry; leave it out with --endpoints otherwise.
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+
+from _harness import PASSWORD, RECORD, access_token, drive, load_baseline, percentiles, run_child, seed_users, temp_database_env, write_output
+
+ENDPOINTS = ['login', 'predict', 'history', 'doctor_patients', 'dashboard', 'appointments', 'book']
+GETS = ('history', 'doctor_patients', 'dashboard', 'appointments')
+
+
+def child(args):
+    import app as appmod
+
+    # --- Seed ---
+    rng = random.Random(0)
+    app = appmod.app
+    with app.app_context():
+        appmod.ensure_schema()
+        doctors, patients = seed_users(appmod, args['doctors'], args['patients'])
+        appmod.db.session.add_all([appmod.Doctor(specialization='Cardiology', experience_years=10, user_id=d.id) for d in doctors])
+        appmod.db.session.add_all([appmod.Patient(age=rng.randint(20, 90), gender=rng.choice(['Male', 'Female']), user_id=p.id) for p in patients])
+        now = datetime.utcnow()
+        predictions, appointments = [], []
+        for p in patients:
+            for j in range(args['predictions_per_patient']):
+                probability = rng.random()
+                predictions.append({
+                    'result': 'Yes' if probability >= 0.5 else 'No', 'probability': probability,
+                    'timestamp': now - timedelta(days=j, minutes=rng.randint(0, 1439)), 'user_id': p.id,
+                    'input_data': json.dumps(dict(RECORD, BMI=round(rng.uniform(18, 40), 1))),
+                })
+            for j in range(args['appointments_per_patient']):
+                appointments.append({
+                    'patient_id': p.id, 'doctor_id': rng.choice(doctors).id, 'reason': 'checkup',
+                    'appointment_datetime': now + timedelta(days=rng.randint(1, 60), minutes=rng.randint(0, 1439)),
+                    'status': rng.choice(['Pending', 'Approved', 'Rejected']),
+                })
+        appmod.db.session.execute(appmod.db.insert(appmod.Prediction), predictions)
+        appmod.db.session.execute(appmod.db.insert(appmod.Appointment), appointments)
+        appmod.rebuild_patient_summaries() # the bulk inserts above bypass the incremental updates
+        appmod.db.session.commit()
+        patient_ids = [p.id for p in patients]
+        doctor_ids = [d.id for d in doctors]
+        patient_tokens = [access_token(p) for p in patients]
+        doctor_tokens = [access_token(d) for d in doctors]
+
+    if 'predict' in args['endpoints']:
+        appmod.model_loader.get() # load models before the clock starts
+
+    # --- Workload ---
+    def get(client, name, n, headers, etags):
+        doctor_headers = {'Authorization': f'Bearer {doctor_tokens[n % len(doctor_tokens)]}'}
+        if name == 'history':
+            url = '/api/history'
+        elif name == 'doctor_patients':
+            url, headers = '/api/doctor/patients', doctor_headers
+        elif name == 'dashboard':
+            sort = list(appmod.DASHBOARD_SORTS)[n % len(appmod.DASHBOARD_SORTS)]
+            url, headers = f'/api/doctor/dashboard?sort={sort}', doctor_headers
+        else:
+            url = '/api/appointments'
+        if not args['conditional']:
+            return client.get(url, headers=headers)
+        key = (url, headers['Authorization'])
+        if key in etags:
+            headers = dict(headers, **{'If-None-Match': etags[key]})
+        resp = client.get(url, headers=headers)
+        etags[key] = resp.headers.get('ETag', etags.get(key))
+        return resp
+
+    def request(client, name, i, n, etags):
+        patient = (i * 7919 + n) % len(patient_ids)
+        headers = {'Authorization': f'Bearer {patient_tokens[patient]}'}
+        if name == 'login':
+            return client.post('/api/login', json={'email': f'p{patient}@bench.local', 'password': PASSWORD})
+        if name == 'predict':
+            return client.post('/api/predict', json=dict(RECORD, BMI=18 + (n * 7 + i) % 200 / 10), headers=headers)
+        if name in GETS:
+            return get(client, name, n, headers, etags)
+        when = (datetime.now() + timedelta(days=90, minutes=n * len(patient_ids) + i)).strftime('%Y-%m-%dT%H:%M')
+        return client.post('/api/appointments', json={'doctor_id': doctor_ids[n % len(doctor_ids)], 'datetime': when, 'reason': 'benchmark'}, headers=headers)
+
+    ok = lambda resp: resp.status_code < 300 or resp.status_code == 304 # a revalidated GET is a success
+    result = {}
+    for name in args['endpoints']:
+        endpoint = lambda client, i, n, etags: (name, request(client, name, i, n, etags))
+        drive(app, args['concurrency'], args['warmup'], endpoint, ok)
+        stats, wall = drive(app, args['concurrency'], args['seconds'], endpoint, ok)
+        entry = stats.get(name, {'ok': 0, 'errors': 0, 'latencies_ms': []})
+        result[name] = dict({'requests_per_sec': entry['ok'] / wall, 'ok': entry['ok'], 'errors': entry['errors']},
+                            **percentiles(entry['latencies_ms']))
+    return result
+
+
+def run_benchmark(args):
+    env_overrides = {
+        'DB_PROFILE': args.db_profile,
+        'PREDICTION_CACHE_SIZE': '0', # every predict request should hit the models and the DB
+        'AUTH_RATE_LIMIT': '0', # every login comes from one address here
+    }
+    with temp_database_env(**env_overrides) as env:
+        return run_child(__file__, {
+            'endpoints': args.endpoints, 'concurrency': args.concurrency,
+            'seconds': args.seconds, 'warmup': args.warmup, 'conditional': args.conditional, 'doctors': args.doctors, 'patients': args.patients,
+            'predictions_per_patient': args.predictions_per_patient, 'appointments_per_patient': args.appointments_per_patient,
+        }, env)
+
+
+def _fmt(value, spec):
+    return format(value, spec) if value is not None else '-'
+
+
+def print_results(results, baseline=None):
+    header = f"{'endpoint':<16} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    if baseline:
+        header += f"  {'req/s vs base':>13} {'p95 vs base':>12}"
+    print(header)
+    for name, r in results.items():
+        line = (f"{name:<16} {r['requests_per_sec']:9.1f} {_fmt(r['p50_ms'], '8.2f')} {_fmt(r['p95_ms'], '8.2f')} "
+                f"{_fmt(r['p99_ms'], '8.2f')} {r['errors']:7d}")
+        base = (baseline or {}).get(name)
+        if base:
+            rps = (r['requests_per_sec'] / base['requests_per_sec'] - 1) * 100 if base['requests_per_sec'] else None
+            p95 = (r['p95_ms'] / base['p95_ms'] - 1) * 100 if base['p95_ms'] and r['p95_ms'] is not None else None
+            line += f"  {_fmt(rps, '+12.1f')}% {_fmt(p95, '+11.1f')}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', nargs='+', default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5, help="Measured duration per endpoint")
+    parser.add_argument('--warmup', type=float, default=1, help="Unmeasured warm-up per endpoint")
+    parser.add_argument('--doctors', type=int, default=10)
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--predictions-per-patient', type=int, default=20)
+    parser.add_argument('--appointments-per-patient', type=int, default=3)
+    parser.add_argument('--conditional', action='store_true', help="Revalidate GETs with If-None-Match")
+    parser.add_argument('--db-profile', default='tuned', choices=['default', 'tuned'])
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--compare', help="JSON file from an earlier run to compare against")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.compare) if args.compare else None
+
+    results = run_benchmark(args)
+    print_results(results, baseline)
+
+    if args.output:
+        settings = {k: v for k, v in vars(args).items() if k not in ('output', 'compare')}
+        write_output(args.output, settings, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Write-throughput load test for /api/predict and /api/appointments.
+
+Each database profile runs in a fresh interpreter against its own temporary
+SQLite file. Concurrent threads, each with its own test client, post
+predictions and appointment requests for a fixed duration. We report
+successful writes/sec, error counts ("database is locked" shows up as 500s)
+and latency percentiles per endpoint.
+
+    python benchmarks/db_write_load.py [--threads 16] [--seconds 10]
+                                       [--profiles default tuned] [--output db_load.json]
+
+/api/predict needs trained models in models/ or the model registry; pass
+--endpoints appointments to measure bookings only.
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from _harness import RECORD, access_token, drive, percentiles, run_child, seed_users, temp_database_env, write_output
+
+
+def child(args):
+    import app as appmod
+
+    app = appmod.app
+    with app.app_context():
+        appmod.ensure_schema()
+        doctors, patients = seed_users(appmod, doctors=1, patients=args['threads'])
+        appmod.db.session.commit()
+        doctor_id = doctors[0].id
+        tokens = [access_token(p) for p in patients]
+
+    if 'predict' in args['endpoints']:
+        appmod.model_loader.get() # load models before the clock starts
+
+    def request(client, i, n, state):
+        headers = {'Authorization': f'Bearer {tokens[i]}'}
+        name = args['endpoints'][n % len(args['endpoints'])]
+        if name == 'predict':
+            return name, client.post('/api/predict', json=dict(RECORD, BMI=18 + (n * 7 + i) % 200 / 10), headers=headers)
+        when = (datetime.now() + timedelta(days=1, minutes=n)).strftime('%Y-%m-%dT%H:%M')
+        return name, client.post('/api/appointments', json={'doctor_id': doctor_id, 'datetime': when, 'reason': 'load test'}, headers=headers)
+
+    stats, wall = drive(app, args['threads'], args['seconds'], request)
+    return {
+        name: dict({'writes_per_sec': entry['ok'] / wall, 'ok': entry['ok'], 'errors': entry['errors']},
+                   **percentiles(entry['latencies_ms']))
+        for name, entry in stats.items()
+    }
+
+
+def run_profile(profile, args):
+    # every request should hit the models and the DB
+    with temp_database_env(DB_PROFILE=profile, PREDICTION_CACHE_SIZE='0') as env:
+        return run_child(__file__, {'threads': args.threads, 'seconds': args.seconds, 'endpoints': args.endpoints}, env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profiles', nargs='+', default=['default', 'tuned'])
+    parser.add_argument('--endpoints', nargs='+', default=['predict', 'appointments'], choices=['predict', 'appointments'])
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for profile in args.profiles:
+        results[profile] = run_profile(profile, args)
+        for endpoint, r in results[profile].items():
+            p95 = f"{r['p95_ms']:.1f}" if r['p95_ms'] is not None else '-'
+            print(f"{profile:<8} {endpoint:<13} {r['writes_per_sec']:8.1f} writes/s  "
+                  f"ok={r['ok']:<6} errors={r['errors']:<4} p95={p95} ms")
+    if args.output:
+        write_output(args.output, {k: v for k, v in vars(args).items() if k != 'output'}, results)
+
+
+if __name__ == '__main__':
+    main()
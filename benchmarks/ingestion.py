@@ -0,0 +1,77 @@
+"""
+Dataset ingestion benchmark: load time and peak memory of each way the
+trainer can read CVD_cleaned.csv.
+
+Each path runs in a fresh interpreter. Peak memory is the growth of the
+process's max RSS over its baseline after imports, so it includes pandas
+and pyarrow buffers alike.
+
+    csv_object      pd.read_csv with inferred (object) dtypes, the old path
+    csv_typed       read_csv_typed(): model columns only, category/float32
+    csv_chunked     read_csv_typed() streaming --chunksize rows at a time
+    parquet_build   write_parquet_cache() + reading it back (first run)
+    parquet_cached  pd.read_parquet of the cache (every later run)
+
+    python benchmarks/ingestion.py [--data CVD_cleaned.csv] [--chunksize 50000]
+                                   [--output ingestion.json]
+"""
+import argparse
+import os
+import tempfile
+
+from _harness import ROOT, run_child, write_output
+
+PATHS = ['csv_object', 'csv_typed', 'csv_chunked', 'parquet_build', 'parquet_cached']
+
+
+def child(args):
+    import resource
+    import time
+    import pandas as pd
+    import pyarrow.parquet
+    import model_trainer as mt
+
+    path, data, parquet = args['path'], args['data'], args['parquet']
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if path == 'csv_object':
+        df = pd.read_csv(data)
+    elif path == 'csv_typed':
+        df = mt.read_csv_typed(data)
+    elif path == 'csv_chunked':
+        df = mt.read_csv_typed(data, chunksize=args['chunksize'])
+    elif path == 'parquet_build':
+        mt.write_parquet_cache(data, parquet, chunksize=args['chunksize'])
+        df = pd.read_parquet(parquet)
+    else:
+        df = pd.read_parquet(parquet)
+    seconds = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'rows': len(df),
+        'load_s': seconds,
+        'peak_rss_growth_mb': (peak_kb - baseline_kb) / 1024,
+        'frame_mb': df.memory_usage(deep=True).sum() / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=os.path.join(ROOT, 'CVD_cleaned.csv'))
+    parser.add_argument('--chunksize', type=int, default=50000)
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        parquet = os.path.join(tmp, 'dataset.parquet')
+        for path in PATHS: # parquet_build must run before parquet_cached
+            results[path] = r = run_child(__file__, {'path': path, 'data': os.path.abspath(args.data), 'chunksize': args.chunksize, 'parquet': parquet})
+            print(f"{path:<15} {r['load_s']:7.2f}s  peak +{r['peak_rss_growth_mb']:7.1f} MB  "
+                  f"frame {r['frame_mb']:7.1f} MB  ({r['rows']} rows)")
+    if args.output:
+        write_output(args.output, {k: v for k, v in vars(args).items() if k != 'output'}, results)
+
+
+if __name__ == '__main__':
+    main()
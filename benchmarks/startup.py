@@ -0,0 +1,64 @@
+"""
+Startup benchmark: import-to-first-response time of app.py.
+
+Each run happens in a fresh interpreter so imports are cold. For every run we
+record how long `import app` takes, the time until the first response from
+`/` and from `/api/ready`, and the time until the models report ready.
+Pass --eager to load the models right after import, as app.py used to do
+before lazy loading, to compare both behaviours on the same tree.
+
+    python benchmarks/startup.py [--runs 5] [--eager] [--output startup.json]
+"""
+import argparse
+import statistics
+import time
+
+from _harness import run_child, write_output
+
+
+def child(args):
+    start = time.perf_counter()
+    import app as appmod
+    imported = time.perf_counter()
+    if args['eager']:
+        appmod.model_loader.get()
+    client = appmod.app.test_client()
+    client.get('/')
+    first_response = time.perf_counter()
+    client.get('/api/ready')
+    first_ready_response = time.perf_counter()
+    while client.get('/api/ready').status_code == 503 and appmod.model_loader.state != 'failed':
+        time.sleep(0.005)
+    models_ready = time.perf_counter()
+    return {
+        'import_s': imported - start,
+        'first_response_s': first_response - start,
+        'first_ready_probe_s': first_ready_response - start,
+        'models_ready_s': models_ready - start,
+        'model_state': appmod.model_loader.state,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--eager', action='store_true', help="Load models right after import (pre-lazy behaviour)")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    runs = [run_child(__file__, {'eager': args.eager}) for _ in range(args.runs)]
+    summary = {
+        key: statistics.median(r[key] for r in runs)
+        for key in ('import_s', 'first_response_s', 'first_ready_probe_s', 'models_ready_s')
+    }
+    result = {'mode': 'eager' if args.eager else 'lazy', 'runs': runs, 'median': summary}
+
+    print(f"Startup ({result['mode']}, median of {args.runs} runs):")
+    for key, value in summary.items():
+        print(f"  {key:<22} {value * 1000:8.1f} ms")
+    if args.output:
+        write_output(args.output, {k: v for k, v in vars(args).items() if k != 'output'}, result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Offline scoring of a whole CSV or Parquet file with the deployed ensemble
+(`flask score-file`).
+
+The input is read `chunksize` rows at a time (pandas' chunked CSV reader,
+pyarrow's Parquet batch iterator) and every chunk is scored with
+ModelBundle.predict_proba_frame + blend(), the same models, weights and
+'weighted_average' threshold as /api/predict. With `workers` > 1 chunks are
+scored in a process pool of spawned workers, each loading the same pinned
+model version once. At most `2 * workers` chunks are in flight and results are written in
+input order as they complete, so memory stays bounded by the chunk size,
+not the file size.
+
+Output columns: the input's non-feature columns (or just `keep_columns`),
+then probability, prediction, prob_lr, prob_xgb, model_version and error.
+Rows with a missing or non-numeric feature are not scored; their error
+column says which features were bad. The output is written to a temporary
+file next to the target and renamed into place when complete. Parquet
+output keeps the first chunk's schema. Later chunks are cast to it, and a kept
+column that is blank throughout the first chunk is written as text.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from model_loader import ModelLoader
+
+OUTPUT_COLUMNS = ('probability', 'prediction', 'prob_lr', 'prob_xgb', 'model_version', 'error')
+
+_worker_bundle = None
+
+
+def _file_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.parquet', '.pq'):
+        return 'parquet'
+    if ext in ('.csv', '.gz', '.txt'):
+        return 'csv'
+    raise ValueError(f"Can't tell the format of '{path}' (expected .csv or .parquet).")
+
+
+def iter_chunks(path, chunksize):
+    """DataFrames of up to `chunksize` rows, read lazily."""
+    import pandas as pd
+
+    if _file_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        # low_memory=False parses each (bounded) chunk in one go, so a column's dtype isn't guessed piecewise
+        yield from pd.read_csv(path, chunksize=chunksize, low_memory=False)
+
+
+def score_chunk(bundle, df, keep_columns=None):
+    """Scores one DataFrame chunk and returns the output frame for it."""
+    import numpy as np
+    import pandas as pd
+
+    missing = [f for f in bundle.input_features if f not in df.columns]
+    if missing:
+        raise ValueError(f"Input is missing feature columns: {', '.join(missing)}")
+    features = df[bundle.input_features].copy()
+    for feature in bundle.numerical_features:
+        features[feature] = pd.to_numeric(features[feature], errors='coerce')
+    bad = features.isna()
+    valid = ~bad.any(axis=1).to_numpy()
+
+    if keep_columns is None:
+        keep_columns = [c for c in df.columns if c not in bundle.input_features]
+    out = df[keep_columns].reset_index(drop=True)
+    n = len(df)
+    probability = np.full(n, np.nan)
+    prob_lr = np.full(n, np.nan)
+    prob_xgb = np.full(n, np.nan)
+    prediction = np.full(n, None, dtype=object)
+    if valid.any():
+        lr, xgb = bundle.predict_proba_frame(features[valid])
+        blended, results = bundle.blend(lr, xgb)
+        probability[valid], prob_lr[valid], prob_xgb[valid], prediction[valid] = blended, lr, xgb, results
+
+    error = np.full(n, None, dtype=object)
+    for i in np.flatnonzero(~valid):
+        error[i] = 'missing or invalid: ' + ', '.join(bad.columns[bad.iloc[i].to_numpy()])
+    out['probability'] = probability
+    # String dtype so an all-missing chunk still has the same Parquet schema as the others
+    out['prediction'] = pd.array(prediction, dtype='string')
+    out['prob_lr'] = prob_lr
+    out['prob_xgb'] = prob_xgb
+    out['model_version'] = bundle.version
+    out['error'] = pd.array(error, dtype='string')
+    return out
+
+
+def _init_worker(model_dir, registry_dir, fast_inference, version):
+    global _worker_bundle
+    _worker_bundle = ModelLoader(model_dir, registry_dir, fast_inference).load_version(version)
+
+
+def _score_in_worker(df, keep_columns):
+    return score_chunk(_worker_bundle, df, keep_columns)
+
+
+class _Writer:
+    """Appends output chunks to a CSV or Parquet file."""
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self._parquet = None
+        self._first = True
+
+    def write(self, df):
+        if self.fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                # A kept column that is all blank in the first chunk has no real type yet (pandas reads it
+                # as float64 NaN or object None); text is the one later values can always be cast to
+                untyped = {f.name for f in table.schema if f.name not in OUTPUT_COLUMNS
+                           and table.num_rows and table.column(f.name).null_count == table.num_rows}
+                schema = pa.schema([f.with_type(pa.string()) if f.name in untyped else f for f in table.schema],
+                                   metadata=table.schema.metadata)
+                self._parquet = pq.ParquetWriter(self.path, schema)
+            self._parquet.write_table(self._conform(table))
+        else:
+            df.to_csv(self.path, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
+
+    def _conform(self, table):
+        """
+        Casts `table` to the file's schema. Kept columns can change dtype
+        between chunks (an int id column that gets blanks becomes float64,
+        a blank column gets text).
+        """
+        import pyarrow as pa
+
+        schema = self._parquet.schema
+        if table.schema.equals(schema, check_metadata=False):
+            return table
+        try:
+            return table.cast(schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            changed = [f.name for f in table.schema if f.type != schema.field(f.name).type]
+            raise ValueError(
+                f"Column(s) {', '.join(changed)} changed type between chunks and can't be written to the same "
+                f"Parquet file ({e}). Leave them out with keep_columns or write CSV."
+            ) from e
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def score_file(input_path, output_path, loader, version=None, chunksize=50000, workers=1, keep_columns=None):
+    """
+    Scores `input_path` into `output_path` with `version` (default: the live
+    registry version) of the models `loader` serves. Returns a summary dict.
+    """
+    bundle = loader.load_version(version)
+    out_format = _file_format(output_path)
+    tmp_path = output_path + '.tmp' + os.path.splitext(output_path)[1] # keep the extension, e.g. for .csv.gz
+    writer = _Writer(tmp_path, out_format)
+    rows = invalid = chunks = 0
+    start = time.perf_counter()
+
+    def emit(out):
+        nonlocal rows, invalid, chunks
+        writer.write(out)
+        rows += len(out)
+        invalid += int(out['error'].notna().sum())
+        chunks += 1
+        if chunks % 10 == 0:
+            print(f"Scored {rows} rows ({rows / (time.perf_counter() - start):.0f} rows/s)...")
+
+    try:
+        if workers <= 1:
+            for df in iter_chunks(input_path, chunksize):
+                emit(score_chunk(bundle, df, keep_columns))
+        else:
+            initargs = (loader.model_dir, loader.registry.root if loader.registry else None, loader.fast_inference, bundle.version)
+            # 'spawn' like model_server.py: forking after xgboost/OpenMP thread pools exist can deadlock
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=initargs) as pool:
+                pending = []
+                for df in iter_chunks(input_path, chunksize):
+                    pending.append(pool.submit(_score_in_worker, df, keep_columns))
+                    if len(pending) >= 2 * workers:
+                        emit(pending.pop(0).result())
+                for future in pending:
+                    emit(future.result())
+        writer.close()
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    seconds = time.perf_counter() - start
+    return {
+        'rows': rows, 'invalid_rows': invalid, 'chunks': chunks, 'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds else None, 'model_version': bundle.version,
+    }
@@ -0,0 +1,154 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class Histogram:
+    """
+    Minimal cumulative histogram (Prometheus-style buckets) that is safe to
+    update from several threads.
+    """
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1) # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    self._counts[i] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for upper, c in zip(self.buckets + ['+Inf'], counts):
+            running += c
+            cumulative.append((str(upper), running))
+        return {'buckets': dict(cumulative), 'sum': total, 'count': count}
+
+
+class PredictionCoalescer:
+    """
+    Queues single prediction requests for up to `max_wait_ms` and scores them
+    together with `score_fn`, which takes a list of records and returns
+    (results, probabilities, *shared): two lists aligned with the records plus
+    any values that apply to the whole batch (e.g. the model version). Callers
+    block in `submit()` until their own (result, probability, *shared) is
+    ready, so the handler contract is unchanged.
+    With `max_in_flight` > 1 the next batch is collected while earlier ones
+    are still being scored (useful when `score_fn` hands off to a process pool).
+    """
+    BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+    WAIT_MS_BUCKETS = [0.5, 1, 2, 5, 10, 20, 50, 100]
+
+    def __init__(self, score_fn, max_wait_ms=2.0, max_batch_size=64, max_in_flight=1):
+        self.score_fn = score_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._in_flight = threading.Semaphore(self.max_in_flight)
+        self._dispatcher = ThreadPoolExecutor(self.max_in_flight, thread_name_prefix='coalescer-dispatch') if self.max_in_flight > 1 else None
+        self.batch_size_hist = Histogram(self.BATCH_SIZE_BUCKETS)
+        self.wait_ms_hist = Histogram(self.WAIT_MS_BUCKETS)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stopped = False
+
+    def submit(self, record):
+        """Scores one record and returns its (result, probability, *shared)."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((record, future, time.perf_counter()))
+        return future.result()
+
+    def stats(self):
+        return {
+            'max_wait_ms': self.max_wait * 1000.0,
+            'max_batch_size': self.max_batch_size,
+            'max_in_flight': self.max_in_flight,
+            'queue_depth': self._queue.qsize(),
+            'batch_size': self.batch_size_hist.snapshot(),
+            'wait_ms': self.wait_ms_hist.snapshot(),
+        }
+
+    def shutdown(self):
+        self._stopped = True
+        self._queue.put(None)
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+        if self._dispatcher is not None:
+            self._dispatcher.shutdown(wait=True)
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='prediction-coalescer', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while not self._stopped:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._stopped = True
+                    break
+                batch.append(item)
+            if self._dispatcher is None:
+                self._dispatch(batch)
+            else:
+                self._in_flight.acquire() # backpressure: at most max_in_flight batches scoring
+                self._dispatcher.submit(self._dispatch_and_release, batch)
+
+    def _dispatch_and_release(self, batch):
+        try:
+            self._dispatch(batch)
+        finally:
+            self._in_flight.release()
+
+    def _dispatch(self, batch):
+        dispatched_at = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            self.wait_ms_hist.observe((dispatched_at - enqueued_at) * 1000.0)
+        self.batch_size_hist.observe(len(batch))
+
+        records = [record for record, _, _ in batch]
+        try:
+            results, probabilities, *shared = self.score_fn(records)
+        except Exception:
+            # One bad record must not fail everyone else in the batch, so
+            # rescore individually and hand each caller its own outcome.
+            for record, future, _ in batch:
+                try:
+                    results, probabilities, *shared = self.score_fn([record])
+                    future.set_result((results[0], probabilities[0], *shared))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        for (_, future, _), result, probability in zip(batch, results, probabilities):
+            future.set_result((result, probability, *shared))
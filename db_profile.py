@@ -0,0 +1,108 @@
+"""
+Database performance profile.
+
+DATABASE_URL selects the database (default: the bundled SQLite file). For
+SQLite the 'tuned' profile (DB_PROFILE, the default) applies on every new
+connection:
+    journal_mode=WAL    readers no longer block the writer (and vice versa)
+    synchronous=NORMAL  fsync at checkpoints instead of every commit (safe with WAL)
+    cache_size / mmap_size / temp_store=MEMORY
+    busy_timeout        wait for the write lock instead of failing with "database is locked"
+DB_PROFILE=default keeps SQLite's stock settings, for before/after comparisons.
+File-backed SQLite is pooled with DB_POOL_SIZE, DB_MAX_OVERFLOW and
+DB_POOL_TIMEOUT; in-memory SQLite (sqlite://) keeps SQLAlchemy's StaticPool.
+
+For PostgreSQL (e.g. DATABASE_URL=postgresql+psycopg2://user:pw@host/cardiocare,
+driver installed separately) the pool is sized with DB_POOL_SIZE,
+DB_MAX_OVERFLOW, DB_POOL_TIMEOUT and DB_POOL_RECYCLE.
+"""
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.engine import Engine
+
+SQLITE_DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_CACHE_SIZE_KB': 65536,      # 64 MB page cache per connection
+    'SQLITE_MMAP_SIZE': 268435456,      # 256 MB memory-mapped I/O
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+}
+POOL_DEFAULTS = {
+    'DB_POOL_SIZE': 10,
+    'DB_MAX_OVERFLOW': 20,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 1800,
+}
+
+_pragmas = None # set by configure_database(); read by the connect listener
+
+
+def _env(name, defaults):
+    value = os.environ.get(name, defaults[name])
+    return int(value) if isinstance(defaults[name], int) else value
+
+
+def is_sqlite_memory(uri):
+    """True for in-memory SQLite URIs: sqlite://, sqlite:///:memory: and file: URIs with mode=memory."""
+    database = make_url(uri).database
+    return database in (None, '', ':memory:') or 'mode=memory' in uri
+
+
+def configure_database(app, default_uri):
+    """Sets SQLALCHEMY_DATABASE_URI and SQLALCHEMY_ENGINE_OPTIONS before SQLAlchemy(app) is created."""
+    global _pragmas
+
+    uri = os.environ.get('DATABASE_URL', default_uri)
+    profile = os.environ.get('DB_PROFILE', 'tuned')
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['DB_PROFILE'] = profile
+
+    if uri.startswith('sqlite'):
+        if profile != 'tuned':
+            _pragmas = None
+            return
+        busy_timeout_ms = _env('SQLITE_BUSY_TIMEOUT_MS', SQLITE_DEFAULTS)
+        _pragmas = [
+            f"PRAGMA journal_mode={_env('SQLITE_JOURNAL_MODE', SQLITE_DEFAULTS)}",
+            f"PRAGMA synchronous={_env('SQLITE_SYNCHRONOUS', SQLITE_DEFAULTS)}",
+            f"PRAGMA cache_size=-{_env('SQLITE_CACHE_SIZE_KB', SQLITE_DEFAULTS)}",
+            f"PRAGMA mmap_size={_env('SQLITE_MMAP_SIZE', SQLITE_DEFAULTS)}",
+            "PRAGMA temp_store=MEMORY",
+            f"PRAGMA busy_timeout={busy_timeout_ms}",
+        ]
+        options = {
+            # sqlite3's own lock wait, in seconds; matches busy_timeout
+            'connect_args': {'timeout': busy_timeout_ms / 1000.0, 'check_same_thread': False},
+        }
+        if not is_sqlite_memory(uri):
+            # File-backed SQLite runs on a QueuePool; in-memory gets a StaticPool, which takes no sizing
+            options.update({
+                'pool_size': _env('DB_POOL_SIZE', POOL_DEFAULTS),
+                'max_overflow': _env('DB_MAX_OVERFLOW', POOL_DEFAULTS),
+                'pool_timeout': _env('DB_POOL_TIMEOUT', POOL_DEFAULTS),
+            })
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    else:
+        _pragmas = None
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': _env('DB_POOL_SIZE', POOL_DEFAULTS),
+            'max_overflow': _env('DB_MAX_OVERFLOW', POOL_DEFAULTS),
+            'pool_timeout': _env('DB_POOL_TIMEOUT', POOL_DEFAULTS),
+            'pool_recycle': _env('DB_POOL_RECYCLE', POOL_DEFAULTS),
+            'pool_pre_ping': True,
+        }
+
+
+@event.listens_for(Engine, 'connect')
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if _pragmas is None or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in _pragmas:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
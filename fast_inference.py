@@ -0,0 +1,352 @@
+"""
+Pandas-free inference path for the LR + XGBoost ensemble.
+
+The trained imblearn pipelines are "compiled" once at load time: the
+StandardScaler means/scales, OneHotEncoder vocabularies, logistic regression
+coefficients and the raw XGBoost booster are pulled out so a plain dict (or a
+NumPy array in input-feature order) can be scored without building a
+DataFrame or going through ColumnTransformer dispatch.
+
+Run this file directly to check parity with predict_proba and measure latency:
+    python fast_inference.py [model_dir]
+tests/test_fast_inference.py checks parity on rows with the training columns,
+including unknown and missing categories.
+"""
+import json
+import math
+import os
+import numpy as np
+
+# File names of the compiled array store written by CompiledEnsemble.save()
+COMPILED_MANIFEST = "compiled.json"
+COMPILED_LR_COEF = "lr_coef.npy"
+COMPILED_BOOSTER = "xgb_booster.ubj"
+
+
+class CompiledPreprocessor:
+    """Dense re-implementation of a fitted ColumnTransformer (StandardScaler + OneHotEncoder)."""
+
+    def __init__(self, input_features, numerical, categorical):
+        # numerical: list of (feature, output_col, mean, scale)
+        # categorical: list of (feature, {category: output_col})
+        self.input_features = list(input_features)
+        self.numerical = numerical
+        self.categorical = categorical
+        self.n_outputs = len(numerical) + sum(len(vocab) for _, vocab in categorical)
+        self._num_cols = np.array([col for _, col, _, _ in numerical], dtype=np.intp)
+        self._means = np.array([mean for _, _, mean, _ in numerical], dtype=np.float64)
+        self._scales = np.array([scale for _, _, _, scale in numerical], dtype=np.float64)
+
+    @classmethod
+    def from_column_transformer(cls, ct):
+        from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+        numerical, categorical = [], []
+        offset = 0
+        for name, transformer, columns in ct.transformers_:
+            if name == 'remainder':
+                if transformer == 'drop' or len(columns) == 0:
+                    continue
+                raise ValueError("Remainder columns are not supported by the compiled path.")
+            if transformer == 'drop':
+                continue
+            if isinstance(transformer, StandardScaler):
+                means = transformer.mean_ if transformer.with_mean else np.zeros(len(columns))
+                scales = transformer.scale_ if transformer.with_std else np.ones(len(columns))
+                for i, feature in enumerate(columns):
+                    numerical.append((feature, offset, float(means[i]), float(scales[i])))
+                    offset += 1
+            elif isinstance(transformer, OneHotEncoder):
+                if transformer.drop_idx_ is not None or getattr(transformer, '_infrequent_enabled', False):
+                    raise ValueError("OneHotEncoder with drop/infrequent categories is not supported.")
+                if transformer.handle_unknown != 'ignore':
+                    raise ValueError("OneHotEncoder must use handle_unknown='ignore'.")
+                for feature, cats in zip(columns, transformer.categories_):
+                    vocab = {}
+                    for cat in cats:
+                        vocab[cat] = offset
+                        offset += 1
+                    categorical.append((feature, vocab))
+            else:
+                raise ValueError(f"Unsupported transformer '{name}' ({type(transformer).__name__}).")
+        return cls(ct.feature_names_in_, numerical, categorical)
+
+    def to_dict(self):
+        return {
+            'input_features': self.input_features,
+            'numerical': [list(n) for n in self.numerical],
+            'categorical': [[feature, vocab] for feature, vocab in self.categorical],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['input_features'],
+            [tuple(n) for n in data['numerical']],
+            [(feature, dict(vocab)) for feature, vocab in data['categorical']],
+        )
+
+    def same_as(self, other):
+        return (
+            self.numerical == other.numerical
+            and self.categorical == other.categorical
+            and self.input_features == other.input_features
+        )
+
+    def transform_records(self, records):
+        """Encodes a list of raw input dicts into the model matrix."""
+        n = len(records)
+        X = np.zeros((n, self.n_outputs), dtype=np.float64)
+
+        for feature, col, mean, scale in self.numerical:
+            try:
+                values = np.array([r[feature] for r in records], dtype=np.float64)
+            except KeyError:
+                raise ValueError(f"columns are missing: {{'{feature}'}}")
+            X[:, col] = (values - mean) / scale
+
+        rows = np.arange(n)
+        for feature, vocab in self.categorical:
+            try:
+                cols = np.array([vocab.get(r[feature], -1) for r in records], dtype=np.intp)
+            except KeyError:
+                raise ValueError(f"columns are missing: {{'{feature}'}}")
+            except TypeError:
+                # Unhashable input (list/dict) can never match a category
+                raise ValueError(f"Invalid value for '{feature}'.")
+            known = cols >= 0 # handle_unknown='ignore' -> all-zero block
+            X[rows[known], cols[known]] = 1.0
+
+        if np.isnan(X).any():
+            raise ValueError("Input contains NaN.")
+        return X
+
+    def transform_array(self, arr):
+        """Encodes a 2-D array whose columns follow `input_features`."""
+        arr = np.asarray(arr, dtype=object)
+        if arr.ndim == 1:
+            arr = arr.reshape(1, -1)
+        if arr.shape[1] != len(self.input_features):
+            raise ValueError(f"Expected {len(self.input_features)} columns, got {arr.shape[1]}.")
+        position = {f: i for i, f in enumerate(self.input_features)}
+        n = arr.shape[0]
+        X = np.zeros((n, self.n_outputs), dtype=np.float64)
+        X[:, self._num_cols] = (
+            arr[:, [position[f] for f, _, _, _ in self.numerical]].astype(np.float64) - self._means
+        ) / self._scales
+        rows = np.arange(n)
+        for feature, vocab in self.categorical:
+            cols = np.array([vocab.get(v, -1) for v in arr[:, position[feature]]], dtype=np.intp)
+            known = cols >= 0
+            X[rows[known], cols[known]] = 1.0
+        if np.isnan(X).any():
+            raise ValueError("Input contains NaN.")
+        return X
+
+
+class CompiledEnsemble:
+    """
+    Scores records with the extracted LR coefficients and XGBoost booster.
+    `predict_proba_records` / `predict_proba_array` return (probs_lr, probs_xgb),
+    the same positive-class columns as `pipeline.predict_proba(df)[:, 1]`.
+    """
+
+    def __init__(self, lr_preprocessor, xgb_preprocessor, lr_coef, lr_intercept, booster, iteration_range=(0, 0)):
+        self.lr_preprocessor = lr_preprocessor
+        self.xgb_preprocessor = xgb_preprocessor
+        self.shared_preprocessor = lr_preprocessor.same_as(xgb_preprocessor)
+        self.lr_coef = np.asarray(lr_coef, dtype=np.float64).reshape(-1)
+        self.lr_intercept = float(np.asarray(lr_intercept).ravel()[0])
+        self.booster = booster
+        self.iteration_range = iteration_range
+
+    @classmethod
+    def from_pipelines(cls, lr_pipeline, xgb_pipeline):
+        lr_ct, lr_model = _split_pipeline(lr_pipeline)
+        xgb_ct, xgb_model = _split_pipeline(xgb_pipeline)
+
+        if list(lr_model.classes_) != [0, 1] or lr_model.coef_.shape[0] != 1:
+            raise ValueError("Only binary logistic regression with classes [0, 1] is supported.")
+        if list(xgb_model.classes_) != [0, 1] or xgb_model.get_params().get('objective') not in (None, 'binary:logistic'):
+            raise ValueError("Only binary:logistic XGBoost models are supported.")
+
+        try:
+            best_iteration = xgb_model.best_iteration
+            iteration_range = (0, best_iteration + 1)
+        except AttributeError:
+            iteration_range = (0, 0) # no early stopping -> use every tree
+
+        return cls(
+            CompiledPreprocessor.from_column_transformer(lr_ct),
+            CompiledPreprocessor.from_column_transformer(xgb_ct),
+            lr_model.coef_,
+            lr_model.intercept_,
+            xgb_model.get_booster(),
+            iteration_range,
+        )
+
+    def save(self, directory):
+        """
+        Writes the compiled ensemble as a small array store: JSON metadata,
+        the LR coefficients as a raw .npy (memory-mappable) and the booster
+        in XGBoost's native binary format.
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, COMPILED_LR_COEF), self.lr_coef)
+        self.booster.save_model(os.path.join(directory, COMPILED_BOOSTER))
+        manifest = {
+            'lr_preprocessor': self.lr_preprocessor.to_dict(),
+            'xgb_preprocessor': self.xgb_preprocessor.to_dict(),
+            'lr_intercept': self.lr_intercept,
+            'iteration_range': list(self.iteration_range),
+        }
+        # Manifest last: its presence marks a complete store
+        with open(os.path.join(directory, COMPILED_MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        import xgboost as xgb
+
+        with open(os.path.join(directory, COMPILED_MANIFEST)) as f:
+            manifest = json.load(f)
+        booster = xgb.Booster()
+        booster.load_model(os.path.join(directory, COMPILED_BOOSTER))
+        return cls(
+            CompiledPreprocessor.from_dict(manifest['lr_preprocessor']),
+            CompiledPreprocessor.from_dict(manifest['xgb_preprocessor']),
+            np.load(os.path.join(directory, COMPILED_LR_COEF), mmap_mode=mmap_mode),
+            manifest['lr_intercept'],
+            booster,
+            tuple(manifest['iteration_range']),
+        )
+
+    @property
+    def input_features(self):
+        return self.lr_preprocessor.input_features
+
+    @property
+    def num_trees(self):
+        """Boosting rounds actually used at prediction time."""
+        start, end = self.iteration_range
+        return (end or self.booster.num_boosted_rounds()) - start
+
+    def with_max_trees(self, max_trees):
+        """
+        A copy whose booster keeps only the first `max_trees` rounds in use.
+        The booster is sliced, not just capped with iteration_range, so the
+        saved model file shrinks too.
+        """
+        start, end = self.iteration_range
+        end = min(end or self.booster.num_boosted_rounds(), start + max_trees)
+        return CompiledEnsemble(
+            self.lr_preprocessor, self.xgb_preprocessor, self.lr_coef, self.lr_intercept,
+            self.booster[start:end], (0, 0),
+        )
+
+    def predict_proba_records(self, records):
+        return self._score(*self.encode_records(records))
+
+    def predict_proba_array(self, arr):
+        X_lr = self.lr_preprocessor.transform_array(arr)
+        X_xgb = X_lr if self.shared_preprocessor else self.xgb_preprocessor.transform_array(arr)
+        return self._score(X_lr, X_xgb)
+
+    def encode_records(self, records):
+        """(X_lr, X_xgb) model inputs for a list of raw dicts; the same array when the preprocessors match."""
+        X_lr = self.lr_preprocessor.transform_records(records)
+        X_xgb = X_lr if self.shared_preprocessor else self.xgb_preprocessor.transform_records(records)
+        return X_lr, X_xgb
+
+    def predict_lr(self, X_lr):
+        decision = X_lr @ self.lr_coef + self.lr_intercept
+        return 1.0 / (1.0 + np.exp(-decision))
+
+    def predict_xgb(self, X_xgb):
+        return np.asarray(self.booster.inplace_predict(X_xgb, iteration_range=self.iteration_range))
+
+    def _score(self, X_lr, X_xgb):
+        return self.predict_lr(X_lr), self.predict_xgb(X_xgb)
+
+    def probe_records(self, n=64):
+        """Deterministic synthetic records covering every category and a spread of numeric values."""
+        rng = np.random.default_rng(0)
+        records = []
+        for i in range(n):
+            record = {}
+            for feature, _, mean, scale in self.lr_preprocessor.numerical:
+                record[feature] = round(float(mean + scale * rng.normal(0, 1.5)), 2)
+            for feature, vocab in self.lr_preprocessor.categorical:
+                cats = list(vocab)
+                record[feature] = cats[i % len(cats)]
+            records.append(record)
+        # Unknown categories must score like OneHotEncoder(handle_unknown='ignore')
+        if self.lr_preprocessor.categorical:
+            feature = self.lr_preprocessor.categorical[0][0]
+            records.append(dict(records[0], **{feature: '__unseen__'}))
+        return records
+
+    def check_parity(self, lr_pipeline, xgb_pipeline, records=None, atol=1e-9):
+        """
+        Compares compiled probabilities with the pipelines' predict_proba.
+        Returns the largest absolute difference; raises ValueError above `atol`.
+        """
+        import pandas as pd
+
+        records = records if records is not None else self.probe_records()
+        df = pd.DataFrame(records)[self.input_features]
+        expected_lr = lr_pipeline.predict_proba(df)[:, 1]
+        expected_xgb = xgb_pipeline.predict_proba(df)[:, 1]
+        got_lr, got_xgb = self.predict_proba_records(records)
+        got_lr_arr, got_xgb_arr = self.predict_proba_array(df.to_numpy(dtype=object))
+
+        max_diff = max(
+            float(np.max(np.abs(expected_lr - got_lr))),
+            float(np.max(np.abs(expected_xgb - got_xgb))),
+            float(np.max(np.abs(expected_lr - got_lr_arr))),
+            float(np.max(np.abs(expected_xgb - got_xgb_arr))),
+        )
+        if not max_diff <= atol:
+            raise ValueError(f"Compiled ensemble differs from pipelines by {max_diff:.3g} (atol={atol}).")
+        return max_diff
+
+
+def _split_pipeline(pipeline):
+    """Returns (ColumnTransformer, final estimator), skipping training-only samplers like SMOTE."""
+    from sklearn.compose import ColumnTransformer
+
+    steps = [step for _, step in pipeline.steps]
+    transformers = [s for s in steps[:-1] if not hasattr(s, 'fit_resample')]
+    if len(transformers) != 1 or not isinstance(transformers[0], ColumnTransformer):
+        raise ValueError("Expected a single ColumnTransformer before the model.")
+    return transformers[0], steps[-1]
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import joblib
+
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else 'models'
+    lr_pipeline = joblib.load(os.path.join(model_dir, "logreg_pipeline.pkl"))
+    xgb_pipeline = joblib.load(os.path.join(model_dir, "xgb_pipeline.pkl"))
+    compiled = CompiledEnsemble.from_pipelines(lr_pipeline, xgb_pipeline)
+
+    records = compiled.probe_records(512)
+    print(f"Parity: max |diff| = {compiled.check_parity(lr_pipeline, xgb_pipeline, records):.3g}")
+
+    def percentiles(fn, n=2000):
+        timings = []
+        for i in range(n):
+            record = records[i % len(records)]
+            start = time.perf_counter()
+            fn(record)
+            timings.append((time.perf_counter() - start) * 1000.0)
+        timings.sort()
+        return timings[len(timings) // 2], timings[math.ceil(len(timings) * 0.99) - 1]
+
+    import pandas as pd
+    p50, p99 = percentiles(lambda r: compiled.predict_proba_records([r]))
+    print(f"Compiled ensemble, single row: p50={p50:.3f} ms  p99={p99:.3f} ms")
+    p50, p99 = percentiles(lambda r: (lr_pipeline.predict_proba(pd.DataFrame([r])), xgb_pipeline.predict_proba(pd.DataFrame([r]))), n=300)
+    print(f"Pipelines,         single row: p50={p50:.3f} ms  p99={p99:.3f} ms")
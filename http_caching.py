@@ -0,0 +1,115 @@
+"""
+HTTP caching for the read-heavy JSON endpoints: conditional GET and gzip.
+
+@conditional_get(validators) wraps a GET view. `validators(**view_args)`
+returns (parts, updated_at) from a cheap lookup, typically the data version
+counters of whatever the view reads, and the weak ETag is a hash of those
+parts plus the endpoint and query string. If the request's If-None-Match
+(or, without one, If-Modified-Since) already matches, the view is not called
+at all and a bodyless 304 goes back. When `validators` returns None instead
+(the lookup failed), the view runs as if it weren't wrapped. Otherwise the view runs and its 200 gets
+ETag, Last-Modified and `Cache-Control: private, no-cache`, so browsers keep
+the JSON and revalidate it on every fetch. Put the decorator under the auth
+decorator: a 304 must not skip authorization.
+
+The validators are read before the view's own queries. If a write lands in
+between, the response carries the older tag, and the next request simply
+gets a 200 again; a client never keeps data older than its tag.
+
+ResponseCompression(app) gzips responses of COMPRESS_MIMETYPES of at least
+COMPRESS_MIN_SIZE bytes when the client accepts gzip (COMPRESS_LEVEL 0
+turns it off). Files sent with send_file and streamed responses are left
+alone. ETags on compressed responses are weak, as both encodings share one.
+"""
+import gzip
+import hashlib
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+from flask import Response, current_app, request
+
+COMPRESS_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'text/javascript', 'application/javascript')
+
+
+def make_etag(*parts):
+    return hashlib.blake2b('|'.join(map(str, parts)).encode(), digest_size=12).hexdigest()
+
+
+def http_last_modified(updated_at):
+    """
+    `updated_at` (naive UTC) truncated to a whole second, or None while it is
+    less than a second old. HTTP dates have one-second resolution, so a second
+    write within that same second would otherwise pass If-Modified-Since.
+    """
+    if updated_at is None or datetime.utcnow() - updated_at < timedelta(seconds=1):
+        return None
+    return updated_at.replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def is_not_modified(etag, last_modified):
+    """True if the request's validators show the client already has this representation."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def conditional_get(validators):
+    """Answers 304 without calling the view when `validators` show nothing changed. See the module docstring."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            validated = validators(*args, **kwargs)
+            if validated is None:
+                return fn(*args, **kwargs)
+            parts, updated_at = validated
+            etag = make_etag(request.endpoint, request.query_string.decode(), *parts)
+            last_modified = http_last_modified(updated_at)
+            if is_not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = current_app.make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Authorization')
+            return response
+        return wrapper
+    return decorator
+
+
+class ResponseCompression:
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_MIMETYPES', COMPRESS_MIMETYPES)
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        config = self.app.config
+        if (config['COMPRESS_LEVEL'] <= 0 or response.mimetype not in config['COMPRESS_MIMETYPES']
+                or response.direct_passthrough or response.is_streamed):
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or 'Content-Encoding' in response.headers
+                or not request.accept_encodings['gzip']):
+            return response
+        body = response.get_data()
+        if len(body) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(gzip.compress(body, compresslevel=config['COMPRESS_LEVEL'], mtime=0))
+        response.headers['Content-Encoding'] = 'gzip'
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
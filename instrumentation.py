@@ -0,0 +1,285 @@
+"""
+Request instrumentation: Prometheus metrics, per-stage timings and opt-in
+profiling.
+
+RequestInstrumentation(app) hooks every request and every SQL statement:
+
+    cardiocare_http_requests_total{method,route,status}      counter
+    cardiocare_http_request_duration_seconds{route}          histogram
+    cardiocare_db_query_duration_seconds{route}              histogram (one per statement)
+    cardiocare_stage_duration_seconds{stage}                 histogram, see stage()
+
+`with stage('score'):` times a block into the stage histogram and into the
+current request's Server-Timing header, so a slow response shows where its
+time went. Stages can be timed from any thread; outside a request they only
+feed the histogram. GET /metrics renders everything, plus whatever the
+registered collectors report (cache, coalescer and write queue stats), in the
+Prometheus text format.
+
+Profiling is off unless PROFILE_DIR is set. Then a request with the header
+`X-Profile: cprofile` (or `pyinstrument`, if installed) is profiled, as is a
+random PROFILE_SAMPLE_RATE fraction of all requests, and the profile is written
+to PROFILE_DIR (.prof for cProfile, .html for pyinstrument). The file name comes
+back in the X-Profile-File response header. When PROFILE_TOKEN is set the
+header must come with a matching X-Profile-Token.
+"""
+import cProfile
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from coalescer import Histogram
+
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def scale_snapshot(snapshot, factor):
+    """A Histogram.snapshot() with its bucket bounds and sum multiplied by `factor` (e.g. ms -> s)."""
+    buckets = {
+        (k if k == '+Inf' else repr(float(k) * factor)): v for k, v in snapshot['buckets'].items()
+    }
+    return {'buckets': buckets, 'sum': snapshot['sum'] * factor, 'count': snapshot['count']}
+
+
+class Metrics:
+    """
+    Labelled counters and histograms, rendered in the Prometheus text format.
+    Collectors are callables returning (name, type, help, value) tuples, where
+    value is a number or a Histogram snapshot; they are read at scrape time.
+    """
+
+    def __init__(self, namespace='cardiocare'):
+        self.namespace = namespace
+        self._counters = {}   # name -> {labels: value}
+        self._histograms = {} # name -> {labels: Histogram}
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, labels=None, value=1):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, labels=None, buckets=LATENCY_BUCKETS):
+        key = tuple(sorted((labels or {}).items()))
+        histogram = self._histograms.get(name, {}).get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, {}).setdefault(key, Histogram(buckets))
+        histogram.observe(value)
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+        for name, series in sorted(counters.items()):
+            self._header(lines, name, 'counter', self._help.get(name))
+            for key, value in sorted(series.items()):
+                lines.append(f'{self.namespace}_{name}{_labels(key)} {value}')
+        for name, series in sorted(histograms.items()):
+            self._header(lines, name, 'histogram', self._help.get(name))
+            for key, histogram in sorted(series.items()):
+                self._histogram_lines(lines, name, key, histogram.snapshot())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, value in families:
+                self._header(lines, name, kind, help_text)
+                if kind == 'histogram':
+                    self._histogram_lines(lines, name, (), value)
+                else:
+                    lines.append(f'{self.namespace}_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, name, kind, help_text):
+        if help_text:
+            lines.append(f'# HELP {self.namespace}_{name} {help_text}')
+        lines.append(f'# TYPE {self.namespace}_{name} {kind}')
+
+    def _histogram_lines(self, lines, name, key, snapshot):
+        for upper, count in snapshot['buckets'].items():
+            lines.append(f'{self.namespace}_{name}_bucket{_labels(key, ("le", upper))} {count}')
+        lines.append(f'{self.namespace}_{name}_sum{_labels(key)} {snapshot["sum"]}')
+        lines.append(f'{self.namespace}_{name}_count{_labels(key)} {snapshot["count"]}')
+
+
+# Process-wide registry, so modules without the app (model_loader) can time stages
+metrics = Metrics()
+metrics.describe('http_requests_total', 'HTTP requests by route, method and status.')
+metrics.describe('http_request_duration_seconds', 'Request latency by route.')
+metrics.describe('db_query_duration_seconds', 'SQL statement latency by the route that issued it.')
+metrics.describe('stage_duration_seconds', 'Time spent in each instrumented stage.')
+
+
+@contextmanager
+def stage(name):
+    """Times a block into the stage histogram and the current request's Server-Timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe('stage_duration_seconds', elapsed, {'stage': name})
+        if has_request_context():
+            timings = g.get('_stage_timings')
+            if timings is not None:
+                timings.append((name, elapsed))
+
+
+def _route():
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    return 'background'
+
+
+class RequestInstrumentation:
+    PROFILERS = ('cprofile', 'pyinstrument')
+
+    def __init__(self, app=None):
+        self._profile_seq = itertools.count(1)
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('SERVER_TIMING', True)
+        app.config.setdefault('PROFILE_DIR', None)
+        app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+        app.config.setdefault('PROFILE_TOKEN', None)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view, methods=['GET'])
+        event.listen(Engine, 'before_cursor_execute', self._before_query)
+        event.listen(Engine, 'after_cursor_execute', self._after_query)
+
+    # --- Requests ---
+    def _before_request(self):
+        g._request_start = time.perf_counter()
+        g._stage_timings = []
+        g._db_seconds = 0.0
+        g._db_queries = 0
+        g._profiler = self._start_profiler()
+
+    def _after_request(self, response):
+        start = g.get('_request_start')
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = _route()
+        metrics.inc('http_requests_total', {'method': request.method, 'route': route, 'status': str(response.status_code)})
+        metrics.observe('http_request_duration_seconds', elapsed, {'route': route})
+
+        profile_file = self._stop_profiler(g.pop('_profiler', None), route)
+        if profile_file:
+            response.headers['X-Profile-File'] = profile_file
+        if self.app.config['SERVER_TIMING']:
+            parts = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in g._stage_timings]
+            if g._db_queries:
+                parts.append(f'db;dur={g._db_seconds * 1000:.2f};desc="{g._db_queries} queries"')
+            parts.append(f'total;dur={elapsed * 1000:.2f}')
+            response.headers['Server-Timing'] = ', '.join(parts)
+        return response
+
+    def _teardown_request(self, exc):
+        # after_request doesn't run for unhandled exceptions; don't leave a profiler on
+        active = g.pop('_profiler', None)
+        if active is not None:
+            self._stop_profiler(active, _route())
+
+    def _metrics_view(self):
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    # --- SQL statements ---
+    def _before_query(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+    def _after_query(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('_query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        metrics.observe('db_query_duration_seconds', elapsed, {'route': _route()})
+        if has_request_context() and g.get('_db_seconds') is not None:
+            g._db_seconds += elapsed
+            g._db_queries += 1
+
+    # --- Profiling ---
+    def _start_profiler(self):
+        config = self.app.config
+        if not config['PROFILE_DIR']:
+            return None
+        kind = request.headers.get('X-Profile', '').lower()
+        if kind and config['PROFILE_TOKEN'] and request.headers.get('X-Profile-Token') != config['PROFILE_TOKEN']:
+            kind = ''
+        if not kind and config['PROFILE_SAMPLE_RATE'] > 0 and random.random() < config['PROFILE_SAMPLE_RATE']:
+            kind = 'cprofile'
+        if kind not in self.PROFILERS:
+            return None
+        if kind == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print("pyinstrument is not installed; profiling with cProfile instead.")
+            else:
+                profiler = Profiler()
+                profiler.start()
+                return kind, profiler
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e: # another profiler is already active in this thread
+            print(f"Request profiling skipped: {e}")
+            return None
+        return 'cprofile', profiler
+
+    def _stop_profiler(self, active, route):
+        if active is None:
+            return None
+        kind, profiler = active
+        directory = self.app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._profile_seq)}-{slug}"
+        if kind == 'pyinstrument':
+            profiler.stop()
+            name += '.html'
+            with open(os.path.join(directory, name), 'w') as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.disable()
+            name += '.prof'
+            profiler.dump_stats(os.path.join(directory, name))
+        return name
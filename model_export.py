@@ -0,0 +1,230 @@
+"""
+Serving export of a trained model directory.
+
+The pickled imblearn pipelines carry everything needed to *train* (SMOTE,
+the ColumnTransformer machinery, the sklearn wrappers). The export keeps only
+what inference uses, in the compiled array store of fast_inference.py:
+
+    <model_dir>/compiled/
+        compiled.json       scaler means/scales, one-hot vocabularies, LR intercept
+        lr_coef.npy         LR coefficients (memory-mappable)
+        xgb_booster.ubj     XGBoost booster in its native binary format
+
+ModelLoader loads this store directly when it is present, without
+unpickling the pipelines.
+
+The export can also cap the number of trees, either to --max-trees or to the
+most trees whose single-row latency fits --latency-budget-ms. When trees are
+dropped, the output directory gets a sliced xgb_pipeline.pkl and re-chosen
+thresholds/weights as well, so every file in it describes the same model.
+Each run reports artifact size, load time, per-row latency and test AUC.
+
+    python model_export.py models_latestv2 [--output models_export]
+                           [--max-trees N | --latency-budget-ms 0.5]
+                           [--data CVD_cleaned.csv] [--publish]
+"""
+import argparse
+import copy
+import json
+import math
+import os
+import shutil
+import time
+
+import numpy as np
+
+from fast_inference import COMPILED_BOOSTER, COMPILED_LR_COEF, COMPILED_MANIFEST, CompiledEnsemble
+
+COMPILED_DIR = "compiled"
+COMPILED_FILES = tuple(os.path.join(COMPILED_DIR, name) for name in (COMPILED_MANIFEST, COMPILED_LR_COEF, COMPILED_BOOSTER))
+PIPELINE_FILES = ("logreg_pipeline.pkl", "xgb_pipeline.pkl")
+TREE_FRACTIONS = (1.0, 0.75, 0.5, 0.33, 0.25, 0.125)
+
+
+def compiled_files(model_dir):
+    """Compiled store files present in `model_dir`, relative to it (for ModelRegistry.publish extra_files)."""
+    return [name for name in COMPILED_FILES if os.path.exists(os.path.join(model_dir, name))]
+
+
+def export_compiled(model_dir, lr_pipeline=None, xgb_pipeline=None):
+    """Writes the unpruned compiled store of `model_dir` after checking parity with its pipelines."""
+    import joblib
+
+    lr_pipeline = lr_pipeline or joblib.load(os.path.join(model_dir, "logreg_pipeline.pkl"))
+    xgb_pipeline = xgb_pipeline or joblib.load(os.path.join(model_dir, "xgb_pipeline.pkl"))
+    compiled = CompiledEnsemble.from_pipelines(lr_pipeline, xgb_pipeline)
+    compiled.check_parity(lr_pipeline, xgb_pipeline)
+    compiled.save(os.path.join(model_dir, COMPILED_DIR))
+    return compiled
+
+
+def _dir_bytes(paths):
+    return sum(os.path.getsize(p) for p in paths)
+
+
+def _latency_ms(compiled, records, n=1000):
+    """(p50, p99) single-row latency of predict_proba_records, in ms."""
+    for record in records[:50]: # warm up caches before timing
+        compiled.predict_proba_records([record])
+    timings = []
+    for i in range(n):
+        record = records[i % len(records)]
+        start = time.perf_counter()
+        compiled.predict_proba_records([record])
+        timings.append((time.perf_counter() - start) * 1000.0)
+    timings.sort()
+    return timings[len(timings) // 2], timings[math.ceil(len(timings) * 0.99) - 1]
+
+
+def _test_split(data_path):
+    """The test split model_trainer.py evaluated on, as (object array in input order, labels)."""
+    from sklearn.model_selection import train_test_split
+    import model_trainer as mt
+
+    X, y = mt.load_dataset(data_path, None)
+    _, X_test, _, y_test = train_test_split(
+        X, y, test_size=mt.SPLIT_PARAMS["test_size"], random_state=mt.SPLIT_PARAMS["random_state"], stratify=y
+    )
+    return X_test, np.asarray(y_test)
+
+
+def _sliced_xgb_pipeline(xgb_pipeline, booster):
+    """xgb_pipeline with its model replaced by `booster` (same wrapper settings)."""
+    pipeline = copy.deepcopy(xgb_pipeline)
+    model = pipeline.steps[-1][1]
+    model.load_model(bytearray(booster.save_raw("ubj")))
+    model.set_params(n_estimators=booster.num_boosted_rounds())
+    return pipeline
+
+
+def export(model_dir, output_dir=None, max_trees=None, latency_budget_ms=None, data_path="CVD_cleaned.csv"):
+    """
+    Exports `model_dir` to `output_dir` (default: in place) and returns the
+    report dict that is also written to export_report.json.
+    """
+    import joblib
+    import model_trainer as mt
+
+    output_dir = output_dir or model_dir
+    start = time.perf_counter()
+    lr_pipeline = joblib.load(os.path.join(model_dir, "logreg_pipeline.pkl"))
+    xgb_pipeline = joblib.load(os.path.join(model_dir, "xgb_pipeline.pkl"))
+    pickle_load_s = time.perf_counter() - start
+    thresholds = joblib.load(os.path.join(model_dir, "best_thresholds.pkl"))
+    weights = thresholds.get("ensemble_weights", {"logistic_regression": 0.3, "xgboost": 0.7})
+
+    full = CompiledEnsemble.from_pipelines(lr_pipeline, xgb_pipeline)
+    parity = full.check_parity(lr_pipeline, xgb_pipeline)
+    X_test, y_test = _test_split(data_path)
+    X_test_arr = X_test[full.input_features].to_numpy(dtype=object)
+    records = X_test.head(500).to_dict("records")
+
+    def evaluate(compiled):
+        from sklearn.metrics import roc_auc_score
+
+        probs_lr, probs_xgb = compiled.predict_proba_array(X_test_arr)
+        blend = weights["logistic_regression"] * probs_lr + weights["xgboost"] * probs_xgb
+        p50, p99 = _latency_ms(compiled, records)
+        return {
+            "trees": compiled.num_trees, "auc": float(roc_auc_score(y_test, blend)),
+            "auc_xgboost": float(roc_auc_score(y_test, probs_xgb)), "p50_ms": p50, "p99_ms": p99,
+        }
+
+    if max_trees:
+        counts = [min(max_trees, full.num_trees)]
+    else:
+        counts = sorted({max(1, int(full.num_trees * f)) for f in TREE_FRACTIONS}, reverse=True)
+    variants = [evaluate(full.with_max_trees(n)) for n in counts]
+    print(f"{'trees':>6} {'AUC':>8} {'XGB AUC':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for v in variants:
+        print(f"{v['trees']:6d} {v['auc']:8.4f} {v['auc_xgboost']:8.4f} {v['p50_ms']:8.3f} {v['p99_ms']:8.3f}")
+
+    # The most trees that fit the budget (most accurate), else the fewest
+    chosen = variants[0]
+    if latency_budget_ms is not None and not max_trees:
+        fitting = [v for v in variants if v["p50_ms"] <= latency_budget_ms]
+        chosen = fitting[0] if fitting else variants[-1]
+        if not fitting:
+            print(f"No variant meets {latency_budget_ms} ms; using the smallest ({chosen['trees']} trees).")
+    pruned = chosen["trees"] < full.num_trees
+    compiled = full.with_max_trees(chosen["trees"]) if pruned else full
+
+    os.makedirs(output_dir, exist_ok=True)
+    if pruned:
+        # Fewer trees shift the XGBoost probabilities, so re-choose the thresholds
+        probs_lr, probs_xgb = compiled.predict_proba_array(X_test_arr)
+        thresholds = dict(thresholds)
+        thresholds["xgboost"] = mt.search_ensemble_weights(y_test, probs_xgb, probs_xgb, weights=[1.0])[1]
+        thresholds["simple_average"] = mt.search_ensemble_weights(y_test, probs_lr, probs_xgb, weights=[0.5])[1]
+        w_lr, thresholds["weighted_average"], _, _ = mt.search_ensemble_weights(y_test, probs_lr, probs_xgb)
+        thresholds["ensemble_weights"] = {"logistic_regression": w_lr, "xgboost": round(1.0 - w_lr, 10)}
+        xgb_pipeline = _sliced_xgb_pipeline(xgb_pipeline, compiled.booster)
+        parity = compiled.check_parity(lr_pipeline, xgb_pipeline)
+        joblib.dump(xgb_pipeline, os.path.join(output_dir, "xgb_pipeline.pkl"))
+        joblib.dump(thresholds, os.path.join(output_dir, "best_thresholds.pkl"))
+        if output_dir != model_dir:
+            shutil.copy2(os.path.join(model_dir, "logreg_pipeline.pkl"), os.path.join(output_dir, "logreg_pipeline.pkl"))
+    elif output_dir != model_dir:
+        for name in PIPELINE_FILES + ("best_thresholds.pkl",):
+            shutil.copy2(os.path.join(model_dir, name), os.path.join(output_dir, name))
+    compiled.save(os.path.join(output_dir, COMPILED_DIR))
+
+    start = time.perf_counter()
+    CompiledEnsemble.load(os.path.join(output_dir, COMPILED_DIR))
+    compiled_load_s = time.perf_counter() - start
+
+    report = {
+        "source": os.path.abspath(model_dir),
+        "trees": chosen["trees"],
+        "trees_before": full.num_trees,
+        "auc": chosen["auc"],
+        "auc_before": variants[0]["auc"] if not max_trees else evaluate(full)["auc"],
+        "p50_ms": chosen["p50_ms"],
+        "p99_ms": chosen["p99_ms"],
+        "parity_max_diff": parity,
+        "pickle_bytes": _dir_bytes([os.path.join(model_dir, n) for n in PIPELINE_FILES]),
+        "compiled_bytes": _dir_bytes([os.path.join(output_dir, n) for n in COMPILED_FILES]),
+        "pickle_load_s": pickle_load_s,
+        "compiled_load_s": compiled_load_s,
+        "variants": variants,
+        "thresholds": {k: v for k, v in thresholds.items() if k != "ensemble_weights"},
+        "ensemble_weights": thresholds.get("ensemble_weights", weights),
+    }
+    with open(os.path.join(output_dir, "export_report.json"), "w") as f:
+        json.dump(report, f, indent=2, default=float)
+
+    print(f"\nExported {report['trees']}/{report['trees_before']} trees to '{os.path.join(output_dir, COMPILED_DIR)}' "
+          f"(AUC {report['auc']:.4f} vs {report['auc_before']:.4f}).")
+    print(f"  size: pickles {report['pickle_bytes'] / 1e6:.2f} MB -> compiled {report['compiled_bytes'] / 1e6:.2f} MB")
+    print(f"  load: pickles {report['pickle_load_s'] * 1000:.0f} ms -> compiled {report['compiled_load_s'] * 1000:.0f} ms")
+    print(f"  per-row latency: p50 {report['p50_ms']:.3f} ms, p99 {report['p99_ms']:.3f} ms")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a trained model directory for serving.")
+    parser.add_argument('model_dir')
+    parser.add_argument('--output', help="Output directory (default: export in place)")
+    budget = parser.add_mutually_exclusive_group()
+    budget.add_argument('--max-trees', type=int, help="Keep only the first N boosting rounds")
+    budget.add_argument('--latency-budget-ms', type=float, help="Keep the most trees whose p50 single-row latency fits")
+    parser.add_argument('--data', default="CVD_cleaned.csv", help="Dataset whose test split is used for AUC")
+    parser.add_argument('--publish', action='store_true', help="Publish the output directory as a new registry version")
+    parser.add_argument('--registry', default=os.environ.get("MODEL_REGISTRY_DIR", "model_registry"))
+    args = parser.parse_args()
+
+    if (args.max_trees or args.latency_budget_ms is not None) and not args.output:
+        parser.error("--max-trees/--latency-budget-ms change the model; pass --output for the pruned copy.")
+
+    report = export(args.model_dir, args.output, args.max_trees, args.latency_budget_ms, args.data)
+    if args.publish:
+        from model_registry import ModelRegistry
+
+        output_dir = args.output or args.model_dir
+        metrics = {"auc_weighted_average": report["auc"], "xgb_trees": report["trees"], "p50_ms": report["p50_ms"]}
+        version = ModelRegistry(args.registry).publish(output_dir, metrics=metrics, extra_files=compiled_files(output_dir))
+        print(f"Published model version {version}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+"""
+Lazy loading and hot reloading of the ML models.
+
+Nothing heavy (pandas, joblib, sklearn, imblearn, xgboost) is imported until
+the first scoring call or until the background warm-up thread runs, so
+importing app.py, and every `flask` CLI command, stays fast.
+
+Models come from the current version of the model registry when one has been
+published, otherwise from the legacy `models/` directory. `reload()` builds
+a complete new ModelBundle next to the live one and swaps a single
+reference, so in-flight requests finish on the bundle they started with.
+"""
+import os
+import threading
+import time
+
+from instrumentation import stage
+from model_registry import ModelRegistry
+
+LEGACY_VERSION = 'legacy'
+# Blend weights for artifacts trained before model_trainer.py searched them
+DEFAULT_ENSEMBLE_WEIGHTS = {'logistic_regression': 0.3, 'xgboost': 0.7}
+
+
+class ModelBundle:
+    """
+    The loaded pipelines, thresholds, ensemble weights and (optional) compiled
+    fast path of one model version. The pipelines are None when the version
+    was loaded straight from its exported compiled store.
+    """
+
+    def __init__(self, lr_pipeline, xgb_pipeline, thresholds, compiled=None, version=LEGACY_VERSION, directory=None):
+        self.lr_pipeline = lr_pipeline
+        self.xgb_pipeline = xgb_pipeline
+        self.thresholds = thresholds
+        weights = thresholds.get('ensemble_weights', DEFAULT_ENSEMBLE_WEIGHTS)
+        self.weight_lr = float(weights['logistic_regression'])
+        self.weight_xgb = float(weights['xgboost'])
+        self.compiled = compiled
+        self.version = version
+        self.directory = directory
+        self.input_features, self.numerical_features = self._feature_spec()
+
+    def _feature_spec(self):
+        """(input feature order, set of numeric features) as seen by the preprocessor."""
+        if self.compiled is not None:
+            preprocessor = self.compiled.lr_preprocessor
+            return list(preprocessor.input_features), {f for f, _, _, _ in preprocessor.numerical}
+        from sklearn.preprocessing import StandardScaler
+
+        ct = self.lr_pipeline.named_steps['preprocessor']
+        numerical = set()
+        for _, transformer, columns in ct.transformers_:
+            if isinstance(transformer, StandardScaler):
+                numerical.update(columns)
+        return list(ct.feature_names_in_), numerical
+
+    def blend(self, probs_lr, probs_xgb):
+        """(weighted-average probabilities, 'Yes'/'No' results) at the 'weighted_average' threshold."""
+        import numpy as np
+
+        probabilities = (self.weight_lr * np.asarray(probs_lr)) + (self.weight_xgb * np.asarray(probs_xgb))
+        results = np.where(probabilities >= self.thresholds['weighted_average'], 'Yes', 'No')
+        return probabilities, results
+
+    def predict_proba_frame(self, df):
+        """predict_proba() for a DataFrame holding (at least) the input features."""
+        if self.compiled is not None:
+            return self.compiled.predict_proba_array(df[self.input_features].to_numpy(dtype=object))
+        X = df[self.input_features]
+        return self.lr_pipeline.predict_proba(X)[:, 1], self.xgb_pipeline.predict_proba(X)[:, 1]
+
+    def predict_proba(self, records):
+        """Returns (probs_lr, probs_xgb) for a list of raw input dicts."""
+        if self.compiled is not None:
+            with stage('model.encode'):
+                X_lr, X_xgb = self.compiled.encode_records(records)
+            with stage('model.lr'):
+                probs_lr = self.compiled.predict_lr(X_lr)
+            with stage('model.xgb'):
+                probs_xgb = self.compiled.predict_xgb(X_xgb)
+            return probs_lr, probs_xgb
+        import pandas as pd
+
+        with stage('model.dataframe'):
+            input_df = pd.DataFrame(records)
+        with stage('model.lr'):
+            probs_lr = self.lr_pipeline.predict_proba(input_df)[:, 1]
+        with stage('model.xgb'):
+            probs_xgb = self.xgb_pipeline.predict_proba(input_df)[:, 1]
+        return probs_lr, probs_xgb
+
+
+class ModelLoader:
+    NOT_LOADED = 'not_loaded'
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, model_dir, registry_dir=None, fast_inference=True, watch_interval=0):
+        self.model_dir = model_dir
+        self.registry = ModelRegistry(registry_dir) if registry_dir else None
+        self.fast_inference = fast_inference
+        self.watch_interval = watch_interval
+        self.state = self.NOT_LOADED
+        self.error = None
+        self.load_seconds = None
+        self._bundle = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._warmup_thread = None
+        self._watch_thread = None
+        self._failed_version = None
+        self._reload_listeners = []
+
+    def get(self):
+        """Returns the live ModelBundle, loading it on first use. None if loading failed."""
+        if self._bundle is not None or self.state == self.FAILED:
+            return self._bundle
+        with self._lock:
+            if self._bundle is None and self.state != self.FAILED:
+                self.state = self.LOADING
+                start = time.perf_counter()
+                try:
+                    self._bundle = self._load_bundle(self._target_version())
+                except FileNotFoundError as e:
+                    print("Error: Model files not found. Please run the model_trainer.py script first.")
+                    self.error = str(e)
+                    self.state = self.FAILED
+                except Exception as e:
+                    print(f"Error: Could not load model files: {e}")
+                    self.error = str(e)
+                    self.state = self.FAILED
+                else:
+                    self.load_seconds = time.perf_counter() - start
+                    self.state = self.READY
+                    self._start_watcher()
+        return self._bundle
+
+    def reload(self, version=None):
+        """
+        Loads `version` (default: the registry's current version) and swaps it
+        in atomically. Raises if the new version fails to load; the live
+        bundle is left untouched in that case.
+        """
+        with self._reload_lock:
+            version = version or self._target_version()
+            start = time.perf_counter()
+            bundle = self._load_bundle(version)
+            previous = self._bundle
+            self._bundle = bundle # single reference swap; readers never see a partial bundle
+            self.load_seconds = time.perf_counter() - start
+            self.state = self.READY
+            self.error = None
+            print(f"Model version {bundle.version} is now live (was {previous.version if previous else None}).")
+            for listener in self._reload_listeners:
+                listener(previous, bundle)
+            return bundle
+
+    def load_version(self, version=None):
+        """
+        Loads `version` (default: the registry's current version) as a
+        standalone bundle, without making it live. For offline scoring.
+        """
+        return self._load_bundle(version or self._target_version())
+
+    def on_reload(self, listener):
+        """Registers `listener(old_bundle, new_bundle)`, called after every hot swap."""
+        self._reload_listeners.append(listener)
+
+    def start_warmup(self):
+        """Loads the models in a background thread so the first request doesn't pay for it."""
+        with self._lock:
+            if self._warmup_thread is not None or self.state != self.NOT_LOADED:
+                return
+            self._warmup_thread = threading.Thread(target=self.get, name='model-warmup', daemon=True)
+            self._warmup_thread.start()
+
+    def status(self):
+        return {
+            'status': self.state,
+            'version': self._bundle.version if self._bundle else None,
+            'load_seconds': self.load_seconds,
+            'error': self.error,
+        }
+
+    def _target_version(self):
+        if self.registry is not None:
+            return self.registry.current_version() or LEGACY_VERSION
+        return LEGACY_VERSION
+
+    def _load_bundle(self, version):
+        import joblib
+
+        if version == LEGACY_VERSION:
+            directory = self.model_dir
+        else:
+            self.registry.verify(version)
+            directory = self.registry.version_dir(version)
+
+        thresholds = joblib.load(os.path.join(directory, "best_thresholds.pkl"))
+        compiled = self._load_exported(directory)
+        if compiled is not None:
+            # Parity was checked when model_export.py wrote the store
+            print(f"Compiled model store and thresholds loaded successfully (version {version}).")
+            return ModelBundle(None, None, thresholds, compiled, version, os.path.abspath(directory))
+
+        lr_pipeline = joblib.load(os.path.join(directory, "logreg_pipeline.pkl"))
+        xgb_pipeline = joblib.load(os.path.join(directory, "xgb_pipeline.pkl"))
+        print(f"Models and thresholds loaded successfully (version {version}).")
+
+        if self.fast_inference:
+            from fast_inference import CompiledEnsemble
+            try:
+                compiled = CompiledEnsemble.from_pipelines(lr_pipeline, xgb_pipeline)
+                compiled.check_parity(lr_pipeline, xgb_pipeline)
+                print("Compiled fast inference path enabled.")
+            except Exception as e:
+                print(f"Fast inference path disabled, falling back to pipelines: {e}")
+                compiled = None
+
+        return ModelBundle(lr_pipeline, xgb_pipeline, thresholds, compiled, version, os.path.abspath(directory))
+
+    def _load_exported(self, directory):
+        """
+        The compiled store written by model_export.py, if it is at least as new
+        as the pickles it came from; None to fall back to unpickling them.
+        """
+        if not self.fast_inference:
+            return None
+        from fast_inference import COMPILED_MANIFEST, CompiledEnsemble
+
+        compiled_dir = os.path.join(directory, 'compiled')
+        manifest_path = os.path.join(compiled_dir, COMPILED_MANIFEST)
+        sources = [os.path.join(directory, name) for name in ("logreg_pipeline.pkl", "xgb_pipeline.pkl")]
+        try:
+            if os.path.getmtime(manifest_path) < max(os.path.getmtime(p) for p in sources):
+                return None
+            return CompiledEnsemble.load(compiled_dir)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Compiled model store unreadable, loading the pipelines instead: {e}")
+            return None
+
+    def _start_watcher(self):
+        if self.registry is None or self.watch_interval <= 0 or self._watch_thread is not None:
+            return
+        self._watch_thread = threading.Thread(target=self._watch, name='model-registry-watch', daemon=True)
+        self._watch_thread.start()
+
+    def _watch(self):
+        """Polls the registry's CURRENT pointer and hot-swaps when it changes."""
+        while True:
+            time.sleep(self.watch_interval)
+            target = None
+            try:
+                target = self._target_version()
+                if target == self._failed_version:
+                    continue # don't retry a broken version every interval
+                if self._bundle is None or target != self._bundle.version:
+                    self.reload(target)
+            except Exception as e:
+                self._failed_version = target
+                print(f"Model reload failed, keeping version {self._bundle.version if self._bundle else None}: {e}")
@@ -0,0 +1,192 @@
+"""
+Versioned model registry.
+
+Layout:
+    model_registry/
+        CURRENT                      <- name of the live version
+        versions/<version>/
+            logreg_pipeline.pkl
+            xgb_pipeline.pkl
+            best_thresholds.pkl
+            compiled/                <- optional serving export (model_export.py)
+            manifest.json            <- version, created_at, thresholds, metrics, sha256 per file
+
+Versions are immutable once published. A version directory is built under a
+temporary name and renamed into place, and CURRENT is swapped with
+os.replace(), so a reader never sees a half-written version.
+
+    python model_registry.py publish models_latestv2 [--metrics metrics.json]
+    python model_registry.py list
+    python model_registry.py promote <version>
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+MODEL_FILES = ("logreg_pipeline.pkl", "xgb_pipeline.pkl", "best_thresholds.pkl")
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _to_builtin(value):
+    """Thresholds come out of NumPy; make them JSON-serializable."""
+    if isinstance(value, dict):
+        return {k: _to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(v) for v in value]
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = root
+        self.versions_dir = os.path.join(root, 'versions')
+
+    def version_dir(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def list_versions(self):
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(
+            v for v in os.listdir(self.versions_dir)
+            if not v.startswith('.') and os.path.exists(os.path.join(self.versions_dir, v, MANIFEST_FILE))
+        )
+
+    def manifest(self, version):
+        with open(os.path.join(self.version_dir(version), MANIFEST_FILE)) as f:
+            return json.load(f)
+
+    def verify(self, version):
+        """Raises ValueError if any file of `version` does not match its manifest checksum."""
+        manifest = self.manifest(version)
+        for name, expected in manifest['checksums'].items():
+            actual = file_sha256(os.path.join(self.version_dir(version), name))
+            if actual != expected:
+                raise ValueError(f"Checksum mismatch for {name} in model version {version}.")
+        return manifest
+
+    def publish(self, source_dir, metrics=None, version=None, extra_files=(), activate=True):
+        """
+        Copies the model files from `source_dir` into a new immutable version,
+        writes its manifest and (by default) makes it the current version.
+        Without an explicit `version` the name is the UTC time to the
+        microsecond, with a -2, -3... suffix if another publish took it.
+        """
+        import joblib
+
+        auto_named = version is None
+        version = version or datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S-%f')
+        if os.path.exists(self.version_dir(version)) and not auto_named:
+            raise ValueError(f"Model version {version} already exists.")
+
+        os.makedirs(self.versions_dir, exist_ok=True)
+        # Hidden and per-process, so concurrent publishes don't share it and list_versions() skips it
+        staging_dir = os.path.join(self.versions_dir, f'.{version}.{os.getpid()}.tmp')
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+
+        checksums = {}
+        for name in MODEL_FILES + tuple(extra_files):
+            # extra_files may live in subdirectories, e.g. compiled/compiled.json
+            os.makedirs(os.path.dirname(os.path.join(staging_dir, name)), exist_ok=True)
+            shutil.copy2(os.path.join(source_dir, name), os.path.join(staging_dir, name))
+            checksums[name] = file_sha256(os.path.join(staging_dir, name))
+
+        manifest = {
+            'version': version,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'source': os.path.abspath(source_dir),
+            'thresholds': _to_builtin(joblib.load(os.path.join(staging_dir, "best_thresholds.pkl"))),
+            'metrics': _to_builtin(metrics or {}),
+            'checksums': checksums,
+        }
+        base_version = version
+        for attempt in range(1, 100):
+            if attempt > 1:
+                version = f"{base_version}-{attempt}"
+            manifest['version'] = version
+            with open(os.path.join(staging_dir, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            try:
+                if os.path.exists(self.version_dir(version)):
+                    raise FileExistsError(version)
+                os.rename(staging_dir, self.version_dir(version))
+                break
+            except OSError:
+                if not auto_named or attempt == 99:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                    raise ValueError(f"Model version {version} already exists.")
+
+        if activate:
+            self.promote(version)
+        return version
+
+    def promote(self, version):
+        """Atomically points CURRENT at `version` (also used for rollback)."""
+        if version not in self.list_versions():
+            raise ValueError(f"Unknown model version {version}.")
+        tmp_path = os.path.join(self.root, CURRENT_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, CURRENT_FILE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the versioned model registry.")
+    parser.add_argument('--registry', default=os.environ.get('MODEL_REGISTRY_DIR', 'model_registry'))
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    publish = sub.add_parser('publish', help="Publish a directory of trained models as a new version")
+    publish.add_argument('source_dir')
+    publish.add_argument('--metrics', help="JSON file with evaluation metrics to record")
+    publish.add_argument('--version')
+    publish.add_argument('--no-activate', action='store_true')
+
+    sub.add_parser('list', help="List published versions")
+
+    promote = sub.add_parser('promote', help="Make an existing version current")
+    promote.add_argument('version')
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.registry)
+
+    if args.command == 'publish':
+        metrics = None
+        if args.metrics:
+            with open(args.metrics) as f:
+                metrics = json.load(f)
+        version = registry.publish(args.source_dir, metrics=metrics, version=args.version, activate=not args.no_activate)
+        print(f"Published model version {version}.")
+    elif args.command == 'list':
+        current = registry.current_version()
+        for version in registry.list_versions():
+            marker = '*' if version == current else ' '
+            print(f"{marker} {version}  {json.dumps(registry.manifest(version).get('metrics', {}))}")
+    elif args.command == 'promote':
+        registry.promote(args.version)
+        print(f"Model version {args.version} is now current.")
+
+
+if __name__ == '__main__':
+    main()
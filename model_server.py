@@ -0,0 +1,135 @@
+"""
+Process-pool model serving.
+
+Scoring runs in worker processes so prediction throughput is not bounded by
+the GIL of the web process. Each worker loads the compiled ensemble once from
+the array store written by CompiledEnsemble.save(). Only the logistic
+regression arrays are opened with np.load(mmap_mode='r') and shared through
+the page cache. The booster is read from XGBoost's native format into each
+worker's own memory, so the booster's footprint still grows with the worker
+count.
+
+Workers are started with the 'spawn' method and only import this module and
+fast_inference, never app.py.
+"""
+import logging
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from fast_inference import CompiledEnsemble
+
+logger = logging.getLogger(__name__)
+
+_worker_model = None
+
+
+def _init_worker(artifact_dir):
+    global _worker_model
+    # LR arrays are memory-mapped; the booster is a private copy per worker
+    _worker_model = CompiledEnsemble.load(artifact_dir, mmap_mode='r')
+    # One scoring thread per process; parallelism comes from the pool itself
+    _worker_model.booster.set_param({'nthread': 1})
+
+
+def _score_in_worker(records):
+    return _worker_model.predict_proba_records(records)
+
+
+def _ping(_=None):
+    return _worker_model is not None
+
+
+class ModelServer:
+    """
+    Dispatches scoring to a pool of worker processes. Large batches are split
+    into one chunk per worker so they use every core.
+
+    Callers bracket their calls with acquire()/release(). retire() stops new
+    callers from acquiring the server and shuts the pool down once the last
+    current caller has released it, so a hot swap never fails calls in flight.
+    """
+    def __init__(self, artifact_dir, workers, min_chunk_size=256, version=None):
+        self.artifact_dir = artifact_dir
+        self.workers = workers
+        self.min_chunk_size = min_chunk_size
+        self.version = version
+        self._pool = self._new_pool()
+        self._pool_lock = threading.Lock()
+        self._users = 0
+        self._retired = False
+        self._users_lock = threading.Lock()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.artifact_dir,)
+        )
+
+    def warm_up(self):
+        """Blocks until every worker process has loaded the model."""
+        list(self._pool.map(_ping, range(self.workers)))
+
+    def predict_proba_records(self, records):
+        pool = self._pool
+        try:
+            return self._predict(pool, records)
+        except BrokenProcessPool:
+            # A worker died (OOM kill, segfault); replace the pool and retry once
+            return self._predict(self._replace_pool(pool), records)
+
+    def _replace_pool(self, broken):
+        """Swaps in a new pool unless another caller already replaced `broken`; returns the current pool."""
+        with self._pool_lock:
+            if self._pool is broken:
+                logger.warning("Model server worker pool broken, restarting it.")
+                self._pool = self._new_pool()
+                broken.shutdown(wait=False, cancel_futures=True)
+            return self._pool
+
+    def _predict(self, pool, records):
+        n_chunks = min(self.workers, math.ceil(len(records) / self.min_chunk_size))
+        if n_chunks <= 1:
+            return pool.submit(_score_in_worker, records).result()
+        size = math.ceil(len(records) / n_chunks)
+        chunks = [records[i:i + size] for i in range(0, len(records), size)]
+        parts = list(pool.map(_score_in_worker, chunks))
+        return (
+            np.concatenate([probs_lr for probs_lr, _ in parts]),
+            np.concatenate([probs_xgb for _, probs_xgb in parts]),
+        )
+
+    def acquire(self):
+        """Registers a caller. False once the server is retired; use its replacement then."""
+        with self._users_lock:
+            if self._retired:
+                return False
+            self._users += 1
+            return True
+
+    def release(self):
+        with self._users_lock:
+            self._users -= 1
+            drained = self._retired and self._users == 0
+        if drained:
+            self._shutdown_in_background()
+
+    def retire(self):
+        """Refuses new callers and shuts down after the current ones release the server."""
+        with self._users_lock:
+            self._retired = True
+            drained = self._users == 0
+        if drained:
+            self._shutdown_in_background()
+
+    def _shutdown_in_background(self):
+        threading.Thread(target=self.shutdown, kwargs={'cancel_futures': False}, daemon=True).start()
+
+    def shutdown(self, cancel_futures=True):
+        self._pool.shutdown(wait=True, cancel_futures=cancel_futures)
@@ -1,38 +1,79 @@
+"""
+Trains the Logistic Regression + XGBoost ensemble and publishes it.
+
+    python model_trainer.py [--data CVD_cleaned.csv] [--output models_latestv2]
+                            [--cache-dir .train_cache] [--no-cache] [--jobs 2]
+                            [--chunksize ROWS] [--no-publish]
+
+The preprocessor and SMOTE are fitted once and the resampled training matrix
+is shared by both models, which then train in parallel. Every expensive
+stage is memoized on disk (joblib.Memory) keyed by the dataset's sha256 and
+the stage's parameters, so a rerun on unchanged data only redoes what
+changed. Per-stage timings are printed at the end.
+
+The CSV is read with explicit dtypes (category for the categorical features,
+float32 for the numeric ones) and converted once to a Parquet file in the
+cache directory (needs pyarrow), which later runs read instead of the CSV.
+--chunksize parses the CSV that many rows at a time: the Parquet conversion
+writes each piece as a row group, and without a cache each piece is reduced
+into the typed columns before the next one is parsed.
+
+    python model_trainer.py --incremental [--db sqlite:///cardiocare.db]
+                            [--xgb-rounds 20] [--lr-epochs 5]
+
+continues the current registry version on the outcomes doctors confirmed
+since it was built (see section 6) and publishes the result.
+
+    python model_trainer.py --tune [--tune-candidates 12] [--tune-workers N]
+    python model_trainer.py --params models_latestv2/best_params.json
+
+searches model and SMOTE parameters (see section 7), then trains with the
+winners.
+
+The saved pipelines are the same preprocessor -> SMOTE -> model ImbPipelines
+as before, so the app and the model registry load them unchanged. Next to
+them goes the compiled serving store (model_export.py), which the app loads
+instead of the pickles; model_export.py also prunes trees to a latency budget.
+"""
+import argparse
+import json
 import os
+import time
+from contextlib import contextmanager
+
 import pandas as pd
 import numpy as np
 import joblib
+from joblib import Memory, Parallel, delayed
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.linear_model import LogisticRegression
 from xgboost import XGBClassifier
 from sklearn.metrics import (
-    roc_auc_score, accuracy_score, precision_score, 
+    roc_auc_score, accuracy_score, precision_score,
     recall_score, f1_score, classification_report,
     precision_recall_curve
 )
 from sklearn.compose import ColumnTransformer
 # We use the pipeline from imblearn to properly integrate SMOTE
-from imblearn.pipeline import Pipeline as ImbPipeline 
-from imblearn.over_sampling import SMOTE 
+from imblearn.pipeline import Pipeline as ImbPipeline
+from imblearn.over_sampling import SMOTE
 import warnings
 
+from model_export import compiled_files, export_compiled
+from model_registry import ModelRegistry, file_sha256
+
 # Suppress warnings for cleaner output
 warnings.filterwarnings('ignore', category=UserWarning, module='sklearn')
 warnings.filterwarnings('ignore', category=FutureWarning)
 
 
 # ──────────────────────────────
-# 1. Load Dataset
+# 1. Dataset & Feature Definitions
 # ──────────────────────────────
 DATASET_FILENAME = "CVD_cleaned.csv"
-try:
-    df = pd.read_csv(DATASET_FILENAME)
-    print("Dataset loaded successfully.")
-except FileNotFoundError:
-    print(f"Error: '{DATASET_FILENAME}' not found.")
-    print("Please download the dataset from the specified Kaggle link and place it in the same folder as this script.")
-    exit()
+OUTPUT_DIR = "models_latestv2"
+CACHE_DIR = ".train_cache"
 
 features = [
     "General_Health","Checkup","Exercise","Smoking_History",
@@ -42,15 +83,9 @@ features = [
 ]
 target = "Heart_Disease"
 
-X = df[features]
-y = df[target].map({"Yes": 1, "No": 0})
-
-# ──────────────────────────────
-# 2. Define Preprocessing
-# ──────────────────────────────
 categorical_features = [
-    "General_Health", "Checkup", "Exercise", "Smoking_History", 
-    "Sex", "Age_Category", "Diabetes", "Depression", 
+    "General_Health", "Checkup", "Exercise", "Smoking_History",
+    "Sex", "Age_Category", "Diabetes", "Depression",
     "Arthritis", "Skin_Cancer", "Other_Cancer"
 ]
 numerical_features = [
@@ -58,83 +93,210 @@ numerical_features = [
     "FriedPotato_Consumption", "BMI"
 ]
 
-preprocessor = ColumnTransformer(
-    transformers=[
-        ('num', StandardScaler(), numerical_features),
-        ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False), categorical_features)
-    ],
-    remainder='passthrough'
-)
-print("Preprocessor defined.")
+SPLIT_PARAMS = {"test_size": 0.3, "random_state": 42}
+SMOTE_PARAMS = {"random_state": 42}
+MODEL_PARAMS = {
+    "logistic_regression": {"solver": "liblinear", "random_state": 42},
+    "xgboost": {"random_state": 42, "use_label_encoder": False, "eval_metric": "logloss"},
+}
+# Explicit dtypes: the CSV's repeated strings become small integer codes
+DTYPES = {
+    **{feature: "category" for feature in categorical_features},
+    **{feature: "float32" for feature in numerical_features},
+    target: "category",
+}
+
+# Weighted Average Ensemble (30% LR, 70% XGB) before the weights were searched;
+# still what the app assumes for artifacts saved without "ensemble_weights"
+ENSEMBLE_WEIGHTS = {"logistic_regression": 0.3, "xgboost": 0.7}
+# LR weights tried by search_ensemble_weights(); XGBoost gets 1 - w
+WEIGHT_GRID = np.round(np.linspace(0.0, 1.0, 21), 2)
+MIN_RECALL = 0.75
+
+
+def build_preprocessor():
+    return ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), numerical_features),
+            ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False), categorical_features)
+        ],
+        remainder='passthrough'
+    )
+
+
+def build_model(name, params):
+    if name == "logistic_regression":
+        return LogisticRegression(**params)
+    if name == "xgboost":
+        return XGBClassifier(**params)
+    raise ValueError(f"Unknown model '{name}'.")
 
-# ──────────────────────────────
-# 3. Split Data (BEFORE SMOTE)
-# ──────────────────────────────
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, 
-    test_size=0.3,  
-    random_state=42, 
-    stratify=y       
-)
-print(f"Data split: {len(y_train)} train, {len(y_test)} test samples.")
-print(f"Train set 'Yes' count: {y_train.sum()} ({y_train.mean()*100:.2f}%)")
-print(f"Test set 'Yes' count:  {y_test.sum()} ({y_test.mean()*100:.2f}%)")
 
 # ──────────────────────────────
-# 4. Define and Train Models
+# 2. Dataset Ingestion
 # ──────────────────────────────
+def _count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b''))
+
+
+def read_csv_typed(data_path, chunksize=None):
+    """
+    Reads only the model columns with DTYPES. With `chunksize` the CSV is
+    parsed that many rows at a time and each chunk is reduced straight into
+    preallocated columns (float32 values, category codes), so peak memory is
+    the typed result plus one chunk rather than every chunk plus their concat.
+    """
+    read_kwargs = dict(usecols=features + [target], dtype=DTYPES)
+    if not chunksize:
+        return pd.read_csv(data_path, **read_kwargs)
+
+    capacity = _count_lines(data_path) + 1 # never fewer than the records, even with quoted newlines
+    columns, vocabularies, n = None, {}, 0
+    for chunk in pd.read_csv(data_path, chunksize=chunksize, **read_kwargs):
+        if columns is None:
+            columns = {c: np.empty(capacity, dtype=np.int32 if DTYPES[c] == "category" else np.float32) for c in chunk.columns}
+            vocabularies = {c: {} for c in chunk.columns if DTYPES[c] == "category"}
+        m = len(chunk)
+        for c, values in columns.items():
+            if c in vocabularies:
+                # This chunk's codes -> codes into one vocabulary for the whole file; missing (-1) stays -1
+                vocab = vocabularies[c]
+                to_file = np.array([vocab.setdefault(cat, len(vocab)) for cat in chunk[c].cat.categories] + [-1], dtype=np.int32)
+                values[n:n + m] = to_file[chunk[c].cat.codes.to_numpy()]
+            else:
+                values[n:n + m] = chunk[c].to_numpy()
+        n += m
+    if columns is None:
+        return pd.read_csv(data_path, **read_kwargs)
+
+    for c in vocabularies:
+        categories = list(vocabularies[c])
+        # Sorted, as a single read_csv infers them
+        columns[c] = pd.Categorical.from_codes(columns[c][:n], categories=categories).reorder_categories(sorted(categories))
+    return pd.DataFrame({c: values[:n] if c not in vocabularies else values for c, values in columns.items()})
 
-# --- Logistic Regression Pipeline with SMOTE ---
-lr_pipeline = ImbPipeline([
-    ('preprocessor', preprocessor),
-    ('smote', SMOTE(random_state=42)), 
-    ('model', LogisticRegression(
-        solver='liblinear', 
-        random_state=42
-    ))
-])
 
-# --- XGBoost Pipeline with SMOTE ---
-xgb_pipeline = ImbPipeline([
-    ('preprocessor', preprocessor),
-    ('smote', SMOTE(random_state=42)), 
-    ('model', XGBClassifier(
-        random_state=42, 
-        use_label_encoder=False, 
-        eval_metric='logloss'
-    ))
-])
+def write_parquet_cache(data_path, parquet_path, chunksize=None):
+    """
+    Converts the CSV to Parquet. With `chunksize` the CSV is streamed through
+    one row group at a time, so memory stays bounded by the chunk size.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
 
-# Train models
-print("\nTraining Logistic Regression...")
-lr_pipeline.fit(X_train, y_train)
-print("Logistic Regression training complete.")
+    schema = pa.schema(
+        [(f, pa.dictionary(pa.int32(), pa.string())) if DTYPES[f] == "category" else (f, pa.float32())
+         for f in features + [target]]
+    )
+    tmp_path = parquet_path + ".tmp"
+    chunks = pd.read_csv(data_path, usecols=features + [target], dtype=DTYPES, chunksize=chunksize or 100_000)
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk[features + [target]], schema=schema, preserve_index=False))
+    os.replace(tmp_path, parquet_path)
+
+
+def load_dataframe(data_path, dataset_hash, cache_dir=None, chunksize=None):
+    """
+    Returns the typed DataFrame, from the Parquet cache when it exists (and
+    building it on first use). Falls back to a typed CSV read without
+    pyarrow or without a cache directory.
+    """
+    start = time.perf_counter()
+    source = "CSV"
+    df = None
+    if cache_dir:
+        parquet_path = os.path.join(cache_dir, "datasets", f"{dataset_hash}.parquet")
+        try:
+            if not os.path.exists(parquet_path):
+                os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+                write_parquet_cache(data_path, parquet_path, chunksize)
+                print(f"Wrote Parquet cache {parquet_path}.")
+                source = "CSV via a new Parquet cache"
+            else:
+                source = "Parquet cache"
+            df = pd.read_parquet(parquet_path)
+        except ImportError:
+            print("pyarrow is not installed; reading the CSV without a Parquet cache.")
+    if df is None:
+        df = read_csv_typed(data_path, chunksize)
+    megabytes = df.memory_usage(deep=True).sum() / 1e6
+    print(f"Loaded {len(df)} rows from {source} in {time.perf_counter() - start:.2f}s ({megabytes:.1f} MB in memory).")
+    return df
 
-print("\nTraining XGBoost...")
-xgb_pipeline.fit(X_train, y_train)
-print("XGBoost training complete.")
 
 # ──────────────────────────────
-# 5. Evaluate Individual Models
+# 3. Cached Pipeline Stages
 # ──────────────────────────────
+# Each stage takes the dataset hash (and its own parameters) so joblib.Memory
+# keys the cache on content, not on the file's path or mtime.
 
-# Get probabilities from the test set
-probs_lr = lr_pipeline.predict_proba(X_test)[:, 1]
-probs_xgb = xgb_pipeline.predict_proba(X_test)[:, 1]
+def load_dataset(data_path, dataset_hash, cache_dir=None, chunksize=None):
+    df = load_dataframe(data_path, dataset_hash, cache_dir, chunksize)
+    X = df[features]
+    y = df[target].map({"Yes": 1, "No": 0}).astype("int8")
+    return X, y
 
-# Clean probabilities of any NaN/Inf values just in case
-probs_lr = np.nan_to_num(probs_lr)
-probs_xgb = np.nan_to_num(probs_xgb)
 
+def prepare_training_data(data_path, dataset_hash, split_params, smote_params, cache_dir=None, chunksize=None):
+    """
+    Splits the data (BEFORE SMOTE), fits the preprocessor on the training
+    split and oversamples it once. Returns the fitted preprocessor, the
+    resampled training matrix and the raw + transformed test split.
+    """
+    X, y = load_dataset(data_path, dataset_hash, cache_dir, chunksize)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y,
+        test_size=split_params["test_size"],
+        random_state=split_params["random_state"],
+        stratify=y
+    )
+    preprocessor = build_preprocessor().fit(X_train, y_train)
+    X_train_res, y_train_res = SMOTE(**smote_params).fit_resample(preprocessor.transform(X_train), y_train)
+    return {
+        "preprocessor": preprocessor,
+        "X_train_res": X_train_res,
+        "y_train_res": np.asarray(y_train_res),
+        "X_test": X_test,
+        "X_test_t": preprocessor.transform(X_test),
+        "y_test": np.asarray(y_test),
+        "train_size": int(len(y_train)),
+        "train_positives": int(y_train.sum()),
+    }
+
+
+def fit_model(name, params, train_data_hash, X_train_res, y_train_res):
+    start = time.perf_counter()
+    model = build_model(name, params).fit(X_train_res, y_train_res)
+    return model, time.perf_counter() - start
+
+
+def assemble_pipeline(preprocessor, model, smote_params):
+    """
+    Rebuilds the preprocessor -> SMOTE -> model ImbPipeline the app loads.
+    SMOTE only acts during fit, so at prediction time this is identical to
+    having fitted the whole pipeline end to end.
+    """
+    return ImbPipeline([
+        ('preprocessor', preprocessor),
+        ('smote', SMOTE(**smote_params)),
+        ('model', model)
+    ])
+
+
+# ──────────────────────────────
+# 4. Threshold Evaluation
+# ──────────────────────────────
 def evaluate_from_probs(model_name, y_true, y_probs, min_recall=0.75):
     """
     Finds the best threshold that achieves a minimum recall
     while maximizing precision.
     """
     print(f"\n--- Evaluating {model_name} ---")
-    
+
     precisions, recalls, thresholds = precision_recall_curve(y_true, y_probs)
-    
+
     # We need to handle the last threshold, which is always 1.0
     # and has recall 0. We'll append it to make arrays match.
     if len(precisions) == len(thresholds):
@@ -143,7 +305,7 @@ def evaluate_from_probs(model_name, y_true, y_probs, min_recall=0.75):
 
     # Find all thresholds that meet our minimum recall requirement
     passing_threshold_indices = np.where(recalls >= min_recall)[0]
-    
+
     if len(passing_threshold_indices) == 0:
         # If no threshold meets our recall, we have a problem.
         # Fall back to maximizing F1-score as a contingency.
@@ -159,53 +321,636 @@ def evaluate_from_probs(model_name, y_true, y_probs, min_recall=0.75):
         best_idx = passing_threshold_indices[np.argmax(precision_at_min_recall)]
 
     best_threshold = thresholds[best_idx]
-    
+
     # Get predictions based on this optimal threshold
     y_pred_optimal = (y_probs >= best_threshold).astype(int)
-    
+
     print("\nClassification Report (with optimal threshold):")
     report = classification_report(y_true, y_pred_optimal, target_names=["No Heart Disease", "Heart Disease"])
     print(report)
-    
+
     auc_score = roc_auc_score(y_true, y_probs)
     print(f"AUC Score = {auc_score:.4f}")
-    
+
     # Return the threshold
     return best_threshold
 
-# Run evaluations
-best_threshold_lr = evaluate_from_probs("Logistic Regression", y_test, probs_lr)
-best_threshold_xgb = evaluate_from_probs("XGBoost", y_test, probs_xgb)
+
+def search_ensemble_weights(y_true, probs_lr, probs_xgb, weights=WEIGHT_GRID, min_recall=MIN_RECALL):
+    """
+    Sweeps the LR weight w (XGBoost gets 1 - w) and every threshold of each
+    blend at once. Like evaluate_from_probs, a (w, threshold) pair qualifies
+    when its recall is >= min_recall and the winner is the qualifying pair
+    with the highest precision (ties go to the higher recall); if nothing
+    qualifies, the best F1 wins. Returns (w, threshold, precision, recall).
+
+    All W blends are sorted in one argsort; cumulative sums of the sorted
+    labels give TP/FP at every cut, so there is no Python loop per weight.
+    """
+    y_true = np.asarray(y_true, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    blends = weights[:, None] * probs_lr[None, :] + (1.0 - weights)[:, None] * probs_xgb[None, :]
+
+    order = np.argsort(-blends, axis=1, kind='stable')
+    scores = np.take_along_axis(blends, order, axis=1)
+    tp = np.cumsum(y_true[order], axis=1)
+    fp = np.arange(1, y_true.size + 1)[None, :] - tp
+    # Only cut after the last of a run of tied scores: that's what ">= threshold" does
+    last_of_tie = np.ones_like(scores, dtype=bool)
+    last_of_tie[:, :-1] = scores[:, :-1] != scores[:, 1:]
+
+    precision = tp / (tp + fp)
+    recall = tp / max(1, int(y_true.sum()))
+    qualifies = last_of_tie & (recall >= min_recall)
+    if qualifies.any():
+        objective = np.where(qualifies, precision, -1.0)
+    else:
+        print(f"⚠️ WARNING: No weight/threshold achieved {min_recall*100}% recall. Optimizing F1 instead.")
+        with np.errstate(invalid='ignore', divide='ignore'):
+            f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+        objective = np.where(last_of_tie, f1, -1.0)
+    # Highest objective first, then highest recall (the later cut along the row)
+    best = objective.max()
+    w_idx, cut = np.nonzero(objective == best)
+    pick = np.argmax(recall[w_idx, cut])
+    w_idx, cut = w_idx[pick], cut[pick]
+    return float(weights[w_idx]), scores[w_idx, cut], float(precision[w_idx, cut]), float(recall[w_idx, cut])
+
 
 # ──────────────────────────────
-# 6. Ensemble Evaluation
+# 5. Training Pipeline
 # ──────────────────────────────
-# Simple Average Ensemble
-simple_avg_probs = (probs_lr + probs_xgb) / 2
-best_threshold_simple_avg = evaluate_from_probs("Simple Average Ensemble", y_test, simple_avg_probs)
+class StageTimer:
+    """Collects wall-clock time per pipeline stage."""
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, cached=False):
+        start = time.perf_counter()
+        yield
+        self.stages.append((name, time.perf_counter() - start, cached))
+
+    def detail(self, name, seconds, cached=False):
+        """Records a sub-step of the previous stage (not added to the total)."""
+        self.stages.append(('  ' + name, seconds, cached))
+
+    def report(self):
+        print("\nStage timings:")
+        for name, seconds, cached in self.stages:
+            print(f"  {name:<36} {seconds:8.2f}s{'  (cached)' if cached else ''}")
+        total = sum(s for name, s, _ in self.stages if not name.startswith(' '))
+        print(f"  {'total':<36} {total:8.2f}s")
+
+
+def _is_cached(func, *args):
+    return hasattr(func, 'check_call_in_cache') and func.check_call_in_cache(*args)
+
+
+def train(data_path=DATASET_FILENAME, output_dir=OUTPUT_DIR, cache_dir=CACHE_DIR, n_jobs=2, chunksize=None,
+          split_params=SPLIT_PARAMS, smote_params=SMOTE_PARAMS, model_params=MODEL_PARAMS, min_recall=MIN_RECALL):
+    """
+    Runs the whole training pipeline and saves the pipelines and thresholds to
+    `output_dir`. Returns a dict with the output directory, thresholds,
+    evaluation metrics and stage timings.
+    """
+    timer = StageTimer()
+    # location=None turns joblib.Memory into a pass-through (no caching)
+    memory = Memory(cache_dir, verbose=0)
+
+    with timer.stage("hash dataset"):
+        dataset_hash = file_sha256(data_path)
+    print(f"Dataset {data_path} (sha256 {dataset_hash[:12]}).")
+
+    prepare = memory.cache(prepare_training_data, ignore=['data_path', 'cache_dir', 'chunksize'])
+    prepare_args = (data_path, dataset_hash, split_params, smote_params, cache_dir, chunksize)
+    with timer.stage("load + preprocess + SMOTE", cached=_is_cached(prepare, *prepare_args)):
+        data = prepare(*prepare_args)
+    y_test = data["y_test"]
+    print(f"Data split: {data['train_size']} train, {len(y_test)} test samples.")
+    print(f"Train set 'Yes' count: {data['train_positives']} ({data['train_positives'] / data['train_size'] * 100:.2f}%)")
+    print(f"Test set 'Yes' count:  {int(y_test.sum())} ({y_test.mean()*100:.2f}%)")
+    print(f"SMOTE-resampled training matrix: {data['X_train_res'].shape}.")
+
+    # Models train in parallel on the shared resampled matrix. Threads are
+    # enough: liblinear and XGBoost release the GIL while fitting, and the
+    # matrix isn't copied into worker processes. Each fit is cached on its
+    # own parameters plus a hash of the exact training data (hashed once
+    # here rather than on every cache lookup).
+    fit = memory.cache(fit_model, ignore=['X_train_res', 'y_train_res'])
+    train_data_hash = joblib.hash((data["X_train_res"], data["y_train_res"]))
+    names = list(model_params)
+    cached = [_is_cached(fit, n, model_params[n], train_data_hash, None, None) for n in names]
+    jobs = max(1, min(n_jobs, len(names)))
+    print(f"\nTraining {', '.join(names)} ({jobs} parallel jobs)...")
+    with timer.stage("train models", cached=all(cached)):
+        fitted = Parallel(n_jobs=jobs, prefer='threads')(
+            delayed(fit)(n, model_params[n], train_data_hash, data["X_train_res"], data["y_train_res"]) for n in names
+        )
+    models = {}
+    for name, (model, seconds), was_cached in zip(names, fitted, cached):
+        models[name] = model
+        timer.detail(f"fit {name}", seconds, was_cached)
+        print(f"{name} training complete.")
+
+    with timer.stage("evaluate"):
+        # Get probabilities from the test set
+        probs = {name: np.nan_to_num(model.predict_proba(data["X_test_t"])[:, 1]) for name, model in models.items()}
+        probs_lr, probs_xgb = probs["logistic_regression"], probs["xgboost"]
+
+        # Run evaluations
+        best_threshold_lr = evaluate_from_probs("Logistic Regression", y_test, probs_lr, min_recall)
+        best_threshold_xgb = evaluate_from_probs("XGBoost", y_test, probs_xgb, min_recall)
+
+        # Simple Average Ensemble
+        simple_avg_probs = (probs_lr + probs_xgb) / 2
+        best_threshold_simple_avg = evaluate_from_probs("Simple Average Ensemble", y_test, simple_avg_probs, min_recall)
+
+    # Weighted Average Ensemble: weights and threshold chosen together
+    with timer.stage("weight + threshold search"):
+        w_lr, best_threshold_weighted_avg, precision, recall = search_ensemble_weights(y_test, probs_lr, probs_xgb, min_recall=min_recall)
+        w_xgb = round(1.0 - w_lr, 10)
+    print(f"\nBest ensemble weights over {len(WEIGHT_GRID)} candidates: {w_lr:.2f} LR / {w_xgb:.2f} XGB, "
+          f"threshold {best_threshold_weighted_avg:.4f} (precision {precision:.4f}, recall {recall:.4f}).")
+    weighted_avg_probs = (w_lr * probs_lr) + (w_xgb * probs_xgb)
+    with timer.stage("evaluate ensemble"):
+        evaluate_from_probs(f"Weighted Average Ensemble ({w_lr:.0%} LR, {w_xgb:.0%} XGB)", y_test, weighted_avg_probs, min_recall)
+
+    with timer.stage("save"):
+        os.makedirs(output_dir, exist_ok=True)
+        # Save the entire pipeline (preprocessor + smote + model)
+        joblib.dump(assemble_pipeline(data["preprocessor"], models["logistic_regression"], smote_params), os.path.join(output_dir, "logreg_pipeline.pkl"))
+        joblib.dump(assemble_pipeline(data["preprocessor"], models["xgboost"], smote_params), os.path.join(output_dir, "xgb_pipeline.pkl"))
 
-# Weighted Average Ensemble (30% LR, 70% XGB)
-weighted_avg_probs = (0.3 * probs_lr) + (0.7 * probs_xgb)
-best_threshold_weighted_avg = evaluate_from_probs("Weighted Average Ensemble (30% LR, 70% XGB)", y_test, weighted_avg_probs)
+        # Save the best thresholds for all strategies in a dictionary
+        thresholds = {
+            "logistic_regression": best_threshold_lr,
+            "xgboost": best_threshold_xgb,
+            "simple_average": best_threshold_simple_avg,
+            "weighted_average": best_threshold_weighted_avg,
+            # The app blends with these instead of a hardcoded 0.3/0.7
+            "ensemble_weights": {"logistic_regression": w_lr, "xgboost": w_xgb}
+        }
+        joblib.dump(thresholds, os.path.join(output_dir, "best_thresholds.pkl"))
+    print(f"\n✅ Models and all thresholds saved to the '{output_dir}' directory!")
+
+    metrics = {
+        "auc_logistic_regression": roc_auc_score(y_test, probs_lr),
+        "auc_xgboost": roc_auc_score(y_test, probs_xgb),
+        "auc_weighted_average": roc_auc_score(y_test, weighted_avg_probs),
+        "weighted_average_precision": precision,
+        "weighted_average_recall": recall,
+        "test_samples": int(len(y_test)),
+        "dataset_sha256": dataset_hash,
+    }
+    return {"output_dir": output_dir, "thresholds": thresholds, "metrics": metrics, "timer": timer}
 
 
 # ──────────────────────────────
-# 7. Save Models & Thresholds
+# 6. Incremental Training
 # ──────────────────────────────
-output_dir = "models_latestv2"
-os.makedirs(output_dir, exist_ok=True)
+# Doctors confirm real outcomes on stored predictions (Prediction.confirmed_outcome).
+# Instead of retraining on the whole CSV, --incremental continues the current
+# registry version on the outcomes confirmed since that version was built:
+# XGBoost keeps its trees and grows --xgb-rounds more, and the logistic
+# regression takes a few SGD epochs starting from its current coefficients.
+# The preprocessor stays as fitted, so the cost scales with the new labels.
+DEFAULT_DB_URL = os.environ.get("DATABASE_URL", "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "cardiocare.db"))
+MIN_EVAL_SAMPLES = 50 # fewer held-out labels than this keeps the base thresholds
+
+
+def load_confirmed_outcomes(db_url, confirmed_after=None):
+    """
+    Returns (X, y, confirmed_through) for predictions whose outcome was
+    confirmed after `confirmed_after`. Rows whose stored input lacks a
+    model feature are skipped.
+    """
+    from sqlalchemy import create_engine, text
+
+    query = ("SELECT input_data, confirmed_outcome, outcome_confirmed_at FROM prediction "
+             "WHERE confirmed_outcome IS NOT NULL")
+    params = {}
+    if confirmed_after:
+        query += " AND outcome_confirmed_at > :after"
+        params["after"] = confirmed_after
+    engine = create_engine(db_url)
+    try:
+        rows = pd.read_sql_query(text(query + " ORDER BY outcome_confirmed_at"), engine, params=params)
+    finally:
+        engine.dispose()
+
+    records, labels = [], []
+    for input_data, outcome in zip(rows["input_data"], rows["confirmed_outcome"]):
+        try:
+            record = json.loads(input_data)
+        except (TypeError, ValueError):
+            continue
+        if all(feature in record for feature in features):
+            records.append({feature: record[feature] for feature in features})
+            labels.append(1 if outcome == "Yes" else 0)
+    X = pd.DataFrame(records, columns=features)
+    X[numerical_features] = X[numerical_features].astype("float64")
+    confirmed_through = str(rows["outcome_confirmed_at"].iloc[-1]) if len(rows) else confirmed_after
+    return X, np.asarray(labels, dtype=np.int8), confirmed_through
+
+
+def update_logistic_regression(model, X_t, y, epochs=5, eta0=0.01):
+    """A few SGD epochs on the log loss, starting from the fitted LR's coefficients."""
+    import copy
+    from sklearn.linear_model import SGDClassifier
 
-# Save the entire pipeline (preprocessor + smote + model)
-joblib.dump(lr_pipeline, os.path.join(output_dir, "logreg_pipeline.pkl"))
-joblib.dump(xgb_pipeline, os.path.join(output_dir, "xgb_pipeline.pkl"))
+    sgd = SGDClassifier(loss="log_loss", learning_rate="constant", eta0=eta0, alpha=1e-4,
+                        max_iter=epochs, tol=None, random_state=42)
+    sgd.fit(X_t, y, coef_init=model.coef_, intercept_init=model.intercept_)
+    # Keep the LogisticRegression type the app and fast_inference expect
+    updated = copy.deepcopy(model)
+    updated.coef_ = sgd.coef_.copy()
+    updated.intercept_ = sgd.intercept_.copy()
+    return updated
 
-# Save the best thresholds for all strategies in a dictionary
-thresholds = {
-    "logistic_regression": best_threshold_lr,
-    "xgboost": best_threshold_xgb,
-    "simple_average": best_threshold_simple_avg,
-    "weighted_average": best_threshold_weighted_avg
+
+def continue_xgboost(model, X_t, y, rounds=20):
+    """Adds `rounds` trees to the fitted booster, trained on the new data only."""
+    params = model.get_params()
+    params["n_estimators"] = rounds
+    updated = XGBClassifier(**params)
+    updated.fit(X_t, y, xgb_model=model.get_booster())
+    return updated
+
+
+def _resample(smote, X_t, y):
+    """SMOTE the new labels when there are enough minority samples to interpolate between."""
+    minority = int(min(np.bincount(y, minlength=2)))
+    if minority < 2:
+        return X_t, y
+    params = smote.get_params()
+    params["k_neighbors"] = min(params.get("k_neighbors", 5), minority - 1)
+    return SMOTE(**params).fit_resample(X_t, y)
+
+
+def train_incremental(db_url=DEFAULT_DB_URL, registry_dir="model_registry", base_version=None, output_dir=OUTPUT_DIR,
+                      xgb_rounds=20, lr_epochs=5, min_recall=MIN_RECALL, eval_fraction=0.3):
+    """
+    Continues `base_version` (default: the registry's current version) on
+    newly confirmed outcomes and saves the result to `output_dir`. Returns
+    the same dict as train(), or None when there is nothing to train on.
+    """
+    timer = StageTimer()
+    registry = ModelRegistry(registry_dir)
+    base_version = base_version or registry.current_version()
+    if base_version is None:
+        print("Error: no model version to continue from. Run a full training first.")
+        return None
+    base_metrics = registry.manifest(base_version).get("metrics", {})
+    confirmed_after = base_metrics.get("labels_confirmed_through")
+
+    with timer.stage("load base version"):
+        base_dir = registry.version_dir(base_version)
+        lr_pipeline = joblib.load(os.path.join(base_dir, "logreg_pipeline.pkl"))
+        xgb_pipeline = joblib.load(os.path.join(base_dir, "xgb_pipeline.pkl"))
+        thresholds = joblib.load(os.path.join(base_dir, "best_thresholds.pkl"))
+
+    with timer.stage("load confirmed outcomes"):
+        X, y, confirmed_through = load_confirmed_outcomes(db_url, confirmed_after)
+    print(f"{len(y)} outcomes confirmed since {confirmed_after or 'the beginning'} "
+          f"({int(y.sum()) if len(y) else 0} 'Yes'), continuing version {base_version}.")
+    if len(y) == 0 or len(np.unique(y)) < 2:
+        print("Nothing to train on: need newly confirmed outcomes of both classes.")
+        return None
+
+    X_eval = y_eval = None
+    class_counts = np.bincount(y, minlength=2)
+    if len(y) * eval_fraction >= MIN_EVAL_SAMPLES and class_counts.min() >= 2:
+        X, X_eval, y, y_eval = train_test_split(X, y, test_size=eval_fraction, random_state=42, stratify=y)
+
+    with timer.stage("update models"):
+        lr_pre = lr_pipeline.named_steps["preprocessor"]
+        xgb_pre = xgb_pipeline.named_steps["preprocessor"]
+        X_lr, y_lr = _resample(lr_pipeline.named_steps["smote"], lr_pre.transform(X), y)
+        X_xgb, y_xgb = _resample(xgb_pipeline.named_steps["smote"], xgb_pre.transform(X), y)
+        lr_model = update_logistic_regression(lr_pipeline.named_steps["model"], X_lr, y_lr, epochs=lr_epochs)
+        xgb_model = continue_xgboost(xgb_pipeline.named_steps["model"], X_xgb, y_xgb, rounds=xgb_rounds)
+    print(f"Updated LR ({lr_epochs} SGD epochs) and XGBoost (+{xgb_rounds} trees) on {len(y)} records.")
+
+    metrics = {
+        "base_version": base_version,
+        "incremental_records": int(len(y)),
+        "labels_confirmed_through": confirmed_through,
+    }
+    thresholds = dict(thresholds)
+    if y_eval is None:
+        print(f"Fewer than {MIN_EVAL_SAMPLES} held-out labels; keeping the base version's thresholds and weights.")
+    else:
+        with timer.stage("re-evaluate thresholds"):
+            probs_lr = np.nan_to_num(lr_model.predict_proba(lr_pre.transform(X_eval))[:, 1])
+            probs_xgb = np.nan_to_num(xgb_model.predict_proba(xgb_pre.transform(X_eval))[:, 1])
+            thresholds["logistic_regression"] = evaluate_from_probs("Logistic Regression", y_eval, probs_lr, min_recall)
+            thresholds["xgboost"] = evaluate_from_probs("XGBoost", y_eval, probs_xgb, min_recall)
+            thresholds["simple_average"] = evaluate_from_probs("Simple Average Ensemble", y_eval, (probs_lr + probs_xgb) / 2, min_recall)
+            w_lr, thresholds["weighted_average"], precision, recall = search_ensemble_weights(y_eval, probs_lr, probs_xgb, min_recall=min_recall)
+            thresholds["ensemble_weights"] = {"logistic_regression": w_lr, "xgboost": round(1.0 - w_lr, 10)}
+        metrics.update({
+            "auc_logistic_regression": roc_auc_score(y_eval, probs_lr),
+            "auc_xgboost": roc_auc_score(y_eval, probs_xgb),
+            "weighted_average_precision": precision,
+            "weighted_average_recall": recall,
+            "test_samples": int(len(y_eval)),
+        })
+
+    with timer.stage("save"):
+        os.makedirs(output_dir, exist_ok=True)
+        joblib.dump(assemble_pipeline(lr_pre, lr_model, lr_pipeline.named_steps["smote"].get_params()), os.path.join(output_dir, "logreg_pipeline.pkl"))
+        joblib.dump(assemble_pipeline(xgb_pre, xgb_model, xgb_pipeline.named_steps["smote"].get_params()), os.path.join(output_dir, "xgb_pipeline.pkl"))
+        joblib.dump(thresholds, os.path.join(output_dir, "best_thresholds.pkl"))
+    print(f"\n✅ Incrementally trained models saved to the '{output_dir}' directory!")
+    return {"output_dir": output_dir, "thresholds": thresholds, "metrics": metrics, "timer": timer}
+
+
+# ──────────────────────────────
+# 7. Hyperparameter Search
+# ──────────────────────────────
+# --tune samples candidates from SEARCH_SPACE (model + SMOTE parameters) and
+# runs successive halving: every candidate trains on a small stratified slice
+# of a tuning split, the best 1/eta go on to a slice eta times larger, and so
+# on up to the full split. XGBoost trials also stop early on the validation
+# split. Trials run in a process pool and each finished trial is appended to
+# trials.jsonl, so an interrupted search resumes where it stopped. The final
+# leaderboard ranks validation AUC next to single-row inference latency.
+SEARCH_SPACE = {
+    "logistic_regression": {
+        "C": [0.01, 0.1, 1.0, 10.0],
+        "penalty": ["l1", "l2"],
+        "class_weight": [None, "balanced"],
+    },
+    "xgboost": {
+        "max_depth": [3, 4, 6, 8],
+        "learning_rate": [0.05, 0.1, 0.3],
+        "subsample": [0.7, 0.85, 1.0],
+        "colsample_bytree": [0.7, 1.0],
+        "min_child_weight": [1, 5],
+    },
+    "smote": {
+        "k_neighbors": [3, 5, 8],
+        "sampling_strategy": [0.5, 0.75, 1.0],
+    },
 }
-joblib.dump(thresholds, os.path.join(output_dir, "best_thresholds.pkl"))
+XGB_MAX_ROUNDS = 400
+XGB_EARLY_STOPPING_ROUNDS = 20
+TUNING_VALIDATION_SIZE = 0.2
+
+
+def prepare_tuning_data(data_path, dataset_hash, tuning_dir, split_params=SPLIT_PARAMS, cache_dir=None, chunksize=None):
+    """
+    Carves a validation split out of the usual training split (the test
+    split stays untouched), fits a preprocessor on the rest and stores the
+    transformed arrays as .npy files that trial workers memory-map.
+    """
+    paths = {name: os.path.join(tuning_dir, f"{name}.npy") for name in ("X_train", "y_train", "X_val", "y_val")}
+    if all(os.path.exists(path) for path in paths.values()):
+        return paths
+    X, y = load_dataset(data_path, dataset_hash, cache_dir, chunksize)
+    X_train, _, y_train, _ = train_test_split(
+        X, y, test_size=split_params["test_size"], random_state=split_params["random_state"], stratify=y
+    )
+    X_train, X_val, y_train, y_val = train_test_split(
+        X_train, y_train, test_size=TUNING_VALIDATION_SIZE, random_state=split_params["random_state"], stratify=y_train
+    )
+    preprocessor = build_preprocessor().fit(X_train, y_train)
+    os.makedirs(tuning_dir, exist_ok=True)
+    arrays = {
+        "X_train": preprocessor.transform(X_train), "y_train": np.asarray(y_train),
+        "X_val": preprocessor.transform(X_val), "y_val": np.asarray(y_val),
+    }
+    for name, array in arrays.items():
+        np.save(paths[name] + ".tmp.npy", array)
+        os.replace(paths[name] + ".tmp.npy", paths[name])
+    return paths
+
+
+def _trial_id(trial):
+    key = json.dumps([trial["model"], trial["params"], trial["smote"], trial["budget"]], sort_keys=True)
+    return joblib.hash(key)[:16]
+
+
+def _single_row_latency_us(name, model, X_val, best_iteration=None, repeats=200):
+    """Median single-row prediction latency, measured the way the app serves the model."""
+    row = np.ascontiguousarray(X_val[:1], dtype=np.float64)
+    if name == "xgboost":
+        booster = model.get_booster()
+        iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+        predict = lambda: booster.inplace_predict(row, iteration_range=iteration_range)
+    else:
+        coef, intercept = model.coef_.ravel(), float(model.intercept_[0])
+        predict = lambda: 1.0 / (1.0 + np.exp(-(row @ coef + intercept)))
+    predict() # warm up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1e6)
+
+
+def run_trial(trial, paths, min_recall, n_jobs=1):
+    """Trains one candidate on its budget slice; runs in a worker process."""
+    warnings.filterwarnings('ignore')
+    X_train, y_train = np.load(paths["X_train"], mmap_mode="r"), np.load(paths["y_train"])
+    X_val, y_val = np.load(paths["X_val"], mmap_mode="r"), np.load(paths["y_val"])
+    if trial["budget"] < 1.0:
+        X_train, _, y_train, _ = train_test_split(X_train, y_train, train_size=trial["budget"], random_state=42, stratify=y_train)
+
+    start = time.perf_counter()
+    X_res, y_res = SMOTE(random_state=42, **trial["smote"]).fit_resample(np.asarray(X_train), y_train)
+    best_iteration = None
+    if trial["model"] == "xgboost":
+        model = XGBClassifier(**{**MODEL_PARAMS["xgboost"], **trial["params"], "n_estimators": XGB_MAX_ROUNDS,
+                                 "early_stopping_rounds": XGB_EARLY_STOPPING_ROUNDS, "n_jobs": n_jobs})
+        model.fit(X_res, y_res, eval_set=[(X_val, y_val)], verbose=False)
+        best_iteration = int(model.best_iteration)
+    else:
+        model = build_model(trial["model"], {**MODEL_PARAMS[trial["model"]], **trial["params"]}).fit(X_res, y_res)
+    fit_seconds = time.perf_counter() - start
+
+    probs = np.nan_to_num(model.predict_proba(X_val)[:, 1])
+    _, _, precision, recall = search_ensemble_weights(y_val, probs, probs, weights=[1.0], min_recall=min_recall)
+    return {
+        **trial,
+        "val_auc": float(roc_auc_score(y_val, probs)),
+        "precision_at_min_recall": precision,
+        "recall": recall,
+        "best_iteration": best_iteration,
+        "fit_s": fit_seconds,
+        "latency_us": _single_row_latency_us(trial["model"], model, X_val, best_iteration),
+    }
+
+
+def tune(data_path=DATASET_FILENAME, cache_dir=CACHE_DIR, output_dir=OUTPUT_DIR, n_candidates=12, eta=3, min_budget=1 / 9,
+         workers=None, models=("logistic_regression", "xgboost"), min_recall=MIN_RECALL, seed=42, chunksize=None):
+    """
+    Successive-halving search per model. Writes leaderboard.json and
+    best_params.json (usable with --params) to `output_dir` and returns the
+    leaderboard rows of the final rung.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from sklearn.model_selection import ParameterSampler
+
+    workers = workers or os.cpu_count() or 1
+    timer = StageTimer()
+    with timer.stage("hash dataset"):
+        dataset_hash = file_sha256(data_path)
+    tuning_dir = os.path.join(cache_dir or ".", "tuning", dataset_hash[:16])
+    with timer.stage("prepare tuning data"):
+        paths = prepare_tuning_data(data_path, dataset_hash, tuning_dir, cache_dir=cache_dir, chunksize=chunksize)
+
+    checkpoint = os.path.join(tuning_dir, "trials.jsonl")
+    done = {}
+    if os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue # blank or cut short by the interruption
+                done[result["id"]] = result
+        print(f"Resuming: {len(done)} finished trials found in {checkpoint}.")
+
+    budgets = []
+    budget = min_budget
+    while budget < 1.0:
+        budgets.append(round(budget, 6))
+        budget *= eta
+    budgets.append(1.0)
+
+    # Each worker process trains one trial at a time; XGBoost gets the spare cores
+    trial_jobs = max(1, (os.cpu_count() or 1) // workers)
+    reached = {} # candidate -> its result on the largest budget it got to
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(checkpoint, "a") as log:
+        for name in models:
+            space = {f"model__{k}": v for k, v in SEARCH_SPACE[name].items()}
+            space.update({f"smote__{k}": v for k, v in SEARCH_SPACE["smote"].items()})
+            candidates = [
+                {"model": name,
+                 "params": {k[7:]: v for k, v in c.items() if k.startswith("model__")},
+                 "smote": {k[7:]: v for k, v in c.items() if k.startswith("smote__")}}
+                for c in ParameterSampler(space, n_iter=n_candidates, random_state=seed)
+            ]
+            for rung, budget in enumerate(budgets):
+                trials = []
+                for candidate in candidates:
+                    trial = {**candidate, "budget": budget, "rung": rung}
+                    trial["id"] = _trial_id(trial)
+                    trials.append(trial)
+                pending = [t for t in trials if t["id"] not in done]
+                with timer.stage(f"{name} rung {rung} ({len(trials)} x {budget:.0%})", cached=not pending):
+                    futures = [pool.submit(run_trial, t, paths, min_recall, trial_jobs) for t in pending]
+                    for future in as_completed(futures):
+                        result = future.result()
+                        done[result["id"]] = result
+                        log.write(json.dumps(result) + "\n")
+                        log.flush() # checkpoint every finished trial
+                results = sorted((done[t["id"]] for t in trials), key=lambda r: r["val_auc"], reverse=True)
+                for r in results:
+                    reached[json.dumps([r["model"], r["params"], r["smote"]], sort_keys=True)] = r
+                print(f"{name} rung {rung}: best val AUC {results[0]['val_auc']:.4f} of {len(results)} on {budget:.0%} of the tuning split.")
+                if budget == 1.0:
+                    break
+                keep = max(1, int(np.ceil(len(results) / eta)))
+                candidates = [{k: r[k] for k in ("model", "params", "smote")} for r in results[:keep]]
+
+    # Candidates that survived to the full budget first, then by AUC
+    leaderboard = sorted(reached.values(), key=lambda r: (r["budget"], r["val_auc"]), reverse=True)
+    print(f"\nLeaderboard (validation split, min recall {min_recall:.0%}):")
+    print(f"  {'model':<20} {'budget':>6} {'AUC':>7} {'prec@rec':>9} {'latency':>10} {'fit':>7}  params")
+    for r in leaderboard:
+        params = {**r["params"], **({"n_estimators": r["best_iteration"] + 1} if r["best_iteration"] is not None else {})}
+        print(f"  {r['model']:<20} {r['budget']:6.0%} {r['val_auc']:7.4f} {r['precision_at_min_recall']:9.4f} "
+              f"{r['latency_us']:8.1f}us {r['fit_s']:6.2f}s  {json.dumps(params)} smote={json.dumps(r['smote'])}")
+
+    # Best trial per model; SMOTE is fitted once for both models, so it
+    # follows the best trial overall
+    best_params = {"smote": leaderboard[0]["smote"]}
+    for name in models:
+        best = next(r for r in leaderboard if r["model"] == name)
+        best_params[name] = dict(best["params"])
+        if best["best_iteration"] is not None:
+            best_params[name]["n_estimators"] = best["best_iteration"] + 1
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "leaderboard.json"), "w") as f:
+        json.dump(leaderboard, f, indent=2)
+    with open(os.path.join(output_dir, "best_params.json"), "w") as f:
+        json.dump(best_params, f, indent=2)
+    print(f"\n✅ Leaderboard and best_params.json written to '{output_dir}'. Train with: --params {os.path.join(output_dir, 'best_params.json')}")
+    timer.report()
+    return leaderboard
+
+
+# ──────────────────────────────
+# 8. CLI & Publish to the Model Registry
+# ──────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Train the heart disease ensemble and publish it to the model registry.")
+    parser.add_argument('--data', default=DATASET_FILENAME, help="Training CSV")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="Directory for the trained pipelines and thresholds")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="Stage cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="Recompute every stage")
+    parser.add_argument('--jobs', type=int, default=2, help="Models trained in parallel")
+    parser.add_argument('--chunksize', type=int, help="Stream the CSV this many rows at a time")
+    parser.add_argument('--min-recall', type=float, default=MIN_RECALL, help="Recall every chosen threshold must reach")
+    parser.add_argument('--params', help="JSON file of model/SMOTE parameters, e.g. best_params.json from --tune")
+    parser.add_argument('--registry', default=os.environ.get("MODEL_REGISTRY_DIR", "model_registry"))
+    parser.add_argument('--no-publish', action='store_true', help="Only write --output; don't publish a registry version")
+    incremental = parser.add_argument_group("incremental training")
+    incremental.add_argument('--incremental', action='store_true', help="Continue the current version on newly confirmed outcomes")
+    incremental.add_argument('--db', default=DEFAULT_DB_URL, help="Database URL holding the confirmed outcomes")
+    incremental.add_argument('--base-version', help="Version to continue (default: the registry's current version)")
+    incremental.add_argument('--xgb-rounds', type=int, default=20, help="Trees added to the XGBoost model")
+    incremental.add_argument('--lr-epochs', type=int, default=5, help="SGD epochs for the logistic regression")
+    tuning = parser.add_argument_group("hyperparameter search")
+    tuning.add_argument('--tune', action='store_true', help="Run the successive-halving search instead of training")
+    tuning.add_argument('--tune-candidates', type=int, default=12, help="Candidates sampled per model")
+    tuning.add_argument('--tune-workers', type=int, help="Trial worker processes (default: CPU count)")
+    tuning.add_argument('--tune-eta', type=int, default=3, help="Keep 1/eta of the candidates per rung")
+    args = parser.parse_args()
+
+    if args.tune:
+        tune(args.data, cache_dir=args.cache_dir, output_dir=args.output, n_candidates=args.tune_candidates,
+             eta=args.tune_eta, workers=args.tune_workers, min_recall=args.min_recall, chunksize=args.chunksize)
+        return
+
+    if args.incremental:
+        run = train_incremental(args.db, args.registry, args.base_version, args.output,
+                                xgb_rounds=args.xgb_rounds, lr_epochs=args.lr_epochs, min_recall=args.min_recall)
+        if run is None:
+            return
+    else:
+        if not os.path.exists(args.data):
+            print(f"Error: '{args.data}' not found.")
+            print("Please download the dataset from the specified Kaggle link and place it in the same folder as this script.")
+            raise SystemExit(1)
+
+        smote_params, model_params = SMOTE_PARAMS, MODEL_PARAMS
+        if args.params:
+            with open(args.params) as f:
+                tuned = json.load(f)
+            smote_params = {**SMOTE_PARAMS, **tuned.get("smote", {})}
+            model_params = {name: {**params, **tuned.get(name, {})} for name, params in MODEL_PARAMS.items()}
+        run = train(args.data, args.output, cache_dir=None if args.no_cache else args.cache_dir, n_jobs=args.jobs, chunksize=args.chunksize,
+                    smote_params=smote_params, model_params=model_params, min_recall=args.min_recall)
+
+    # The compiled store lets the app skip unpickling (see model_export.py)
+    with run["timer"].stage("export compiled store"):
+        export_compiled(run["output_dir"])
+
+    if not args.no_publish:
+        # The running app polls the registry and hot-swaps to the new version.
+        with run["timer"].stage("publish"):
+            registry = ModelRegistry(args.registry)
+            version = registry.publish(run["output_dir"], metrics=run["metrics"], extra_files=compiled_files(run["output_dir"]))
+        print(f"✅ Published model version {version} to '{registry.root}'.")
+
+    run["timer"].report()
+
 
-print(f"\n✅ Models and all thresholds saved to the '{output_dir}' directory!")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Password hashing off the request thread, and a per-client limiter for auth.
+
+bcrypt is deliberately expensive (tens to hundreds of ms of CPU per call).
+PasswordHasher runs it in a small fixed pool of threads (bcrypt releases the
+GIL while hashing), so at most `workers` hashes compete with /api/predict for
+the CPU however many logins arrive at once. At most `max_pending` more may
+wait for a worker; beyond that hash()/check() raise HasherBusy straight away
+and the endpoint answers 503 instead of queueing the burst.
+
+`needs_rehash()` tells whether a stored hash was made with a different cost
+factor than the configured one, so login can upgrade it in the background
+after a successful check.
+
+RateLimiter is a token bucket per key (the client address): `per_minute`
+attempts refill continuously, with bursts of up to `burst`.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HasherBusy(Exception):
+    """Raised when every hashing worker is busy and the wait list is full."""
+
+
+class PasswordHasher:
+    def __init__(self, bcrypt, rounds=12, workers=1, max_pending=32):
+        self.bcrypt = bcrypt # a flask_bcrypt.Bcrypt, for its password encoding rules
+        self.rounds = int(rounds)
+        self.workers = max(1, int(workers))
+        self.max_pending = max(0, int(max_pending))
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        self._counts_lock = threading.Lock()
+        self.hashed = 0
+        self.checked = 0
+        self.rejected = 0
+
+    def hash(self, password, timeout=None):
+        """A new bcrypt hash of `password` at the configured cost, as a str."""
+        return self.hash_async(password).result(timeout=timeout)
+
+    def hash_async(self, password):
+        """Like hash(), but returns the Future (e.g. for a rehash nobody waits on)."""
+        return self.submit(self._hash, password)
+
+    def check(self, password_hash, password, timeout=None):
+        future = self.submit(self._check, password_hash, password)
+        return future.result(timeout=timeout)
+
+    def needs_rehash(self, password_hash):
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False # not a bcrypt hash we can read; leave it alone
+
+    def submit(self, fn, *args):
+        """Runs fn(*args) on a hashing worker. Raises HasherBusy if no slot is free."""
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise HasherBusy("Password hashing is saturated.")
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def stats(self):
+        with self._counts_lock:
+            return {
+                'rounds': self.rounds, 'workers': self.workers, 'max_pending': self.max_pending,
+                'hashed': self.hashed, 'checked': self.checked, 'rejected': self.rejected,
+            }
+
+    def _hash(self, password):
+        password_hash = self.bcrypt.generate_password_hash(password, self.rounds).decode('utf-8')
+        self._count('hashed')
+        return password_hash
+
+    def _check(self, password_hash, password):
+        matches = self.bcrypt.check_password_hash(password_hash, password)
+        self._count('checked')
+        return matches
+
+    def _count(self, name):
+        with self._counts_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+class RateLimiter:
+    def __init__(self, per_minute, burst=None, max_keys=100000):
+        self.rate = per_minute / 60.0
+        self.burst = float(burst if burst is not None else max(1, per_minute))
+        self.max_keys = max_keys
+        self._buckets = {} # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """Takes one token for `key`. Returns (allowed, seconds until the next token)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (1 - tokens) / self.rate
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now):
+        """Drops buckets that have refilled completely; they behave like new keys."""
+        full_after = self.burst / self.rate
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < full_after}
@@ -0,0 +1,99 @@
+"""
+LRU + TTL cache of ensemble predictions keyed by the canonicalized model
+features and the model version, so resubmitted forms skip predict_proba.
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+def canonical_key(record, input_features, numerical_features, model_version):
+    """
+    Hashes the model features of `record` independent of key order and
+    numeric formatting (25, 25.0 and "25" give the same key for a numeric
+    feature). Returns None when the record can't be canonicalized (missing
+    feature, unparsable or NaN number) so the model raises its usual error.
+    """
+    values = []
+    for feature in input_features:
+        if feature not in record:
+            return None
+        value = record[feature]
+        if feature in numerical_features:
+            try:
+                value = float(value) + 0.0 # + 0.0 folds -0.0 into 0.0
+            except (TypeError, ValueError):
+                return None
+            if math.isnan(value):
+                return None
+        values.append(value)
+    try:
+        payload = json.dumps([model_version, values], separators=(',', ':'))
+    except (TypeError, ValueError):
+        return None
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, max_entries=10000, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drops every entry, e.g. after a model hot swap."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
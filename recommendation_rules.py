@@ -0,0 +1,241 @@
+"""
+Table-driven recommendation rules, evaluated for many records at once.
+
+Each rule is a row of (feature, op, value, message, priority). `feature` is
+an input field, or "prediction" for the model's 'Yes'/'No' result. A record
+gets the message of every rule it matches, ordered by priority (then by table
+order). Operators:
+
+    == !=                  compare as given (strings stay strings)
+    >= > <= <              compare numerically; missing or non-numeric values never match
+    in  not_in             membership in a list of values
+
+RuleSet.evaluate() builds one column per referenced feature and applies each
+rule to the whole column with NumPy, so a batch of n records costs one array
+comparison per rule rather than n Python if-chains. Small batches (a single
+/api/predict) take a plain Python path and never import NumPy.
+
+The built-in table is DEFAULT_RULES. RecommendationEngine can read the table
+from a JSON file instead (a list of rule objects, see `flask
+dump-recommendation-rules`) and picks up edits to it without a restart; a
+file that fails validation is reported and the previous rules stay in use.
+Recommendations already stored with past predictions are not rewritten.
+"""
+import hashlib
+import json
+import operator
+import os
+import threading
+import time
+
+# NumPy is imported where the vectorized path needs it, so importing the app
+# (and scoring single records) doesn't load it
+
+PREDICTION_FEATURE = 'prediction'
+SCALAR_OPS = {'>=': operator.ge, '>': operator.gt, '<=': operator.le, '<': operator.lt}
+NUMERIC_OPS = tuple(SCALAR_OPS)
+EQUALITY_OPS = ('==', '!=')
+MEMBERSHIP_OPS = ('in', 'not_in')
+
+DEFAULT_RULES = [
+    {'feature': 'prediction', 'op': '==', 'value': 'Yes', 'priority': 10,
+     'message': "It is highly recommended to consult a healthcare professional to discuss these results."},
+    {'feature': 'prediction', 'op': '!=', 'value': 'Yes', 'priority': 10,
+     'message': "Continue to maintain a healthy lifestyle and schedule regular checkups with your doctor."},
+    {'feature': 'Smoking_History', 'op': '==', 'value': 'Yes', 'priority': 20,
+     'message': "Quitting smoking is one of the most impactful steps you can take to improve cardiovascular health."},
+    {'feature': 'BMI', 'op': '>=', 'value': 25.0, 'priority': 30,
+     'message': "Aiming for a BMI below 25 can significantly reduce heart disease risk."},
+    {'feature': 'BMI', 'op': '<', 'value': 18.5, 'priority': 30,
+     'message': "Your BMI is low. Consult a doctor or nutritionist for advice on maintaining a healthy weight."},
+    {'feature': 'Exercise', 'op': '==', 'value': 'No', 'priority': 40,
+     'message': "Incorporating regular exercise, like 30 minutes of moderate activity most days, is beneficial for heart health."},
+]
+
+
+def _numeric_column(values):
+    """float64 column; None and anything float() can't parse become NaN."""
+    import numpy as np
+
+    try:
+        return values.astype(np.float64)
+    except (TypeError, ValueError):
+        pass # some value doesn't convert; fall back to one at a time
+    out = np.full(len(values), np.nan)
+    for i, v in enumerate(values):
+        try:
+            out[i] = float(v)
+        except (TypeError, ValueError):
+            pass
+    return out
+
+
+def _object_column(values, n):
+    import numpy as np
+
+    # fromiter keeps list/dict values as single elements instead of new dimensions
+    return np.fromiter(values, dtype=object, count=n)
+
+
+class RuleSet:
+    def __init__(self, rules):
+        self.rules = [self._validate(i, rule) for i, rule in enumerate(rules)]
+        # Stable sort: equal priorities keep their table order
+        self.rules.sort(key=lambda rule: rule['priority'])
+        self.messages = [rule['message'] for rule in self.rules]
+        self.features = sorted({rule['feature'] for rule in self.rules} - {PREDICTION_FEATURE})
+        # Identifies the rules' content, e.g. for ETags of responses built with them
+        self.fingerprint = hashlib.sha1(json.dumps(self.rules, sort_keys=True).encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _validate(index, rule):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Rule {index} is not an object.")
+        missing = {'feature', 'op', 'value', 'message'} - rule.keys()
+        if missing:
+            raise ValueError(f"Rule {index} is missing {', '.join(sorted(missing))}.")
+        op, value = rule['op'], rule['value']
+        if op in NUMERIC_OPS:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"Rule {index}: '{op}' needs a numeric value, got {value!r}.")
+        elif op in MEMBERSHIP_OPS:
+            if not isinstance(value, list):
+                raise ValueError(f"Rule {index}: '{op}' needs a list of values, got {value!r}.")
+        elif op not in EQUALITY_OPS:
+            raise ValueError(f"Rule {index}: unknown operator {op!r}.")
+        if not isinstance(rule['message'], str) or not rule['message'].strip():
+            raise ValueError(f"Rule {index} has an empty message.")
+        return {
+            'feature': str(rule['feature']), 'op': op, 'value': value,
+            'message': rule['message'], 'priority': int(rule.get('priority', 100)),
+        }
+
+    # Below this many records the NumPy setup costs more than it saves (e.g. /api/predict)
+    SCALAR_MAX_RECORDS = 16
+
+    def evaluate(self, records, results):
+        """Recommendation lists for parallel lists of input dicts and 'Yes'/'No' results."""
+        n = len(records)
+        if n <= self.SCALAR_MAX_RECORDS:
+            return [self._evaluate_one(record, result) for record, result in zip(records, results)]
+        columns = {f: _object_column((r.get(f) for r in records), n) for f in self.features}
+        columns[PREDICTION_FEATURE] = _object_column(iter(results), n)
+        return self._evaluate_columns(columns, n)
+
+    def evaluate_frame(self, df, results):
+        """evaluate() for a DataFrame of inputs; absent feature columns count as missing."""
+        import numpy as np
+
+        n = len(df)
+        columns = {
+            f: df[f].to_numpy(dtype=object) if f in df.columns else np.full(n, None, dtype=object)
+            for f in self.features
+        }
+        columns[PREDICTION_FEATURE] = _object_column(iter(results), n)
+        return self._evaluate_columns(columns, n)
+
+    def _evaluate_one(self, record, result):
+        """The same rules for a single record, without NumPy."""
+        out = []
+        for rule, message in zip(self.rules, self.messages):
+            value = result if rule['feature'] == PREDICTION_FEATURE else record.get(rule['feature'])
+            op = rule['op']
+            if op in SCALAR_OPS:
+                try:
+                    matched = SCALAR_OPS[op](float(value), rule['value'])
+                except (TypeError, ValueError):
+                    matched = False
+            elif op in EQUALITY_OPS:
+                matched = (value == rule['value']) == (op == '==')
+            else:
+                matched = (value in rule['value']) == (op == 'in')
+            if matched:
+                out.append(message)
+        return out
+
+    def _evaluate_columns(self, columns, n):
+        import numpy as np
+
+        if not self.rules or n == 0:
+            return [[] for _ in range(n)]
+        ufuncs = {'>=': np.greater_equal, '>': np.greater, '<=': np.less_equal, '<': np.less}
+        numeric = {}
+        hits = np.zeros((n, len(self.rules)), dtype=bool)
+        for j, rule in enumerate(self.rules):
+            column = columns[rule['feature']]
+            op, value = rule['op'], rule['value']
+            if op in NUMERIC_OPS:
+                if rule['feature'] not in numeric:
+                    numeric[rule['feature']] = _numeric_column(column)
+                with np.errstate(invalid='ignore'):
+                    hits[:, j] = ufuncs[op](numeric[rule['feature']], value) # NaN never matches
+            elif op in EQUALITY_OPS:
+                equal = np.asarray(column == value, dtype=bool)
+                hits[:, j] = equal if op == '==' else ~equal
+            else:
+                member = np.isin(column, np.array(value, dtype=object))
+                hits[:, j] = member if op == 'in' else ~member
+
+        # Records share few distinct hit patterns: build each pattern's message
+        # list once and hand every record a copy of its pattern's list
+        if len(self.rules) <= 62:
+            codes = hits.astype(np.int64) @ (np.int64(1) << np.arange(len(self.rules), dtype=np.int64))
+            codes, inverse = np.unique(codes, return_inverse=True)
+            patterns = [[(code >> j) & 1 for j in range(len(self.rules))] for code in codes.tolist()]
+        else:
+            patterns, inverse = np.unique(hits, axis=0, return_inverse=True)
+        lists = [[self.messages[j] for j in np.flatnonzero(pattern)] for pattern in patterns]
+        return [list(lists[k]) for k in inverse.reshape(-1).tolist()]
+
+    def to_list(self):
+        return [dict(rule) for rule in self.rules]
+
+
+class RecommendationEngine:
+    """
+    The live RuleSet: DEFAULT_RULES, or the JSON file at `path` when it exists.
+    The file's mtime is checked at most every `check_interval` seconds and a
+    changed file is loaded and swapped in as a whole.
+    """
+
+    def __init__(self, path=None, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.source = 'built-in'
+        self._rules = RuleSet(DEFAULT_RULES)
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def rules(self):
+        now = time.monotonic()
+        if self.path and now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                mtime = None
+            if mtime != self._mtime:
+                self.reload()
+        return self._rules
+
+    def reload(self):
+        """Loads the rules file (or the built-in table if there is none). Returns False if the file is invalid."""
+        with self._lock:
+            if not self.path or not os.path.exists(self.path):
+                if self.source != 'built-in':
+                    print("Recommendation rules file removed; using the built-in rules.")
+                self._rules, self.source, self._mtime = RuleSet(DEFAULT_RULES), 'built-in', None
+                return True
+            mtime = os.path.getmtime(self.path)
+            try:
+                with open(self.path) as f:
+                    rules = RuleSet(json.load(f))
+            except (OSError, ValueError) as e:
+                self._mtime = mtime # don't retry until the file changes again
+                print(f"Recommendation rules in '{self.path}' not loaded, keeping the previous rules: {e}")
+                return False
+            self._rules, self.source, self._mtime = rules, self.path, mtime
+            print(f"Loaded {len(rules.rules)} recommendation rules from '{self.path}'.")
+            return True
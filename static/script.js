@@ -106,16 +106,30 @@ document.addEventListener('DOMContentLoaded', () => {
     };
 
     // --- API CALLS ---
+    // History endpoints return one page at a time and send the cursor of the
+    // next page in X-Next-Cursor; follow it until every row has been loaded.
+    const fetchAllPages = async (url) => {
+        const rows = [];
+        let cursor = null;
+        do {
+            const pageUrl = `${url}?limit=200` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '');
+            const response = await fetch(pageUrl, {
+                headers: { 'Authorization': `Bearer ${userState.token}` }
+            });
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || 'Request failed');
+            rows.push(...data);
+            cursor = response.headers.get('X-Next-Cursor');
+        } while (cursor);
+        return rows;
+    };
+
     const fetchPredictionHistory = async () => {
         const requestId = ++latestHistoryId;
         if (!userState.token) return;
         historyTableBody.innerHTML = '<tr><td colspan="3" class="text-center py-4">Loading history...</td></tr>';
         try {
-            const response = await fetch(`${API_BASE_URL}/history`, {
-                headers: { 'Authorization': `Bearer ${userState.token}` }
-            });
-            const historyData = await response.json();
-            if (!response.ok) throw new Error(historyData.error || 'Failed to fetch history');
+            const historyData = await fetchAllPages(`${API_BASE_URL}/history`);
 
             if (requestId !== latestHistoryId) return;
 
@@ -146,11 +160,7 @@ document.addEventListener('DOMContentLoaded', () => {
         container.innerHTML = '<p class="text-gray-500">Loading recommendations...</p>';
 
         try {
-            const response = await fetch(`${API_BASE_URL}/recommendations`, {
-                headers: { 'Authorization': `Bearer ${userState.token}` }
-            });
-            const data = await response.json();
-            if (!response.ok) throw new Error(data.error || 'Failed to fetch recommendations');
+            const data = await fetchAllPages(`${API_BASE_URL}/recommendations`);
 
             if (data.length === 0) {
                 container.innerHTML = '<p class="text-gray-500">No recommendations available yet. Make a prediction first!</p>';
@@ -387,11 +397,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         try {
-            const response = await fetch(`${API_BASE_URL}/doctor/patient_history/${patientId}`, {
-                headers: { 'Authorization': `Bearer ${userState.token}` }
-            });
-            const data = await response.json();
-            if (!response.ok) throw new Error(data.error || 'Failed to fetch history');
+            const data = await fetchAllPages(`${API_BASE_URL}/doctor/patient_history/${patientId}`);
 
             if (data.length === 0) {
                 tableBody.innerHTML = '<tr><td colspan="4" class="text-center py-4">No prediction history found for this patient.</td></tr>';
@@ -0,0 +1,67 @@
+"""
+score_file() writing Parquet when a kept column changes dtype between input
+chunks. The bundle is a stand-in with fixed probabilities: what matters here
+is the output file, not the models.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from bulk_scoring import score_file
+
+
+class FixedBundle:
+    version = 'test'
+    input_features = ['BMI', 'Sex']
+    numerical_features = {'BMI'}
+
+    def predict_proba_frame(self, df):
+        n = len(df)
+        return np.full(n, 0.25), np.full(n, 0.75)
+
+    def blend(self, probs_lr, probs_xgb):
+        blended = (probs_lr + probs_xgb) / 2
+        return blended, np.where(blended >= 0.5, 'Yes', 'No')
+
+
+class FixedLoader:
+    def load_version(self, version=None):
+        return FixedBundle()
+
+
+def test_parquet_output_survives_kept_column_dtype_change(tmp_path):
+    # Chunk 1: patient_id is int64 and note is all blank (null); chunk 2: patient_id gets a blank (float64), note gets text
+    source = tmp_path / 'input.csv'
+    source.write_text(
+        "patient_id,note,BMI,Sex\n"
+        "1,,25.0,Female\n"
+        "2,,31.5,Male\n"
+        "3,follow up,22.1,Female\n"
+        ",,28.0,Male\n"
+    )
+    output = tmp_path / 'scored.parquet'
+
+    summary = score_file(str(source), str(output), FixedLoader(), chunksize=2)
+
+    assert summary['rows'] == 4 and summary['chunks'] == 2
+    assert sorted(os.listdir(tmp_path)) == ['input.csv', 'scored.parquet'] # no .tmp left behind
+    table = pq.read_table(output)
+    assert str(table.schema.field('patient_id').type) == 'int64'
+    assert str(table.schema.field('note').type) == 'string'
+    df = table.to_pandas()
+    assert df['patient_id'].tolist()[:3] == [1, 2, 3] and pd.isna(df['patient_id'].iloc[3])
+    assert df['note'].tolist()[2] == 'follow up'
+    assert df['probability'].tolist() == [0.5] * 4
+
+
+def test_uncastable_kept_column_fails_cleanly(tmp_path):
+    source = tmp_path / 'input.csv'
+    source.write_text("ref,BMI,Sex\n1,25.0,Female\n2,31.5,Male\nA-3,22.1,Female\n")
+    output = tmp_path / 'scored.parquet'
+
+    with pytest.raises(ValueError, match='ref changed type'):
+        score_file(str(source), str(output), FixedLoader(), chunksize=2)
+    assert os.listdir(tmp_path) == ['input.csv']
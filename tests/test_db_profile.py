@@ -0,0 +1,49 @@
+"""
+Engine options chosen by db_profile.configure_database for each kind of
+DATABASE_URL, and an app import against an in-memory database.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+from flask import Flask
+
+from db_profile import configure_database, is_sqlite_memory
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+POOL_OPTIONS = {'pool_size', 'max_overflow', 'pool_timeout'}
+
+
+def engine_options(monkeypatch, uri):
+    monkeypatch.setenv('DATABASE_URL', uri)
+    monkeypatch.delenv('DB_PROFILE', raising=False)
+    app = Flask(__name__)
+    configure_database(app, default_uri='sqlite:///unused.db')
+    return app.config['SQLALCHEMY_ENGINE_OPTIONS']
+
+
+@pytest.mark.parametrize('uri', ['sqlite://', 'sqlite:///:memory:', 'sqlite:///file:bench?mode=memory&cache=shared&uri=true'])
+def test_in_memory_sqlite_gets_no_pool_sizing(monkeypatch, uri):
+    assert is_sqlite_memory(uri)
+    assert not POOL_OPTIONS & set(engine_options(monkeypatch, uri))
+
+
+def test_file_sqlite_gets_pool_sizing(monkeypatch, tmp_path):
+    uri = 'sqlite:///' + str(tmp_path / 'app.db')
+    assert not is_sqlite_memory(uri)
+    assert POOL_OPTIONS <= set(engine_options(monkeypatch, uri))
+
+
+def test_app_imports_with_in_memory_database():
+    # A fresh interpreter: app.py configures its engine at import time
+    code = (
+        "import app as appmod\n"
+        "with appmod.app.app_context():\n"
+        "    appmod.ensure_schema()\n"
+        "    print(appmod.db.session.execute(appmod.db.text('SELECT COUNT(*) FROM user')).scalar())\n"
+    )
+    env = dict(os.environ, DATABASE_URL='sqlite://')
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr[-2000:]
+    assert out.stdout.strip().splitlines()[-1] == '0'
@@ -0,0 +1,142 @@
+"""
+Parity of the compiled ensemble (fast_inference.py) with the pipelines'
+predict_proba on rows that have the training columns.
+
+Uses the trained pipelines in models/ when they are there. Otherwise small
+pipelines are fitted the way model_trainer.py fits them, on a sample of
+CVD_cleaned.csv or, without it, on synthetic rows with the dataset's
+categories.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import model_trainer
+from fast_inference import CompiledEnsemble
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MODEL_DIR = os.path.join(ROOT, 'models')
+ATOL = 1e-9
+
+CATEGORIES = {
+    'General_Health': ['Excellent', 'Fair', 'Good', 'Poor', 'Very Good'],
+    'Checkup': ['5 or more years ago', 'Never', 'Within the past 2 years', 'Within the past 5 years', 'Within the past year'],
+    'Exercise': ['No', 'Yes'],
+    'Smoking_History': ['No', 'Yes'],
+    'Sex': ['Female', 'Male'],
+    'Age_Category': ['18-24', '25-29', '30-34', '35-39', '40-44', '45-49', '50-54', '55-59', '60-64',
+                     '65-69', '70-74', '75-79', '80+'],
+    'Diabetes': ['No', 'No, pre-diabetes or borderline diabetes', 'Yes', 'Yes, but female told only during pregnancy'],
+    'Depression': ['No', 'Yes'],
+    'Arthritis': ['No', 'Yes'],
+    'Skin_Cancer': ['No', 'Yes'],
+    'Other_Cancer': ['No', 'Yes'],
+}
+
+
+def synthetic_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({feature: rng.choice(CATEGORIES[feature], n) for feature in model_trainer.categorical_features})
+    for feature in model_trainer.numerical_features:
+        df[feature] = rng.integers(0, 60, n).astype(float)
+    df['BMI'] = np.round(rng.normal(28, 6, n).clip(13, 60), 2)
+    risk = (df['Age_Category'] >= '60-64').astype(float) + (df['General_Health'] == 'Poor') + (df['Diabetes'] == 'Yes')
+    df[model_trainer.target] = np.where(rng.random(n) < 0.05 + 0.2 * risk, 'Yes', 'No')
+    return df
+
+
+@pytest.fixture(scope='module')
+def data():
+    csv_path = os.path.join(ROOT, model_trainer.DATASET_FILENAME)
+    if os.path.exists(csv_path):
+        df = pd.read_csv(csv_path, nrows=6000)
+    else:
+        df = synthetic_rows(6000)
+    return df.iloc[:4000], df.iloc[4000:].reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def pipelines(data):
+    lr_path = os.path.join(MODEL_DIR, 'logreg_pipeline.pkl')
+    xgb_path = os.path.join(MODEL_DIR, 'xgb_pipeline.pkl')
+    if os.path.exists(lr_path) and os.path.exists(xgb_path):
+        import joblib
+        return joblib.load(lr_path), joblib.load(xgb_path)
+
+    train, _ = data
+    X = train[model_trainer.features]
+    y = (train[model_trainer.target] == 'Yes').astype(int)
+    fitted = []
+    for name in ('logistic_regression', 'xgboost'):
+        params = dict(model_trainer.MODEL_PARAMS[name])
+        params.pop('use_label_encoder', None)
+        if name == 'xgboost':
+            params['n_estimators'] = 50
+        pipeline = model_trainer.assemble_pipeline(
+            model_trainer.build_preprocessor(), model_trainer.build_model(name, params), model_trainer.SMOTE_PARAMS
+        )
+        fitted.append(pipeline.fit(X, y))
+    return tuple(fitted)
+
+
+@pytest.fixture(scope='module')
+def compiled(pipelines):
+    return CompiledEnsemble.from_pipelines(*pipelines)
+
+
+def expected(pipelines, df):
+    lr_pipeline, xgb_pipeline = pipelines
+    return lr_pipeline.predict_proba(df)[:, 1], xgb_pipeline.predict_proba(df)[:, 1]
+
+
+def assert_close(got, want):
+    for g, w in zip(got, want):
+        np.testing.assert_allclose(g, w, rtol=0, atol=ATOL)
+
+
+def test_records_match_pipelines(pipelines, compiled, data):
+    _, held_out = data
+    df = held_out[compiled.input_features]
+    assert_close(compiled.predict_proba_records(df.to_dict('records')), expected(pipelines, df))
+
+
+def test_array_matches_pipelines(pipelines, compiled, data):
+    _, held_out = data
+    df = held_out[compiled.input_features]
+    assert_close(compiled.predict_proba_array(df.to_numpy(dtype=object)), expected(pipelines, df))
+
+
+def test_unknown_categories_score_as_ignored(pipelines, compiled, data):
+    _, held_out = data
+    df = held_out[compiled.input_features].iloc[:50].copy()
+    df['General_Health'] = 'Unheard of'
+    df.loc[df.index[::2], 'Diabetes'] = 'Maybe'
+    assert_close(compiled.predict_proba_records(df.to_dict('records')), expected(pipelines, df))
+
+
+def test_missing_categories_score_as_ignored(pipelines, compiled, data):
+    _, held_out = data
+    df = held_out[compiled.input_features].iloc[:50].copy()
+    df['Exercise'] = pd.Series([None] * len(df), index=df.index, dtype=object)
+    df.loc[df.index[::3], 'Age_Category'] = np.nan
+    want = expected(pipelines, df)
+    assert_close(compiled.predict_proba_records(df.to_dict('records')), want)
+    assert_close(compiled.predict_proba_array(df.to_numpy(dtype=object)), want)
+
+
+def test_saved_store_matches(pipelines, compiled, data, tmp_path):
+    _, held_out = data
+    df = held_out[compiled.input_features].iloc[:200]
+    compiled.save(str(tmp_path))
+    loaded = CompiledEnsemble.load(str(tmp_path))
+    assert_close(loaded.predict_proba_records(df.to_dict('records')), expected(pipelines, df))
+
+
+def test_missing_numeric_is_rejected(compiled, data):
+    _, held_out = data
+    record = held_out[compiled.input_features].iloc[0].to_dict()
+    del record['BMI']
+    with pytest.raises(ValueError):
+        compiled.predict_proba_records([record])
@@ -0,0 +1,156 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from coalescer import Histogram
+
+
+class WriteBehindFull(Exception):
+    """Raised by submit() when the queue stays full for longer than the enqueue timeout."""
+
+
+class WriteBehindQueue:
+    """
+    Buffers rows in memory and hands them to `flush_fn` in batches from a
+    background thread, so a request doesn't pay for its own transaction.
+    `flush_fn` takes a list of items, writes them in one transaction and
+    returns one value per item (e.g. the new primary keys).
+
+    `submit(item)` returns a Future that resolves once the item is committed;
+    callers that need durability wait on it, fire-and-forget callers don't.
+    The queue is bounded: when it is full `submit()` blocks for up to
+    `enqueue_timeout` seconds and then raises WriteBehindFull. `drain()`
+    stops intake and flushes everything still queued; items submitted after
+    that are written synchronously.
+
+    Queued items live only in this process, so fire-and-forget writes are
+    lost if the process dies before the next flush.
+    """
+    BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+    FLUSH_MS_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 250, 1000]
+
+    def __init__(self, flush_fn, max_queue_size=10000, max_batch_size=500, flush_interval_ms=20, enqueue_timeout=0.5):
+        self.flush_fn = flush_fn
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.enqueue_timeout = enqueue_timeout
+        self.batch_size_hist = Histogram(self.BATCH_SIZE_BUCKETS)
+        self.flush_ms_hist = Histogram(self.FLUSH_MS_BUCKETS)
+        self._queue = queue.Queue(self.max_queue_size)
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._draining = False
+        self._counts_lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, item):
+        """Queues one item and returns a Future of its flush_fn result."""
+        future = Future()
+        if self._draining:
+            self._write([(item, future)])
+            return future
+        self._ensure_worker()
+        try:
+            self._queue.put((item, future), timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._count('rejected')
+            raise WriteBehindFull(f"Write-behind queue is full ({self.max_queue_size} items).")
+        self._count('submitted')
+        return future
+
+    def drain(self, timeout=30):
+        """Stops intake and blocks until every queued item has been flushed."""
+        if self._draining:
+            return
+        self._draining = True
+        if self._worker is None:
+            return
+        self._queue.put(None) # may block briefly if full; the worker is consuming
+        self._worker.join(timeout=timeout)
+        if self._worker.is_alive():
+            print(f"Write-behind drain timed out with {self._queue.qsize()} items still queued.")
+
+    def stats(self):
+        with self._counts_lock:
+            counts = {'submitted': self.submitted, 'written': self.written, 'failed': self.failed, 'rejected': self.rejected}
+        return {
+            'max_queue_size': self.max_queue_size,
+            'max_batch_size': self.max_batch_size,
+            'flush_interval_ms': self.flush_interval * 1000.0,
+            'queue_depth': self._queue.qsize(),
+            'draining': self._draining,
+            **counts,
+            'batch_size': self.batch_size_hist.snapshot(),
+            'flush_ms': self.flush_ms_hist.snapshot(),
+        }
+
+    def _count(self, name, n=1):
+        with self._counts_lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.perf_counter() + self.flush_interval
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+        # Anything that raced in behind the sentinel
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftovers.append(item)
+        if leftovers:
+            self._write(leftovers)
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            results = self.flush_fn([item for item, _ in batch])
+        except Exception as e:
+            # One bad row must not lose the rest of the batch, so retry each
+            # item in its own transaction and hand every caller its own outcome.
+            print(f"Write-behind batch of {len(batch)} failed, retrying individually: {e}")
+            for item, future in batch:
+                try:
+                    future.set_result(self.flush_fn([item])[0])
+                    self._count('written')
+                except Exception as item_error:
+                    print(f"Write-behind item dropped: {item_error}")
+                    self._count('failed')
+                    future.set_exception(item_error)
+        else:
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            self._count('written', len(batch))
+        self.batch_size_hist.observe(len(batch))
+        self.flush_ms_hist.observe((time.perf_counter() - start) * 1000.0)